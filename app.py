@@ -1,287 +1,958 @@
-from neo4j import GraphDatabase
-from pyvis.network import Network
 import streamlit as st
 import json
-import pandas as pd
-import re
+import itertools
+import time
+from datetime import date, timedelta
 from layout import footer
-import streamlit.components.v1 as components
+from graph_view import (generate_nodes_edges, save_graph_file, records_to_arrow,
+                        new_subgraph, merge_records, subgraph_records, summarize_subgraph,
+                        collect_within_budget, entity_summary)
+from queries import (options_list, asset_questions, batch_questions, asset_queries, batch_queries,
+                     table_queries, neighborhood_query, time_window_predicate,
+                     PO_LINEAGE, RECENT_PROCESS_ORDERS, FAILED_BATCH_ROOT_CAUSE,
+                     ROOT_CAUSE_ASSETS, ROOT_CAUSE_MATERIALS, ROOT_CAUSE_OUTCOMES, GENEALOGY_ROOT, GENEALOGY_EDGES)
+from profiling import run_profiled, log_query_stats
+from tracing import tracer_from_config, StageTimings
+from replay_driver import ReplayDriver, RecordingDriver, query_key
+from bookmarks import load_bookmarks
+from jobs import JobRunner, JobCache, JobCancelled
 
-# Configure Neo4j connection
-uri = st.secrets["NEO4J_URI"]
-auth = (st.secrets["NEO4J_USERNAME"], st.secrets["NEO4J_PASSWORD"])
-driver = GraphDatabase.driver(uri, auth=auth)
+# Heavy modules (neo4j, pyvis, pyarrow, streamlit.components) are imported on
+# first use, and config, driver and tracer are created once per process.
 
-# Load configuration
-with open('./config.json', 'r') as file:
-    config = json.load(file)
+@st.cache_resource
+def load_config():
+    with open('./config.json', 'r') as file:
+        return json.load(file)
+
+@st.cache_resource
+def get_driver():
+    """
+    Neo4j driver shared by all sessions; its connection pool lives as long as the process.
+    A neo4j:// URI routes the reads of the app to the followers of a cluster.
+    NEO4J_REPLAY_FILE serves recorded results instead of a database,
+    NEO4J_RECORD_FILE records every result of a live session into a cassette.
+    """
+    if "NEO4J_REPLAY_FILE" in st.secrets:
+        return ReplayDriver(st.secrets["NEO4J_REPLAY_FILE"], latency_ms=st.secrets.get("NEO4J_REPLAY_LATENCY_MS", 0))
+    from neo4j import GraphDatabase
+    uri = st.secrets["NEO4J_URI"]
+    auth = (st.secrets["NEO4J_USERNAME"], st.secrets["NEO4J_PASSWORD"])
+    driver = GraphDatabase.driver(uri, auth=auth,
+                                  max_transaction_retry_time=load_config()["neo4j"]["max_transaction_retry_time"])
+    if "NEO4J_RECORD_FILE" in st.secrets:
+        driver = RecordingDriver(driver, st.secrets["NEO4J_RECORD_FILE"])
+    return driver
+
+@st.cache_resource
+def get_tracer():
+    return tracer_from_config(load_config())
+
+@st.cache_resource
+def get_stage_timings():
+    """
+    Recent stage timings of the span file, read on from where the last
+    render stopped.
+    """
+    tracing = load_config()["tracing"]
+    return StageTimings(tracing["path"], tracing["window"])
+
+@st.cache_resource
+def get_job_runner():
+    """
+    Thread pool for the graph queries of all sessions.
+    """
+    return JobRunner(load_config()["jobs"]["max_workers"])
+
+@st.cache_resource
+def get_prefetch_runner():
+    """
+    Separate, smaller pool for speculative queries, so prefetching never
+    takes a worker from a query somebody clicked for.
+    """
+    return JobRunner(load_config()["prefetch"]["max_workers"])
+
+@st.cache_resource
+def get_job_cache():
+    prefetch = load_config()["prefetch"]
+    return JobCache(prefetch["cache_entries"], prefetch["ttl_seconds"])
+
+@st.cache_resource
+def get_feature_matrix():
+    """
+    Root cause feature matrix of the batches shared by all sessions, kept
+    up to date by refresh_feature_matrix.
+    """
+    from root_cause import FeatureMatrix
+    return FeatureMatrix()
+
+@st.cache_resource
+def load_image(path):
+    with open(path, 'rb') as image_file:
+        return image_file.read()
+
+config = load_config()
+driver = get_driver()
 html_file_path = config["html_file_path"]
-legend_mapping = config["legend_mapping"]
 tredence_logo = config["tredence_logo"]
 chatgpt_icon = config["chatgpt_icon"]
+table_page_size = config["table_page_size"]
+explore_limit = config["explore_limit"]
+node_budget = config["node_budget"]
+result_budget = config["result_budget"]
+profile_log_path = config["profile_log_path"]
+bookmarks_path = config["neo4j"]["bookmarks_path"]
+job_timeout = config["jobs"]["timeout_seconds"]
+job_poll_seconds = config["jobs"]["poll_seconds"]
+prefetch = config["prefetch"]
+root_cause = config["root_cause"]
+genealogy = config["genealogy"]
+intent_config = config["intents"]
+tracer = get_tracer()
+job_runner = get_job_runner()
+prefetch_runner = get_prefetch_runner()
+job_cache = get_job_cache()
 
-# Options
-options_list = ["Manufacturing Knowledge Graph", "Batch Genealogy", "Assets Traceability"]
-asset_questions = [
-    "Asset Monitoring",
-    "Provide a list of assets with both AMC and insurance coverage of less than 2 years?",
-    "Identify the most utilized assets?"
-]
-batch_questions = [
-    "Monitor the status and progress of all batches?",
-    "Which materials are being consumed the most in the production process?",
-    "Visualize how Process Orders are converted into batches?",
-    "Which batches have a quality rating below 95%?",
-    "How is the distribution of products across different warehouses managed?"
-]
+def read_session():
+    """
+    Session for the queries of the UI, which all run in execute_read: routed
+    to a reader, retried with backoff on transient errors (leader switch,
+    lost connection) and, after a load, not answered before the bookmarks
+    written by ingest.py are visible.
+    """
+    return driver.session(bookmarks=load_bookmarks(bookmarks_path))
 
 @st.cache_data
-def get_id_list(node):
+def get_id_list(node, start_date=None, end_date=None):
     """
-    Fetch distinct IDs of a specific node type.
+    Fetch distinct IDs of a specific node type, with a window only the ones
+    whose StartDate is inside it.
     """
-    with driver.session() as session:
+    if start_date is None:
         query = f"MATCH (n:{node}) RETURN DISTINCT n.id"
-        results = session.run(query)
-        return sorted([row["n.id"] for row in results])
+        params = {}
+    else:
+        query = f"MATCH (n:{node}) WHERE {time_window_predicate('n')} RETURN DISTINCT n.id"
+        params = {"start_date": start_date, "end_date": end_date}
+    with read_session() as session:
+        return session.execute_read(lambda tx: sorted([row["n.id"] for row in tx.run(query, **params)]))
+
+@st.cache_data
+def get_date_range():
+    """
+    First and last StartDate of the production history.
+    """
+    with read_session() as session:
+        record = session.execute_read(lambda tx: tx.run("""
+        CALL {
+            MATCH (n:ProcessOrder) RETURN n.StartDate AS day
+            UNION ALL MATCH (n:Batch) RETURN n.StartDate AS day
+            UNION ALL MATCH (n:WO) RETURN n.StartDate AS day
+        }
+        RETURN min(day) AS first, max(day) AS last
+        """).single())
+    # neo4j dates -> datetime.date, an empty database gets today
+    first, last = [d.to_native() if hasattr(d, "to_native") else d or date.today()
+                   for d in (record["first"], record["last"])]
+    return first, last
 
 @st.cache_data
-def get_asset_data():
+def get_asset_data(start_date, end_date):
     """
     Retrieve data for assets, batches, and related entities.
+    POs, batches and WOs are limited to the production window.
     """
     with st.spinner("Loading data from GraphDB..."):
         return {
-            "batch_ids": get_id_list("Batch"),
+            "batch_ids": get_id_list("Batch", start_date, end_date),
             "asset_ids": get_id_list("Asset"),
             "facility_ids": get_id_list("Facility"),
             "site_ids": get_id_list("Site"),
             "region_ids": get_id_list("Region"),
-            "po_ids": get_id_list("ProcessOrder"),
+            "po_ids": get_id_list("ProcessOrder", start_date, end_date),
             "product_ids": get_id_list("Product"),
             "supplier_ids": get_id_list("Supplier"),
             "material_ids": get_id_list("Materials"),
-            "wo_ids": get_id_list("WO")
+            "wo_ids": get_id_list("WO", start_date, end_date)
         }
 
-def get_graph_data(query,session):
+@st.cache_resource
+def get_intent_router(start_date, end_date):
+    """
+    Intent router of the GEN AI tab with the ids of the production window,
+    built once per window and shared by all sessions.
+    """
+    from intents import IntentRouter
+    data = get_asset_data(start_date, end_date)
+    return IntentRouter({"po_ids": data["po_ids"], "batch_ids": data["batch_ids"], "asset_ids": data["asset_ids"]},
+                        intent_config["min_score"], intent_config["entity_bonus"])
+
+def window_params(params=None):
+    """
+    Query parameters plus the production window selected in the sidebar.
+    """
+    return dict(st.session_state.get("time_window", {}), **(params or {}))
+
+def profiling_mode():
+    """
+    None when queries are not profiled, else whether the PROFILE plan is collected too.
+    """
+    if not st.session_state.get("profile_queries"):
+        return None
+    return st.session_state.get("profile_plan", False)
+
+def run_query(query, session, params, profile, budget=None):
+    """
+    Execute a query, with profile not None the result is drained here, up
+    to the result budget if given, and its timings are recorded.
+    Returns (data, stats); safe off the script thread.
+    """
+    if profile is None:
+        return session.run(query, params), None
+    data, stats = run_profiled(session, query, params, profile=profile, budget=budget)
+    log_query_stats(stats, profile_log_path)
+    return data, stats
+
+def get_graph_data(query,session,params=None):
     """  
     Execute a query and fetch graph data.
+    In profiling mode the result is drained here and its timings are recorded.
     """
-    data = session.run(query)
+    data, stats = run_query(query, session, params, profiling_mode())
+    if stats is not None:
+        st.session_state["query_stats"] = stats
     return data
 
-def generate_nodes_edges(data):
-    net = Network(
-        notebook=False,
-        cdn_resources="remote",
-        bgcolor="white",
-        font_color="black",
-        height="750px",
-        width="100%",
-        select_menu=True,
-        # filter_menu=False
-    )
-    # net.show_buttons(filter_=True)
-    # Adjust physics settings
-    net.barnes_hut(gravity=-50000, central_gravity=0.3, spring_length=75, spring_strength=0.05, damping=0.09)
-    # net.repulsion()
-    added_nodes = set()
-    node_properties = {}
-    batch_connections = {}
-    wo_connections = {}
-    asset_connections = {}
-    for record in data:
-        for key, value in record.items():
-            if value is not None and "id" in value.keys() and value["id"] not in added_nodes:
-                node_id = value.get('id')
-                node_label = list(value.labels)[0].upper() if value.labels else "UNKNOWN"
-                node_color = legend_mapping.get(node_label, "#000000")
-                node_size = 25  # Default size
-                node_prop_html = "\n".join(f"{k} : {v}" for k, v in value._properties.items())
-
-                if node_label == "lims".upper() and value._properties.get("Status") == "Failed":
-                    node_color = "red"
-                if node_label == "ProcessOrder".upper():
-                    node_size =  50 # Increase size
-                if node_label == "batch".upper():
-                    node_size = 35  # Increase size
-                if node_label == "asset".upper():
-                    node_size = 35  # Increase size
-                if node_label == "Attributes".upper() and value._properties.get("Temperature") > 24:
-                    node_color = "red"
-
-                net.add_node(node_id, label=value.get('Name'), title=node_prop_html, color = node_color, size=node_size)
-                added_nodes.add(node_id)
-                node_properties[node_id] = value._properties
-
-                # Track batch connections
-                if node_label == "batch".upper():
-                    batch_connections[node_id] = []
-                elif node_label == "wo".upper():
-                    wo_connections[node_id] = []
-                elif node_label == "asset".upper():
-                    asset_connections[node_id] = []
-
-        for key, value in record.items():
-            if value is not None and hasattr(value, 'start_node'):
-                if value.start_node["id"] in added_nodes and value.end_node["id"] in added_nodes:
-                    net.add_edge(value.start_node["id"], value.end_node["id"], title=value.type)
-
-                    # Track batch to LIMS connections
-                    start_label = list(value.start_node.labels)[0].upper() if value.start_node.labels else "UNKNOWN"
-                    end_label = list(value.end_node.labels)[0].upper() if value.end_node.labels else "UNKNOWN"
-                    if start_label == "batch".upper() and end_label == "LIMS":
-                        batch_connections[value.start_node["id"]].append(value.end_node["id"])
-                    elif start_label == "LIMS" and end_label == "batch".upper():
-                        batch_connections[value.end_node["id"]].append(value.start_node["id"])
-
-                    # Track WO connections
-                    if start_label == "wo".upper() and end_label == "asset".upper():
-                        wo_connections[value.start_node["id"]].append(value.end_node["id"])
-                    elif start_label == "asset".upper() and end_label == "wo".upper():
-                        wo_connections[value.end_node["id"]].append(value.start_node["id"])
-
-                    # Track asset to OEE connections
-                    if start_label == "asset".upper() and end_label == "Attributes".upper():
-                        asset_connections[value.start_node["id"]].append(value.end_node["id"])
-                    elif start_label == "Attributes".upper() and end_label == "asset".upper():
-                        asset_connections[value.end_node["id"]].append(value.start_node["id"])
-
-    #Update batch nodes color if any connected LIMS node failed
-    failed_batches = set()
-    for batch_id, lims_ids in batch_connections.items():
-        for lims_id in lims_ids:
-            if node_properties[lims_id].get("Status") == "Failed":
-                net.get_node(batch_id)["color"] = "red"
-                failed_batches.add(batch_id)
-                break
-    #Update asset nodes color if any connected OEE node has OEE < 70
-    for asset_id, machine_ids in asset_connections.items():
-        for id in machine_ids:
-            if node_properties[id].get("Temperature") > 24:
-                net.get_node(asset_id)["color"] = "red"
+def show_performance_panel():
+    """
+    Collapsible panel with the numbers of the last profiled query.
+    """
+    stats = st.session_state.get("query_stats")
+    if not st.session_state.get("profile_queries") or stats is None:
+        return
+    with st.expander("Performance"):
+        available, consumed, client, rows, size = st.columns([1,1,1,1,1])
+        available.metric("Server planning + first row", f"{stats['result_available_after_ms']} ms")
+        consumed.metric("Server streaming", f"{stats['result_consumed_after_ms']} ms")
+        client.metric("Client total", f"{stats['client_ms']} ms")
+        rows.metric("Rows", stats["rows"])
+        size.metric("Payload", f"{stats['bytes'] / 1024:.1f} KB")
+        if stats["operators"]:
+            st.caption(f"PROFILE: {stats['db_hits']} db hits")
+            st.dataframe(stats["operators"], use_container_width=True, hide_index=True)
+        st.code(stats["query"], language="cypher")
+        if config["tracing"]["exporter"] == "file":
+            st.caption("Stage timings for this view")
+            st.dataframe(get_stage_timings().percentiles(st.session_state.get("trace_view")),
+                         use_container_width=True, hide_index=True)
+
+def graph_html(data):
+    """
+    Convert records into a PyVis graph and return its HTML page.
+    """
+    with tracer.span("generate_nodes_edges") as span:
+        graph, node_properties = generate_nodes_edges(data)
+        span["nodes"] = len(graph.nodes)
+        span["edges"] = len(graph.edges)
+    with tracer.span("save_graph_file") as span:
+        updated_html = save_graph_file(graph, html_file_path)
+        span["html_bytes"] = len(updated_html.encode("utf-8"))
+    return updated_html
+
+def build_graph_html(data):
+    with st.spinner("Converting into Graph ..."):
+        return graph_html(data)
+
+def render_graph_html(updated_html):
+    with tracer.span("components.html"):
+        import streamlit.components.v1 as components
+        components.html(updated_html, height=1400, width=1200)
+
+def graph_job(job, query, params, view, profile):
+    """
+    Body of a background graph job. It runs on a worker thread, so everything
+    it needs from the session comes in as arguments.
+    Records are streamed until the result budget of nodes/relationships is
+    hit, profiled or not. execute_read then commits the read transaction and
+    the driver discards the records not read yet instead of fetching them.
+    The transaction has a server-side timeout, so an abandoned query stops.
+    The job also summarizes and converts the graph, a click on a prefetched
+    query only has to render the page.
+    """
+    from neo4j import unit_of_work
+
+    @unit_of_work(timeout=job_timeout)
+    def collect(tx):
+        data, stats = run_query(query, tx, params, profile, result_budget)
+        subgraph, truncated = collect_within_budget(job.track(data), result_budget["nodes"],
+                                                    result_budget["relationships"])
+        return subgraph, truncated or bool(stats and stats["truncated"]), stats
+
+    with tracer.span("visualize_graph", view=view):
+        with read_session() as session:
+            with tracer.span("get_graph_data") as span:
+                subgraph, truncated, stats = session.execute_read(collect)
+                span["nodes"] = len(subgraph["nodes"])
+                span["relationships"] = len(subgraph["relationships"])
+                span["truncated"] = truncated
+        with tracer.span("summarize_subgraph") as span:
+            records, groups = summarize_subgraph(subgraph, node_budget)
+            span["groups"] = len(groups)
+        html = graph_html(records)
+    return {"subgraph": subgraph, "expanded": set(), "truncated": truncated, "stats": stats,
+            "html": html, "groups": groups}
+
+def shared_graph_job(query, params, profile):
+    """
+    Job for a graph query somebody asked for. Unprofiled queries share their
+    job through the job cache, so a prefetched or earlier result, finished
+    or still running, is reused; a prefetch still waiting for a worker is
+    replaced by a job in the foreground pool.
+    """
+    view = st.session_state.get("trace_view")
+    if profile is not None:
+        return job_runner.submit(graph_job, query, params, view, profile)
+    key = query_key(query, params)
+    job = job_cache.get(key)
+    if job is None or (job.status == "queued" and job.runner is prefetch_runner):
+        if job is not None:
+            job.cancel()
+        job = job_runner.submit(graph_job, query, params, view, None)
+        job_cache.put(key, job)
+    return job
+
+def prefetch_graph(query, params):
+    """
+    Start a graph query in the prefetch pool unless its result is cached or
+    on its way already. Returns the job.
+    """
+    key = query_key(query, params)
+    job = job_cache.get(key)
+    if job is None:
+        job = prefetch_runner.submit(graph_job, query, params, "prefetch", None)
+        job_cache.put(key, job)
+    return job
+
+def recent_pos_job(job, window, limit):
+    """
+    Prefetch the lineage of the POs started last in the window.
+    """
+    with read_session() as session:
+        po_ids = session.execute_read(
+            lambda tx: [row["id"] for row in tx.run(RECENT_PROCESS_ORDERS, window, limit=limit)])
+    for po_id in po_ids:
+        prefetch_graph(PO_LINEAGE, dict(window, po_ids=[po_id]))
+    return po_ids
+
+@st.cache_resource
+def warm_recent_pos(start_date, end_date):
+    """
+    Warm the job cache with the most recently active POs, once per process and window.
+    """
+    if prefetch["enabled"]:
+        prefetch_runner.submit(recent_pos_job, {"start_date": start_date, "end_date": end_date},
+                               prefetch["recent_pos"])
+
+def genealogy_job(job, batch_id, direction, view):
+    """
+    Body of a genealogy job: trace the batch level by level within the
+    genealogy limits, then fetch the batches and CONSUMED_BY relationships
+    of the nearest levels that fit into the node budget and convert them
+    like graph_job does. Batches have no parent to collapse under, so the
+    graph shows fewer levels instead.
+    """
+    from neo4j import unit_of_work
+    from genealogy import cypher_neighbours, trace
+
+    @unit_of_work(timeout=job_timeout)
+    def collect(tx):
+        dag = trace(cypher_neighbours(tx, direction, job.track), batch_id, direction, **genealogy)
+        shown = set()
+        for level in dag.levels:
+            if len(shown) + len(level) > node_budget:
                 break
-    return net, node_properties
-
-def save_graph_file(graph,html_file_path):
-    top_position=150
-    # Add legend to the HTML file
-    legend_html = f"""
-    <style>
-        #legend {{
-            position: absolute;
-            top: {top_position}px; /* Adjusted top position */
-            right: 10px;
-            background: rgba(255, 255, 255, 0.8);
-            border: 1px solid black;
-            padding: 10px;
-            display: none; /* Initially hidden */
-            z-index: 1000;
-        }}
-        #legend h5 {{
-            margin: 0;
-            padding: 0;
-            text-align: center;
-        }}
-        #legend ul {{
-            list-style: none;
-            padding: 0;
-            margin: 0;
-        }}
-        #legend li {{
-            margin: 5px 0;
-            display: flex;
-            align-items: center;
-        }}
-        #legend span {{
-            width: 15px;
-            height: 15px;
-            display: inline-block;
-            margin-right: 10px;
-            border: 1px solid #000;
-        }}
-        #legend-toggle {{
-            position: absolute;
-            top: {top_position - 40}px; /* Adjusted top position */
-            right: 10px;
-            padding: 5px 10px;
-            background: #28a745; /* Green color */
-            color: white;
-            border: none;
-            cursor: pointer;
-            z-index: 1000;
-        }}
-        #legend-toggle:hover {{
-            background: #218838; /* Darker green on hover */
-        }}
-    </style>
-    <button id="legend-toggle">Node Info</button>
-    <div id="legend">
-        <h5>Node Legend</h5>
-        <ul>
-    """
-    for node_type, color in legend_mapping.items():
-        legend_html += f'<li><span style="background: {color};"></span> {node_type}</li>'
-    legend_html += """
-        </ul>
-    </div>
-    <script>
-        document.getElementById('legend-toggle').addEventListener('click', function() {
-            var legend = document.getElementById('legend');
-            if (legend.style.display === 'none' || legend.style.display === '') {
-                legend.style.display = 'block';
-            } else {
-                legend.style.display = 'none';
-            }
-        });
-    </script>
-    """
-    graph.save_graph(html_file_path)
-    with open(html_file_path, 'r', encoding='utf-8') as html_file:
-        source_code = html_file.read()
-    updated_html = source_code.replace("</body>", legend_html + "</body>")
-    with open(html_file_path, 'w', encoding='utf-8') as html_file:
-        html_file.write(updated_html)
-    components.html(updated_html, height=1400, width=1200)
-
-def visualize_graph(query):
-    """
-    Visualize the graph using PyVis.
-    """
-    with driver.session() as session:
-        data = get_graph_data(query,session)  # Fetch all records at once
-        with st.spinner("Converting into Graph ..."):
-            graph, node_properties = generate_nodes_edges(data)
-            save_graph_file(graph, html_file_path)
-    driver.close()
-
-def visualize_table(query):
-    """
-    Visualize the the data as Table.
-    """
-    with driver.session() as session:
-        with st.spinner("Executing query..."):
+            shown.update(level)
+        edges = [[consumed, consumer] for consumed, consumer, _ in dag.edges
+                 if consumed in shown and consumer in shown]
+        records = itertools.chain(tx.run(GENEALOGY_ROOT, batch_id=batch_id), tx.run(GENEALOGY_EDGES, edges=edges))
+        subgraph, truncated = collect_within_budget(job.track(records), result_budget["nodes"],
+                                                    result_budget["relationships"])
+        return dag, subgraph, truncated
+
+    with tracer.span("visualize_graph", view=view):
+        with read_session() as session:
+            with tracer.span("get_graph_data") as span:
+                dag, subgraph, truncated = session.execute_read(collect)
+                span["levels"] = dag.depth
+                span["nodes"] = len(subgraph["nodes"])
+                span["relationships"] = len(subgraph["relationships"])
+                span["truncated"] = truncated
+        with tracer.span("summarize_subgraph") as span:
+            records, groups = summarize_subgraph(subgraph, node_budget)
+            span["groups"] = len(groups)
+        html = graph_html(records)
+    return {"subgraph": subgraph, "expanded": set(), "truncated": truncated, "stats": None,
+            "html": html, "groups": groups, "dag": dag}
+
+def trace_genealogy(key, batch_id, direction):
+    """
+    Start a genealogy job; show_graph renders it like any graph job and
+    show_genealogy adds its levels.
+    """
+    wait_for(key, job_runner.submit(genealogy_job, batch_id, direction, st.session_state.get("trace_view")))
+
+def show_genealogy(key):
+    """
+    Batches, edges and cut batches per level of a traced genealogy.
+    """
+    graph = st.session_state.get(key)
+    if graph is None or "dag" not in graph:
+        return
+    dag = graph["dag"]
+    st.caption(f"{len(dag)} batches in {dag.depth} levels {dag.direction} of {dag.root}")
+    if len(graph["subgraph"]["nodes"]) < len(dag):
+        st.info(f"The graph shows the levels within {node_budget} batches, the table counts all of them.")
+    if not dag.complete:
+        st.warning(f"The genealogy goes beyond {genealogy['max_depth']} levels or {genealogy['max_nodes']} "
+                   f"batches and was cut off.")
+    if dag.cut:
+        st.info(f"{len(dag.cut)} batches have more than {genealogy['max_fanout']} neighbours, "
+                f"only the first {genealogy['max_fanout']} by id are traced.")
+    st.dataframe(dag.summary(), use_container_width=True, hide_index=True)
+
+def release(key):
+    """
+    Stop waiting for the job under key, if any, and forget it. Jobs are
+    shared between sessions, so it is only cancelled when nobody else
+    waits for it.
+    """
+    previous = st.session_state.pop(key, None)
+    if previous is not None and "job" in previous:
+        previous["job"].leave()
+
+def wait_for(key, job):
+    """
+    Keep job under key for show_graph, leaving the job the session waited
+    for there before.
+    """
+    previous = st.session_state.get(key)
+    if previous is not None and previous.get("job") is job:
+        return
+    release(key)
+    st.session_state[key] = {"job": job.join()}
+
+def visualize_graph(key, query, params=None):
+    """
+    Start a graph query as a background job, or join the shared one, and
+    show_graph picks its subgraph up into session state and renders it within
+    the node budget. The job the session waited for under the same key is
+    left, and cancelled if no other session waits for it.
+    Every stage is traced: query -> summarize -> convert -> save -> render.
+    """
+    wait_for(key, shared_graph_job(query, window_params(params), profiling_mode()))
+
+@st.fragment(run_every=job_poll_seconds)
+def show_job_progress(key):
+    """
+    Progress of a running graph job with a button to cancel it; polls until
+    the job is over and then reruns the app to show the result.
+    """
+    graph = st.session_state.get(key)
+    if graph is None or "job" not in graph:
+        return
+    job = graph["job"]
+    if job.done():
+        st.rerun()
+    progress_col, cancel_col = st.columns([3,1])
+    with progress_col:
+        if job.status == "queued":
+            st.info("Waiting for a free query worker ...")
+        else:
+            st.info(f"Running query ... {job.rows} rows received in {job.elapsed():.1f} s")
+    with cancel_col:
+        if st.button("Cancel query", key=f"{key}_cancel"):
+            # other sessions may wait for the same job, only this one stops
+            release(key)
+            st.session_state[key] = {"cancelled": True}
+            st.rerun()
+
+def collect_job(key):
+    """
+    The graph of a finished job, None while it runs or after it was cancelled.
+    A failed job raises its error once and is dropped.
+    """
+    job = st.session_state[key]["job"]
+    if not job.done() and not job.cancelled:
+        show_job_progress(key)
+        return None
+    release(key)
+    if job.cancelled:
+        st.info("Query cancelled")
+        return None
+    try:
+        # shared with other sessions, each one expands its own copy
+        graph = dict(job.result(), expanded=set())
+    except JobCancelled:
+        return None
+    stats = graph.pop("stats")
+    if stats is not None:
+        st.session_state["query_stats"] = stats
+    st.session_state[key] = graph
+    return graph
+
+def show_graph(key):
+    """
+    Render a graph started with visualize_graph. Above the node budget sibling
+    nodes are collapsed into super-nodes, which can be expanded one by one.
+    The page is kept with the graph and only rebuilt after a change to it.
+    """
+    graph = st.session_state.get(key)
+    if graph is not None and graph.get("cancelled"):
+        del st.session_state[key]
+        st.info("Query cancelled")
+        return
+    if graph is not None and "job" in graph:
+        graph = collect_job(key)
+    if graph is None:
+        return
+    subgraph = graph["subgraph"]
+    if graph["truncated"]:
+        st.warning(f"The result is larger than {result_budget['nodes']} nodes or "
+                   f"{result_budget['relationships']} relationships and was cut off, "
+                   f"the graph shows the first {len(subgraph['nodes'])} nodes.")
+    with tracer.span("show_graph", view=st.session_state.get("trace_view")):
+        if "html" not in graph:
+            with tracer.span("summarize_subgraph") as span:
+                records, graph["groups"] = summarize_subgraph(subgraph, node_budget, graph["expanded"])
+                span["groups"] = len(graph["groups"])
+            graph["html"] = build_graph_html(records)
+        groups = graph["groups"]
+        if groups:
+            group_col, expand_col = st.columns([3,1])
+            with group_col:
+                choice = st.selectbox("Expand group", sorted(groups, key=groups.get),
+                                      format_func=groups.get, key=f"{key}_group")
+            with expand_col:
+                if st.button("Expand group", key=f"{key}_expand"):
+                    graph["expanded"].add(choice)
+                    del graph["html"]
+                    st.rerun(scope="fragment")
+            st.caption(f"{len(subgraph['nodes'])} nodes summarized into {len(groups)} groups "
+                       f"to stay within {node_budget} nodes")
+        render_graph_html(graph["html"])
+    if len(subgraph.get("entities", {})) > 1:
+        st.caption("Per selected id: its nodes and how many of them it shares with the others")
+        st.dataframe(entity_summary(subgraph), use_container_width=True, hide_index=True)
+    show_performance_panel()
+
+def expand_node(subgraph, label, node_id):
+    """
+    Fetch one hop around a node and merge it into the explored subgraph.
+    """
+    with tracer.span("expand_node", view=st.session_state.get("trace_view"), label=label) as span:
+        with read_session() as session:
+            data = session.execute_read(lambda tx: list(get_graph_data(
+                neighborhood_query(label), tx, {"node_id": node_id, "limit": explore_limit})))
+        span["records"] = len(data)
+        span["new_nodes"] = merge_records(subgraph, data)
+    subgraph["expanded"].add(node_id)
+    subgraph.pop("html", None)
+
+def start_exploration(key, label, node_id):
+    """
+    Start explore mode on a node: the node and its direct neighbours only,
+    further branches are fetched when the user expands them.
+    """
+    subgraph = new_subgraph()
+    expand_node(subgraph, label, node_id)
+    st.session_state[key] = subgraph
+
+def show_exploration(key):
+    """
+    Render the subgraph explored so far with a picker to expand one more node.
+    """
+    subgraph = st.session_state.get(key)
+    if subgraph is None:
+        return
+    candidates = {}
+    for node in subgraph["nodes"].values():
+        if "id" in node and node["id"] not in subgraph["expanded"]:
+            label = list(node.labels)[0]
+            candidates[f"{label} {node['id']}"] = (label, node["id"])
+    node_col, expand_col = st.columns([3,1])
+    with node_col:
+        choice = st.selectbox("Expand node", sorted(candidates), key=f"{key}_node")
+    with expand_col:
+        if st.button("Expand", key=f"{key}_expand", disabled=not candidates):
             with st.spinner("Data Loading ...."):
-                graphData = get_graph_data(query,session)
-                keys = graphData.keys()
-        with st.spinner("Converting into RESULT ..."):
-            df = pd.DataFrame(graphData, columns=keys)
-            st.table(df)
-    driver.close()
-    
+                expand_node(subgraph, *candidates[choice])
+            st.rerun(scope="fragment")
+    st.caption(f"{len(subgraph['nodes'])} nodes, {len(subgraph['relationships'])} relationships, "
+               f"{len(subgraph['expanded'])} expanded")
+    with tracer.span("show_exploration", view=st.session_state.get("trace_view")):
+        if "html" not in subgraph:
+            subgraph["html"] = build_graph_html(subgraph_records(subgraph))
+        render_graph_html(subgraph["html"])
+    show_performance_panel()
+
+def visualize_table(key, params=None, table=None):
+    """
+    Visualize the data of a canned table query as a keyset paginated Table.
+    Only the visible page is fetched; the cursor stack lives in session state
+    under key. table is the table_queries key of the query, key by default.
+    """
+    query, order_keys = table_queries[table or key]
+    st.session_state[key] = {
+        "query": query,
+        "order_keys": order_keys,
+        "params": window_params(params),
+        "cursors": [None]
+    }
+
+def collect_page(key):
+    """
+    The table under key with the first page of its finished job, None while
+    the job runs or after it was cancelled. A failed job raises its error
+    once and is dropped with the table.
+    """
+    table = st.session_state[key]
+    job = table["job"]
+    if not job.done() and not job.cancelled:
+        show_job_progress(key)
+        return None
+    release(key)
+    if job.cancelled:
+        st.info("Query cancelled")
+        return None
+    try:
+        table["page"] = job.result()
+    except JobCancelled:
+        return None
+    del table["job"]
+    st.session_state[key] = table
+    return table
+
+def show_table(key):
+    """
+    Render the current page of a table started with visualize_table.
+    The page is kept with the table and only fetched again after paging;
+    a first page coming from a job is waited for like a graph job.
+    """
+    table = st.session_state.get(key)
+    if table is not None and table.get("cancelled"):
+        del st.session_state[key]
+        st.info("Query cancelled")
+        return
+    if table is not None and "job" in table:
+        table = collect_page(key)
+    if table is None:
+        return
+    params = dict(table["params"], after=table["cursors"][-1], page_size=table_page_size)
+    with tracer.span("show_table", view=st.session_state.get("trace_view"), table=key):
+        if "page" not in table:
+            with read_session() as session:
+                with st.spinner("Data Loading ...."):
+                    with tracer.span("get_graph_data") as span:
+                        table["page"] = session.execute_read(
+                            lambda tx: records_to_arrow(get_graph_data(table["query"], tx, params)))
+                        span["records"] = table["page"].num_rows
+        page = table["page"]
+        with tracer.span("st.dataframe") as span:
+            span["arrow_bytes"] = page.nbytes
+            st.dataframe(page, use_container_width=True, hide_index=True)
+    prev_col, page_col, next_col = st.columns([1,1,1])
+    with prev_col:
+        if st.button("Previous", key=f"{key}_prev", disabled=len(table["cursors"]) == 1):
+            table["cursors"].pop()
+            del table["page"]
+            st.rerun(scope="fragment")
+    with page_col:
+        st.caption(f"Page {len(table['cursors'])}")
+    with next_col:
+        if st.button("Next", key=f"{key}_next", disabled=page.num_rows < table_page_size):
+            last = page.slice(page.num_rows - 1).to_pylist()[0]
+            table["cursors"].append([last[column] for column, _ in table["order_keys"]])
+            del table["page"]
+            st.rerun(scope="fragment")
+    show_performance_panel()
+
+# Each view is a fragment: its widgets rerun only the view itself, and its
+# last graph/table stays in session state, so an unrelated interaction never
+# queries Neo4j or renders PyVis again.
+
+@st.fragment
+def ui_tracking_view(option, data):
+    st.session_state["trace_view"] = f"{option} x UI Tracking"
+    st.header("Visualize all batches and assets executed for a Process Order (PO)")
+    selected_POs = st.multiselect("Select POs ", data['po_ids'], default=data['po_ids'][:1])
+    if prefetch["enabled"] and selected_POs:
+        # speculative: the lineage is on its way before the button is clicked
+        previous = st.session_state.get("po_prefetch")
+        job = prefetch_graph(PO_LINEAGE, window_params({"po_ids": selected_POs}))
+        if previous is not job:
+            if previous is not None:
+                previous.leave(only_queued=True)
+            st.session_state["po_prefetch"] = job.join()
+    if st.button("Query Knowledge Graph"):
+        with st.spinner("Executing query..."):
+            try:
+                with st.spinner("Data Loading ...."):
+                    visualize_graph("po_graph", PO_LINEAGE, {"po_ids": selected_POs})
+            except Exception as e:
+                st.error(f"Error executing query: {e}")
+    try:
+        show_graph("po_graph")
+    except Exception as e:
+        st.error(f"Error executing query: {e}")
+    try:
+        # explore mode starts from one node, the first selected PO
+        if st.button("Explore PO", disabled=not selected_POs):
+            start_exploration("po_explore", "ProcessOrder", selected_POs[0])
+        show_exploration("po_explore")
+    except Exception as e:
+        st.error(f"Error executing query: {e}")
+
+def refresh_feature_matrix(matrix):
+    """
+    Add the batches that started since the latest one of the matrix, going
+    back lookback_days for LIMS results that came in later; all batches the
+    first time. Batches older than that still pending get their outcome
+    again. At most once every refresh_seconds.
+    """
+    if matrix.refreshed is not None and time.time() - matrix.refreshed < root_cause["refresh_seconds"]:
+        return
+    import pandas as pd
+    latest = matrix.latest()
+    since = date.min if latest is None else \
+        pd.Timestamp(latest).date() - timedelta(days=root_cause["lookback_days"])
+    runs = [(ROOT_CAUSE_ASSETS, {"since": since}), (ROOT_CAUSE_MATERIALS, {"since": since})]
+    pending = matrix.pending(before=since)
+    if pending:
+        runs.append((ROOT_CAUSE_OUTCOMES, {"batch_ids": pending}))
+    with read_session() as session:
+        with tracer.span("get_graph_data", query="root_cause") as span:
+            assets, materials, *results = session.execute_read(lambda tx: [
+                pd.DataFrame([record.data() for record in tx.run(query, **params)]) for query, params in runs])
+            span["records"] = len(assets) + len(materials) + sum(map(len, results))
+    for outcomes in results:
+        if len(outcomes):
+            matrix.update_outcomes(outcomes)
+    if len(assets):
+        matrix.update(assets, materials)
+    else:
+        matrix.refreshed = time.time()
+
+def show_root_causes():
+    """
+    Factors of the failed batches in the production window, ranked by lift
+    against the passed batches of the same products.
+    """
+    if st.button("Rank Root Causes"):
+        matrix = get_feature_matrix()
+        with st.spinner("Ranking root causes ...."):
+            refresh_feature_matrix(matrix)
+            window = st.session_state.get("time_window", {})
+            st.session_state["root_causes"] = matrix.suspects(
+                window.get("start_date"), window.get("end_date"), root_cause["min_failed"], root_cause["top"])
+    if "root_causes" in st.session_state:
+        st.caption("Lift: failures of the batches with the factor over the failures expected from "
+                   "the failure rate of their products")
+        st.dataframe(st.session_state["root_causes"], use_container_width=True, hide_index=True)
+
+@st.fragment
+def saved_question_view(option, data):
+    st.session_state["trace_view"] = f"{option} x Saved Question"
+    st.header("Query the failed batches and its root cause?")
+    try:
+        show_root_causes()
+        if st.button("Query Graph"):
+            visualize_graph("failed_graph", FAILED_BATCH_ROOT_CAUSE)
+        show_graph("failed_graph")
+        selected_PO = st.selectbox("Select Process order ", data['po_ids'])
+        if st.button("TABLE"):
+            visualize_table("failed_batch_table", {"po_id": selected_PO})
+        show_table("failed_batch_table")
+    except Exception as e:
+        st.error(f"Error executing query: {e}")
+
+def table_page_job(job, query, params):
+    """
+    First page of a table query as an Arrow table.
+    """
+    with read_session() as session:
+        return session.execute_read(lambda tx: records_to_arrow(get_graph_data(query, tx, params)))
+
+def answer(route):
+    """
+    Job answering a routed question, cached by (intent, parameters): a
+    repeated or paraphrased question gets the job of the first one, running
+    or finished, while the job cache keeps it. Returns (job, cached).
+    """
+    params = window_params(route["params"])
+    key = query_key(f"intent:{route['intent']}", params)
+    job = job_cache.get(key)
+    if job is not None:
+        return job, True
+    if route["kind"] == "graph":
+        job = shared_graph_job(route["target"], params, None)
+    else:
+        query, _ = table_queries[route["target"]]
+        job = job_runner.submit(table_page_job, query, dict(params, after=None, page_size=table_page_size))
+    job_cache.put(key, job)
+    return job, False
+
+def ask(question):
+    """
+    Route a GEN AI question and start or reuse its answer; a graph shows in
+    "ai_graph", a table in "ai_answer_table". Both are background jobs the
+    session waits for with show_job_progress.
+    """
+    window = st.session_state["time_window"]
+    route = get_intent_router(window["start_date"], window["end_date"]).route(question)
+    if route["unknown"]:
+        st.warning(f"Not in the database: {', '.join(route['unknown'])}. Check the ids and ask again.")
+        return
+    if route["intent"] is None:
+        st.error("Please Try Again")
+        return
+    if route["ignored"]:
+        st.warning(f"The question names {', '.join(route['ignored'])}, which {route['intent']} does not use. "
+                   "Ask about one kind of id at a time.")
+        return
+    if route["missing"] is not None:
+        from intents import ID_HINTS
+        st.warning(f"Add {ID_HINTS[route['missing']]} to the question.")
+        return
+    job, cached = answer(route)
+    ids = ", ".join(value for values in route["params"].values() for value in values)
+    st.caption(f"{route['intent']}{f' of {ids}' if ids else ''} (score {route['score']})"
+               f"{', answered from the cache' if cached else ''}")
+    if route["kind"] == "graph":
+        release("ai_answer_table")
+        wait_for("ai_graph", job)
+    else:
+        release("ai_graph")
+        release("ai_answer_table")
+        visualize_table("ai_answer_table", route["params"], route["target"])
+        st.session_state["ai_answer_table"]["job"] = job.join()
+
+@st.fragment
+def gen_ai_view(option):
+    st.session_state["trace_view"] = f"{option} x GEN AI"
+    st.image(chatgpt_icon, width=50)
+    ai_search = st.text_input("AI CHATBOT", "")
+    if st.button("RUN"):
+        try:
+            ask(ai_search)
+        except Exception as e:
+            st.error(f"Error executing query: {e}")
+    try:
+        show_graph("ai_graph")
+        show_table("ai_answer_table")
+    except Exception as e:
+        st.error(f"Error executing query: {e}")
+
+@st.fragment
+def asset_view(option, data):
+    query_type = st.selectbox("Select Questions? ", asset_questions)
+    st.session_state["trace_view"] = f"{option} x {query_type}"
+    query = asset_queries[query_type]
+    params = {}
+    #Asset Monitoring
+    if query_type == asset_questions[0]:
+        selected_assets = st.multiselect("Select Assets", data['asset_ids'], default=data['asset_ids'][:1])
+        params = {"asset_ids": selected_assets}
+        try:
+            if st.button("Explore Asset", disabled=not selected_assets):
+                start_exploration("asset_explore", "Asset", selected_assets[0])
+            show_exploration("asset_explore")
+        except Exception as e:
+            st.error(f"Error executing query: {e}")
+    #Most utilized assets
+    elif query_type == asset_questions[2]:
+        if st.button("TABLE"):
+            visualize_table("utilized_assets_table")
+        try:
+            show_table("utilized_assets_table")
+        except Exception as e:
+            st.error(f"Error executing query: {e}")
+    graph_key = f"asset_graph_{asset_questions.index(query_type)}"
+    try:
+        if st.button("Visualize"):
+            visualize_graph(graph_key, query, params)
+        show_graph(graph_key)
+    except Exception as e:
+        st.error(f"Error executing query: {e}")
+
+@st.fragment
+def batch_view(option, data):
+    query_type = st.selectbox("Select Questions? ", batch_questions)
+    st.session_state["trace_view"] = f"{option} x {query_type}"
+    params = {}
+    #Most Consumed Materials
+    if query_type == batch_questions[1]:
+        if st.button("TABLE"):
+            visualize_table("consumed_materials_table")
+        try:
+            show_table("consumed_materials_table")
+        except Exception as e:
+            st.error(f"Error executing query: {e}")
+    #LIMS failure rate per product/site/line
+    elif query_type == batch_questions[5]:
+        if st.button("TABLE"):
+            visualize_table("failure_rate_table")
+        try:
+            show_table("failure_rate_table")
+        except Exception as e:
+            st.error(f"Error executing query: {e}")
+    #Batch to batch genealogy through intermediate batches
+    elif query_type == batch_questions[6]:
+        batch_col, direction_col = st.columns([2,1])
+        with batch_col:
+            selected_batch = st.selectbox("Select Batch", data['batch_ids'])
+        with direction_col:
+            direction = st.radio("Direction", ["upstream", "downstream"], horizontal=True)
+        try:
+            if st.button("Trace Genealogy"):
+                trace_genealogy("genealogy_graph", selected_batch, direction)
+            show_graph("genealogy_graph")
+            show_genealogy("genealogy_graph")
+        except Exception as e:
+            st.error(f"Error executing query: {e}")
+    #Assets and machines of several batches side by side
+    elif query_type == batch_questions[7]:
+        params = {"batch_ids": st.multiselect("Select Batches", data['batch_ids'], default=data['batch_ids'][:2])}
+    graph_key = f"batch_graph_{batch_questions.index(query_type)}"
+    try:
+        if query_type in batch_queries and st.button("Visualize"):
+            visualize_graph(graph_key, batch_queries[query_type], params)
+        show_graph(graph_key)
+    except Exception as e:
+        st.error(f"Error executing query: {e}")
+
 def app():
     footer()
     st.title("Batch and Asset Genealogy")
-    st.sidebar.image(tredence_logo, caption='', width=300)
+    st.sidebar.image(load_image(tredence_logo), caption='', width=300)
 
-    data = get_asset_data()
+    first_date, last_date = get_date_range()
+    window = st.sidebar.date_input("Production window", (first_date, last_date),
+                                   min_value=first_date, max_value=last_date)
+    # a range picker returns one date while the second one is being picked
+    # and none once it is cleared; then the window is the whole range
+    start_date, end_date = (window if len(window) == 2 else
+                            (window[0], last_date) if len(window) == 1 else (first_date, last_date))
+    st.session_state["time_window"] = {"start_date": start_date, "end_date": end_date}
+    warm_recent_pos(start_date, end_date)
+    data = get_asset_data(start_date, end_date)
     st.sidebar.subheader("Quick Stats")
     st.sidebar.info(f"Total Batches: {len(data['batch_ids'])}")
     st.sidebar.info(f"Total Assets: {len(data['asset_ids'])}")
     st.sidebar.info(f"Total Process Orders: {len(data['po_ids'])}")
 
     option = st.sidebar.radio("Select View", options_list)
+    if st.sidebar.toggle("Profile queries", key="profile_queries"):
+        st.sidebar.checkbox("Collect PROFILE plan", key="profile_plan")
 
     facility, site, region = st.columns([1,1,1])
     with facility:
@@ -310,141 +981,12 @@ def app():
         st.subheader(option)
         tab1, tab2, tab3 = st.tabs(["UI Tracking","Saved Question", "GEN AI"])
         with tab1:
-            st.header("Visualize all batches and assets executed for a Process Order (PO)")
-            selected_PO = st.selectbox("Select PO ", data['po_ids'])
-            if st.button("Query Knowledge Graph"):
-                with st.spinner("Executing query..."):
-                    try:
-                        with st.spinner("Data Loading ...."):
-                            query = f"""
-                            MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder)
-                            MATCH (b)-[YI:YIELDS]->(p:Product)
-                            MATCH (p)-[FW:FORMULATED_WITH]->(r:Recipe)
-                            MATCH (r)-[UM:USES_MATERIAL]->(m:Materials)
-                            MATCH (m)-[SB:SUPPLIED_BY]->(sup:Supplier)
-                            MATCH (m)-[SI:STORED_IN]->(pm:PlantMaterial)
-                            MATCH (pm)-[AA:AVAILABLE_AT]->(f:Facility)
-                            MATCH (f)-[LS:LOCATED_AT_SITE]->(s:Site)
-                            MATCH (s)-[LR:LOCATED_IN_REGION]->(re:Region)
-                            MATCH (b)-[EB:EXECUTED_BY]->(wo:WO)
-                            MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
-                            MATCH (wo)-[PER:PERFORMED_ON]->(a:Asset)
-                            MATCH (a)-[AL:ASSIGNED_TO_LINE]->(l:Line)
-                            MATCH (l)-[LF:LOCATED_IN_FACILITY]->(af:Facility)
-                            MATCH (a)-[HI:HAS_INFO]->(ai:AssetInfo)
-                            MATCH (a)-[HM:HAS_METADATA]->(ao:Operation)
-                            MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
-                            MATCH (a)-[HO:HAS_OEE]->(oee:OEE)
-                            MATCH (a)-[PBO:PROVIDED_BY_OEM]->(oem:OEM)
-                            WHERE po.id = "{selected_PO}"
-                            RETURN *
-                            """
-                            visualize_graph(query)
-                    except Exception as e:
-                        st.error(f"Error executing query: {e}")
+            ui_tracking_view(option, data)
         with tab2:
-            st.header("Query the failed batches and its root cause?")
-            try:
-                if st.button("Query Graph"):
-                    query = f"""
-                    MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder)
-                    MATCH (b)-[YI:YIELDS]->(p:Product)
-                    MATCH (p)-[FW:FORMULATED_WITH]->(r:Recipe)
-                    MATCH (r)-[UM:USES_MATERIAL]->(m:Materials)
-                    MATCH (m)-[SB:SUPPLIED_BY]->(sup:Supplier)
-                    MATCH (m)-[SI:STORED_IN]->(pm:PlantMaterial)
-                    MATCH (pm)-[AA:AVAILABLE_AT]->(f:Facility)
-                    MATCH (f)-[LS:LOCATED_AT_SITE]->(s:Site)
-                    MATCH (s)-[LR:LOCATED_IN_REGION]->(re:Region)
-                    MATCH (b)-[EB:EXECUTED_BY]->(wo:WO)
-                    MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
-                    MATCH (wo)-[PER:PERFORMED_ON]->(a:Asset)
-                    MATCH (a)-[AL:ASSIGNED_TO_LINE]->(l:Line)
-                    OPTIONAL MATCH (l)-[LF:LOCATED_IN_FACILITY]->(f)
-                    MATCH (a)-[HI:HAS_INFO]->(ai:AssetInfo)
-                    MATCH (a)-[HM:HAS_METADATA]->(ao:Operation)
-                    MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
-                    MATCH (a)-[HO:HAS_OEE]->(oee:OEE)
-                    MATCH (a)-[PBO:PROVIDED_BY_OEM]->(oem:OEM)
-                    WHERE lims.Status = "Failed" and am.Temperature >24
-                    RETURN *
-                    """
-                    visualize_graph(query)
-                selected_PO = st.selectbox("Select Process order ", data['po_ids'])
-                if st.button("TABLE"):
-                    query = f"""
-                    MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder)
-                    MATCH (b)-[EB:EXECUTED_BY]->(wo:WO)
-                    MATCH (wo)-[PER:PERFORMED_ON]->(a:Asset)
-                    MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
-                    MATCH (a)-[AL:ASSIGNED_TO_LINE]->(l:Line)
-                    MATCH (l)-[LF:LOCATED_IN_FACILITY]->(f:Facility)
-                    MATCH (f)-[LS:LOCATED_AT_SITE]->(s:Site)
-                    MATCH (s)-[LR:LOCATED_IN_REGION]->(re:Region)
-                    MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
-                    WHERE po.id = "{selected_PO}" AND lims.Status = "Failed" AND am.Temperature > 24
-                    RETURN po.id AS PO_ID, 
-                        b.id AS Batch_ID, 
-                        a.id AS Asset_ID,
-                        a.Name AS Asset_Name, 
-                        lims.Status AS Lims_Status,
-                        am.Temperature AS Machine_Temperature, 
-                        l.id AS Line_ID, 
-                        f.id AS Facility_ID, 
-                        s.Name AS Site, 
-                        re.Name AS Region
-                    """
-                    visualize_table(query)
-            except Exception as e:
-                st.error(f"Error executing query: {e}")
+            saved_question_view(option, data)
         #GEN AI
         with tab3:
-            st.image(chatgpt_icon, width=50)
-            ai_search = st.text_input("AI CHATBOT", "")
-            if st.button("RUN"):
-                try:
-                    batches = re.findall(r'batch(?:es|s)?', ai_search, flags=re.IGNORECASE)
-                    # pid = re.findall(r'PO\d+', ai_search, flags=re.IGNORECASE)[0]
-                    # all = re.findall(r'all?', ai_search, flags=re.IGNORECASE)
-                    failed = re.findall(r'fail?', ai_search, flags=re.IGNORECASE)
-                    asset = re.findall(r'asset(?:es|s)?', ai_search, flags=re.IGNORECASE)
-                    if batches:
-                        if failed:
-                            query = f"""
-                            MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder)
-                            MATCH (b)-[EB:EXECUTED_BY]->(wo:WO)
-                            MATCH (wo)-[PER:PERFORMED_ON]->(a:Asset)
-                            MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
-                            MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
-                            WHERE lims.Status = "Failed" AND am.Temperature > 24
-                            RETURN DISTINCT b.id AS Batch_ID
-                            """
-                            visualize_table(query)
-                    elif asset:
-                        bid = re.findall(r'BPO\d+-\d+-\d+', ai_search, flags=re.IGNORECASE)[0]
-                        if bid:
-                            st.text(bid)
-                        else:
-                            bid = st.text("batch id not available in the database")
-                        try:
-                            query = f"""
-                            MATCH (b:Batch)-[EB:EXECUTED_BY]->(wo:WO)
-                            MATCH (wo)-[PER:PERFORMED_ON]->(a:Asset)
-                            MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(machine:Attributes)
-                            MATCH (a)-[HM:HAS_METADATA]->(op:Operation)
-                            MATCH (a)-[HO:HAS_OEE]->(oee:OEE)
-                            MATCH (a)-[PBO:PROVIDED_BY_OEM]->(oem:OEM)
-                            WHERE b.id = "{bid}"
-                            RETURN *
-                            """
-                            visualize_graph(query)
-                        except Exception as e:
-                            st.error(f"Error executing query: {e}")
-                    else:
-                        st.error("Please Try Again")
-                except Exception as e:
-    
-                    st.error(f"Error executing query: {e}")
+            gen_ai_view(option)
     #Asset Traceability
     elif option == options_list[2]:
         with col1:
@@ -452,65 +994,7 @@ def app():
         with col2:
             st.info(f"Total WO : {len(data['wo_ids'])}")
         st.subheader(option)
-        query_type = st.selectbox("Select Questions? ", asset_questions)
-        #Asset Monitoring
-        if query_type == asset_questions[0]:
-            selected_asset = st.selectbox("Select Asset", data['asset_ids'])
-            query = f"""
-            MATCH (a:Asset {{id: '{selected_asset}'}})-[AL:ASSIGNED_TO_LINE]->(l:Line)
-            MATCH (l)-[LF:LOCATED_IN_FACILITY]->(f:Facility)
-            MATCH (f)-[FS:LOCATED_AT_SITE]->(s:Site)
-            MATCH (s)-[SR:LOCATED_IN_REGION]->(r:Region)
-            MATCH (a)-[HI:HAS_INFO]->(ai:AssetInfo)
-            MATCH (a)-[HM:HAS_METADATA]->(ao:Operation)
-            MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
-            MATCH (a)-[HO:HAS_OEE]->(oee:OEE)
-            MATCH (a)-[PBO:PROVIDED_BY_OEM]->(oem:OEM)
-            OPTIONAL MATCH (a)-[PER:PERFORMED_ON]->(wo:WO)
-            OPTIONAL MATCH (a)-[ENSURES_COMPLIANCE]->(com:Compliance)
-            OPTIONAL MATCH (a)-[REQUIRES_MAINTENANCE]->(main:Maintenance)
-            OPTIONAL MATCH (a)-[REQUIRES_CALIBRATION]->(cal:Calibration)
-            RETURN *
-            """
-        #AMC < 2years
-        elif query_type == asset_questions[1]:
-            query = f"""
-            MATCH (a:Asset)-[AL:ASSIGNED_TO_LINE]->(l:Line)
-            MATCH (l)-[LF:LOCATED_IN_FACILITY]->(f:Facility)
-            MATCH (f)-[FS:LOCATED_AT_SITE]->(s:Site)
-            MATCH (s)-[SR:LOCATED_IN_REGION]->(r:Region)
-            MATCH (a)-[HI:HAS_INFO]->(ai:AssetInfo)
-            MATCH (a)-[HM:HAS_METADATA]->(ao:Operation)
-            MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
-            MATCH (a)-[HO:HAS_OEE]->(oee:OEE)
-            MATCH (a)-[PBO:PROVIDED_BY_OEM]->(oem:OEM)
-            MATCH (a)-[ENSURES_COMPLIANCE]->(com:Compliance)
-            MATCH (a)-[REQUIRES_MAINTENANCE]->(main:Maintenance)
-            MATCH (a)-[REQUIRES_CALIBRATION]->(cal:Calibration)
-            WHERE ai.HasInsurance = "YES" AND ai.AMCYears < 2
-            RETURN *
-            """
-        #Most utilized assets
-        elif query_type == asset_questions[2]:
-            query = f"""
-            MATCH (a:Asset)<-[:PERFORMED_ON]-(wo:WO)
-            WITH a, count(wo) AS TotalWOs
-            SET a.TotalWOs = TotalWOs
-            RETURN a;
-            """
-            if st.button("TABLE"):
-                query = f"""
-                MATCH (a:Asset)<-[PER:PERFORMED_ON]-(wo:WO)
-                RETURN a.id AS AssetID, a.Name AS AssetName, count(wo) AS TotalWOs
-                ORDER BY TotalWOs DESC
-                LIMIT 10;
-                """
-                visualize_table(query)
-        if query_type != asset_questions[2] and st.button("Visualize"):
-            try:
-                visualize_graph(query)
-            except Exception as e:
-                st.error(f"Error executing query: {e}")
+        asset_view(option, data)
     #Batch Genealogy
     elif option == options_list[1]:
         with col1:
@@ -524,69 +1008,6 @@ def app():
         with col5:
             st.info(f"Total Supplier : {len(data['supplier_ids'])}")
         st.subheader(option)
-        query_type = st.selectbox("Select Questions? ", batch_questions)
-        #Monitor All Batchs
-        if query_type == batch_questions[0]:
-            # selected_batch = st.selectbox("Select Batch", data['batch_ids'])
-            query = f"""
-            MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder)
-            MATCH (b)-[YI:YIELDS]->(p:Product)
-            MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
-            MATCH (p)-[FW:FORMULATED_WITH]->(r:Recipe)
-            MATCH (r)-[UM:USES_MATERIAL]->(m:Materials)
-            MATCH (m)-[SB:SUPPLIED_BY]->(sup:Supplier)
-            MATCH (m)-[SI:STORED_IN]->(pm:PlantMaterial)
-            MATCH (pm)-[AA:AVAILABLE_AT]->(f:Facility)
-            MATCH (f)-[LS:LOCATED_AT_SITE]->(s:Site)
-            MATCH (s)-[LR:LOCATED_IN_REGION]->(re:Region)
-            RETURN *
-            """
-        #Most Consumed Materials
-        elif query_type == batch_questions[1]:
-            if st.button("TABLE"):
-                limit = st.number_input("Set a Limit", value=10, placeholder="Type a number...")
-                query = f"""
-                MATCH (m:Materials)<-[UM:USES_MATERIAL]-(r:Recipe)
-                MATCH (r)<-[FW:FORMULATED_WITH]-(p:Product)
-                MATCH (p)<-[YI:YIELDS]-(b:Batch)
-                MATCH (b)<-[MU:MANUFACTURES]-(po:ProcessOrder)
-                MATCH (m)-[SB:SUPPLIED_BY]->(sup:Supplier)
-                WITH m, SB, sup, count(b) AS TotalBatch
-                ORDER BY TotalBatch DESC
-                LIMIT {int(limit)}
-                RETURN m.id AS MaterialID, sup.id AS SupplierID, m.Location AS Location, TotalBatch, m.Storage AS Storage
-                """
-                visualize_table(query)
-        #PO to Batches
-        elif query_type == batch_questions[2]:
-            query = f"""
-            MATCH (b)<-[MU:MANUFACTURES]-(po:ProcessOrder)
-            RETURN *
-            """
-        #batches have a quality rating below 95%?
-        elif query_type == batch_questions[3]:
-            query = f"""
-            MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder)
-            MATCH (b)-[YI:YIELDS]->(p:Product)
-            MATCH (p)-[FW:FORMULATED_WITH]->(r:Recipe)
-            MATCH (r)-[UM:USES_MATERIAL]->(m:Materials)
-            MATCH (b)-[EB:EXECUTED_BY]->(wo:WO)
-            MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
-            WHERE lims.Status = 'Failed'
-            Return *
-            """
-        #Distribution of products to Warehouse
-        elif query_type == batch_questions[4]:
-            query = f"""
-            MATCH (b:Batch)-[WI:WAREHOUSED_IN]->(f:Facility)
-            MATCH (b)<-[MA:MANUFACTURES]-(po:ProcessOrder)
-            MATCH (b)-[YI:YIELDS]->(p:Product)
-            RETURN *
-            """
-        try:
-            if query_type != batch_questions[1] and st.button("Visualize"):
-                visualize_graph(query)
-        except Exception as e:
-            st.error(f"Error executing query: {e}") 
+        batch_view(option, data)
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    app()
@@ -0,0 +1,74 @@
+"""
+Time the bounded genealogy traversal of genealogy.py on a synthetic deep
+genealogy: --levels levels of --width batches, every batch made from
+--inputs batches of the level before it, traced upstream from one batch of
+the last level. Also counts the paths a variable-length Cypher pattern
+would enumerate for the same ancestors.
+
+    python benchmarks/genealogy.py --levels 25 --width 2000 --inputs 3
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from genealogy import UPSTREAM, table_neighbours, trace
+
+def deep_consumption(levels, width, inputs, seed=0):
+    """
+    batch_consumption rows of a genealogy of levels x width batches L<level>-<n>.
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for level in range(1, levels):
+        consumers = np.repeat(np.arange(width), inputs)
+        consumed = rng.integers(0, width, len(consumers))
+        frames.append(pd.DataFrame({"BatchID": [f"L{level}-{n}" for n in consumers],
+                                    "ConsumedBatchID": [f"L{level - 1}-{n}" for n in consumed],
+                                    "Qty": rng.integers(1, 10, len(consumers)) * 5}))
+    return pd.concat(frames, ignore_index=True).drop_duplicates(["BatchID", "ConsumedBatchID"])
+
+def path_count(dag):
+    """
+    Number of root-to-batch paths over the DAG, what [:CONSUMED_BY*] walks.
+    """
+    paths = {dag.root: 1}
+    level_of = dag.level_of()
+    for consumed, consumer, _ in sorted(dag.edges, key=lambda edge: level_of[edge[1]]):
+        paths[consumed] = paths.get(consumed, 0) + paths[consumer]
+    return sum(paths.values())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, default=25)
+    parser.add_argument("--width", type=int, default=2000)
+    parser.add_argument("--inputs", type=int, default=3)
+    parser.add_argument("--max-nodes", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    consumption = deep_consumption(args.levels, args.width, args.inputs)
+    neighbours = table_neighbours(consumption, UPSTREAM)
+    root = f"L{args.levels - 1}-0"
+    calls = []
+    counted = lambda ids, fanout: calls.append(len(ids)) or neighbours(ids, fanout)
+    timings = []
+    for _ in range(args.runs):
+        calls.clear()
+        started = time.perf_counter()
+        dag = trace(counted, root, UPSTREAM, max_depth=args.levels, max_fanout=args.inputs,
+                    max_nodes=args.max_nodes)
+        timings.append(time.perf_counter() - started)
+    print(dag.summary().to_string(index=False))
+    print(f"{len(dag)} batches, {len(dag.edges)} edges over {dag.depth} levels in {np.median(timings):.3f} s "
+          f"(median of {args.runs}), {len(calls)} frontier queries")
+    print(f"a variable-length pattern would walk {path_count(dag):.3g} paths")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+Load test the app with many concurrent sessions on one Streamlit server.
+
+The app is started once with `streamlit run`, and every session is a client
+thread with its own websocket, like a browser tab. So all sessions share
+the server's driver pool, job runner and caches. A session sends the widget
+values the way the frontend does, parses the elements of each script run
+with streamlit's element tree and clicks through the view/question
+combinations of the app, GEN AI questions, genealogy traces and the root
+cause ranking included, with think time in between:
+
+    python benchmarks/load_test.py --sessions 24 --duration 300 --replay benchmarks/cassettes/app.bin
+    python benchmarks/load_test.py --sessions 24 --duration 300
+
+Without --replay the server queries the Neo4j instance given by NEO4J_URI,
+NEO4J_USERNAME and NEO4J_PASSWORD (environment or .env) and the database is
+sampled for open connections and running transactions (pool saturation).
+A cassette for --replay is recorded with a single live session and --record.
+The report covers throughput, latency percentiles per action, error rates
+and the memory of the server process.
+"""
+import argparse
+import asyncio
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import websockets
+from dotenv import load_dotenv
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from streamlit.testing.v1.element_tree import parse_tree_from_messages
+from queries import options_list, asset_questions, batch_questions, asset_queries, batch_queries
+from tracing import percentile
+
+APP_PATH = os.path.join(ROOT, "app.py")
+
+# questions typed into the GEN AI tab, paraphrases of the same intents too
+AI_QUESTIONS = (
+    "Which batches failed?",
+    "show failed batches",
+    "what assets ran BPO1-1-1",
+    "why did batches fail",
+    "busiest assets",
+)
+
+def click_plan():
+    """
+    Every (view, question, button, setting) a planner can click: question is
+    None for the tabs of the knowledge graph view, setting a (widget label,
+    value) set before the click or None.
+    """
+    plan = [
+        (options_list[0], None, "Query Knowledge Graph", None),
+        (options_list[0], None, "Query Graph", None),
+        (options_list[0], None, "TABLE", None),
+        (options_list[0], None, "Rank Root Causes", None),
+    ]
+    plan += [(options_list[0], None, "RUN", ("AI CHATBOT", question)) for question in AI_QUESTIONS]
+    plan += [(options_list[2], question, "Visualize", None) for question in asset_queries]
+    plan += [(options_list[2], asset_questions[2], "TABLE", None)]
+    plan += [(options_list[1], question, "Visualize", None) for question in batch_queries]
+    plan += [(options_list[1], batch_questions[1], "TABLE", None), (options_list[1], batch_questions[5], "TABLE", None)]
+    plan += [(options_list[1], batch_questions[6], "Trace Genealogy", ("Direction", direction))
+             for direction in ("upstream", "downstream")]
+    return plan
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+def widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+class ServerSession:
+    """
+    One browser tab: a websocket to the server. The values set on widgets are
+    sent with every rerun, like the frontend keeps them, and each run is
+    parsed into an element tree (tree) to find the widgets and results.
+    """
+    def __init__(self, url, timeout):
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self.connection = self.loop.run_until_complete(
+            websockets.connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout))
+        self.values = {}
+        self.tree = None
+
+    def run(self, trigger=None):
+        """
+        Rerun the script with the widget values and an optional trigger (a
+        button click) and wait for it to finish; reruns the script asks for
+        are followed.
+        """
+        return self.loop.run_until_complete(self._run(trigger))
+
+    async def _run(self, trigger):
+        back = BackMsg()
+        back.rerun_script.widget_states.widgets.extend(self.values.values())
+        if trigger is not None:
+            back.rerun_script.widget_states.widgets.append(trigger)
+        await self.connection.send(back.SerializeToString())
+        messages = []
+        while True:
+            message = ForwardMsg()
+            message.ParseFromString(await asyncio.wait_for(self.connection.recv(), self.timeout))
+            kind = message.WhichOneof("type")
+            if kind == "delta":
+                messages.append(message)
+            elif kind == "script_finished":
+                if message.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    messages = []
+                    continue
+                break
+        self.tree = parse_tree_from_messages(messages)
+        return self.tree
+
+    def set(self, widgets, label, value):
+        """
+        Select value in a radio, selectbox or multiselect (a list) or type it
+        into a text input.
+        """
+        state = WidgetState(id=widget(widgets, label).id)
+        if isinstance(value, list):
+            state.string_array_value.data[:] = [str(v) for v in value]
+        else:
+            state.string_value = str(value)
+        self.values[state.id] = state
+        return self.run()
+
+    def click(self, label):
+        return self.run(WidgetState(id=widget(self.tree.button, label).id, trigger_value=True))
+
+    def close(self):
+        self.loop.run_until_complete(self.connection.close())
+        self.loop.close()
+
+def wait_for_jobs(session, timeout):
+    """
+    Graph queries run as background jobs; poll like the browser does until
+    none is running any more.
+    """
+    deadline = time.perf_counter() + timeout
+    while any(b.label == "Cancel query" for b in session.tree.button) and time.perf_counter() < deadline:
+        time.sleep(0.1)
+        session.run()
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.samples = []
+
+    def add(self, action, latency_ms, error=None):
+        self.latencies.setdefault(action, []).append(latency_ms)
+        if error:
+            self.errors.setdefault(action, []).append(error)
+
+    def collect(self, events):
+        """
+        Drain the events the sessions and the sampler sent.
+        """
+        while True:
+            try:
+                kind, *payload = events.get_nowait()
+            except queue.Empty:
+                return
+            if kind == "action":
+                self.add(*payload)
+            else:
+                self.samples.append(payload[0])
+
+def run_error(tree):
+    if tree.exception:
+        return tree.exception[0].message
+    if tree.error:
+        return tree.error[0].value
+    return None
+
+def run_session(session_id, url, args, events, stop):
+    rng = random.Random(args.seed + session_id)
+    plan = click_plan()
+    started = time.perf_counter()
+    try:
+        session = ServerSession(url, args.timeout)
+        error = run_error(session.run())
+    except Exception as e:
+        events.put(("action", "startup", (time.perf_counter() - started) * 1000, repr(e)))
+        return
+    events.put(("action", "startup", (time.perf_counter() - started) * 1000, error))
+    while not stop.is_set():
+        view, question, button, setting = rng.choice(plan)
+        action = f"{view} | {question or 'tabs'} | {button}" + (f" | {setting[1]}" if setting else "")
+        error = None
+        started = time.perf_counter()
+        try:
+            session.set(session.tree.sidebar.radio, "Select View", view)
+            if question is not None:
+                session.set(session.tree.selectbox, "Select Questions? ", question)
+            if args.vary_entities and view == options_list[0]:
+                po_select = widget(session.tree.multiselect, "Select POs ")
+                session.set(session.tree.multiselect, "Select POs ", [rng.choice(po_select.options)])
+            if setting is not None:
+                label, value = setting
+                widgets = session.tree.text_input if button == "RUN" else session.tree.radio
+                session.set(widgets, label, value)
+            session.click(button)
+            wait_for_jobs(session, args.timeout)
+            error = run_error(session.tree)
+        except Exception as e:
+            error = repr(e)
+        events.put(("action", action, (time.perf_counter() - started) * 1000, error))
+        stop.wait(rng.uniform(*args.think_time))
+    session.close()
+
+def sample_server(pid, events, stop, interval):
+    """
+    Sample the memory of the server process and, against a live database,
+    the number of open connections and running transactions.
+    """
+    monitor = None
+    if "NEO4J_URI" in os.environ:
+        from neo4j import GraphDatabase
+        monitor = GraphDatabase.driver(os.environ["NEO4J_URI"],
+                                       auth=(os.environ["NEO4J_USERNAME"], os.environ["NEO4J_PASSWORD"]))
+    while True:
+        sample = {"t": time.time(), "rss_mb": rss_mb(pid), "connections": None, "transactions": None}
+        if monitor is not None:
+            try:
+                with monitor.session() as session:
+                    sample["connections"] = session.run("CALL dbms.listConnections() YIELD connectionId "
+                                                        "RETURN count(*) AS c").single()["c"]
+                    sample["transactions"] = session.run("SHOW TRANSACTIONS YIELD transactionId "
+                                                         "RETURN count(*) AS c").single()["c"]
+            except Exception:
+                pass
+        events.put(("sample", sample))
+        if stop.wait(interval):
+            break
+    if monitor is not None:
+        monitor.close()
+
+def report(stats, sessions, elapsed):
+    actions = {}
+    total = sum(len(v) for k, v in stats.latencies.items() if k != "startup")
+    errors = sum(len(v) for k, v in stats.errors.items() if k != "startup")
+    for action, latencies in sorted(stats.latencies.items()):
+        actions[action] = {
+            "count": len(latencies),
+            "errors": len(stats.errors.get(action, [])),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "max_ms": round(max(latencies), 1),
+        }
+    rss = [sample["rss_mb"] for sample in stats.samples]
+    connections = [s["connections"] for s in stats.samples if s["connections"] is not None]
+    transactions = [s["transactions"] for s in stats.samples if s["transactions"] is not None]
+    return {
+        "sessions": sessions,
+        "elapsed_s": round(elapsed, 1),
+        "actions": total,
+        "throughput_per_s": round(total / elapsed, 2) if elapsed else 0,
+        "error_rate": round(errors / total, 4) if total else 0,
+        "per_action": actions,
+        "server_rss_mb": {
+            "start": round(rss[0], 1),
+            "peak": round(max(rss), 1),
+            "end": round(rss[-1], 1),
+            "growth": round(rss[-1] - rss[0], 1),
+        } if rss else None,
+        "db_connections": {"max": max(connections), "mean": round(sum(connections) / len(connections), 1)}
+        if connections else None,
+        "db_transactions": {"max": max(transactions), "mean": round(sum(transactions) / len(transactions), 1)}
+        if transactions else None,
+        "sample_errors": {action: errs[:3] for action, errs in stats.errors.items()},
+    }
+
+def start_server(secrets, port, timeout):
+    """
+    Start the app with `streamlit run` on port, the secrets in a temporary
+    secrets.toml, and wait until it is healthy. Returns (process, secrets path).
+    """
+    handle, secrets_path = tempfile.mkstemp(suffix=".toml")
+    with os.fdopen(handle, "w", encoding="utf-8") as secrets_file:
+        for key, value in secrets.items():
+            secrets_file.write(f"{key} = {json.dumps(value)}\n")
+    server = subprocess.Popen([sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless", "true",
+                               "--server.port", str(port), "--browser.gatherUsageStats", "false",
+                               "--secrets.files", secrets_path],
+                              cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit run exited with status {server.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server, secrets_path
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"the server did not come up within {timeout} s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=120, help="seconds of load after startup")
+    parser.add_argument("--think-time", type=float, nargs=2, default=[1.0, 5.0], metavar=("MIN", "MAX"))
+    parser.add_argument("--ramp-up", type=float, default=10, help="seconds over which sessions start")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds allowed per script run")
+    parser.add_argument("--vary-entities", action="store_true", help="pick random POs (live database only)")
+    parser.add_argument("--replay", help="serve the app from a cassette instead of the database")
+    parser.add_argument("--record", help="record a cassette from the live database (use --sessions 1)")
+    parser.add_argument("--port", type=int, default=8599, help="port of the server under test")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", "load_test.json"))
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.replay:
+        secrets = {"NEO4J_REPLAY_FILE": os.path.abspath(args.replay)}
+        os.environ.pop("NEO4J_URI", None)
+    else:
+        secrets = {key: os.environ[key] for key in ("NEO4J_URI", "NEO4J_USERNAME", "NEO4J_PASSWORD")}
+        if args.record:
+            secrets["NEO4J_RECORD_FILE"] = os.path.abspath(args.record)
+
+    server, secrets_path = start_server(secrets, args.port, args.timeout)
+    url = f"ws://localhost:{args.port}/_stcore/stream"
+    stats = Stats()
+    events = queue.Queue()
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_server, args=(server.pid, events, stop, 1.0), daemon=True)
+    sampler.start()
+    threads = []
+    started = time.perf_counter()
+    try:
+        for session_id in range(args.sessions):
+            thread = threading.Thread(target=run_session, args=(session_id, url, args, events, stop), daemon=True)
+            thread.start()
+            threads.append(thread)
+            time.sleep(args.ramp_up / max(args.sessions, 1))
+        deadline = time.perf_counter() + args.duration
+        while time.perf_counter() < deadline:
+            stats.collect(events)
+            time.sleep(0.5)
+        stop.set()
+        # keep draining while the sessions finish their last action
+        deadline = time.perf_counter() + args.timeout
+        while any(t.is_alive() for t in threads + [sampler]) and time.perf_counter() < deadline:
+            stats.collect(events)
+            time.sleep(0.5)
+        stats.collect(events)
+    finally:
+        stop.set()
+        server.terminate()
+        server.wait()
+        os.remove(secrets_path)
+    result = report(stats, args.sessions, time.perf_counter() - started)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(result, output, indent=2)
+    print(f"{result['actions']} actions in {result['elapsed_s']} s from {args.sessions} sessions: "
+          f"{result['throughput_per_s']} actions/s, error rate {result['error_rate']:.2%}")
+    for action, row in result["per_action"].items():
+        print(f"{action[:90]:90} n={row['count']:5} err={row['errors']:4} p50={row['p50_ms']:9.1f} "
+              f"p95={row['p95_ms']:9.1f} p99={row['p99_ms']:9.1f} ms")
+    if result["server_rss_mb"]:
+        rss = result["server_rss_mb"]
+        print(f"Server RSS from {rss['start']} MB, peak {rss['peak']} MB, end {rss['end']} MB "
+              f"(growth {rss['growth']} MB)")
+    if result["db_connections"]:
+        print(f"DB connections max {result['db_connections']['max']}, "
+              f"transactions max {result['db_transactions']['max']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+Benchmark every canned question of the app against a generated dataset.
+
+    python benchmarks/run_benchmarks.py --num-process-orders 200 --seed 7
+    python benchmarks/run_benchmarks.py --update-baseline
+
+The dataset is generated with the simulator, loaded into the Neo4j instance
+given by NEO4J_URI/NEO4J_USERNAME/NEO4J_PASSWORD (environment or .env) and
+every question is measured for query latency, conversion time, HTML size
+(Arrow size for table questions) and how far RSS rose above its level before
+the question (Linux only). The lineage of several POs is measured as one
+UNWIND query and as one query per PO. Results are compared with
+benchmarks/baseline.json and the script exits with status 1 when a metric
+regresses by more than the threshold.
+
+The baseline is created once per benchmark machine with --update-baseline,
+best from a cassette so the numbers do not depend on the database:
+--record a cassette against the database, then store the baseline with
+--replay <cassette> --update-baseline and commit both. CI runs --replay with
+--require-baseline, which fails when the baseline is missing instead of
+passing without a comparison.
+
+With --record the live results are captured into a cassette; --replay runs
+the same questions from that cassette without a database:
+
+    python benchmarks/run_benchmarks.py --record benchmarks/cassettes/bench.bin
+    python benchmarks/run_benchmarks.py --replay benchmarks/cassettes/bench.bin --replay-latency-ms 5
+"""
+import argparse
+import json
+import os
+import pandas as pd
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "simulator"))
+
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+from genealogy_simulation import generate_dataset, save_dataset
+from graph_view import (config, generate_nodes_edges, save_graph_file, records_to_arrow,
+                        collect_within_budget, summarize_subgraph)
+from ingest import DATED_TABLES, ingest, read_tables, with_dates
+from queries import canned_queries, PO_LINEAGE
+from replay_driver import RecordingDriver, ReplayDriver
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+result_budget = config["result_budget"]
+# POs of the multi-id lineage comparison
+COMPARE_POS = 10
+# Metrics held to the baseline; all of them are "lower is better"
+METRICS = ["query_ms", "convert_ms", "html_ms", "html_bytes", "arrow_bytes", "rss_delta_mb"]
+
+def peak_rss_mb():
+    """
+    Peak RSS of the whole run.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return round(rss / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+def reset_peak_rss():
+    """
+    Reset the peak RSS of the process to its current RSS, so the peak of one
+    question does not carry over to the next; False where the kernel does
+    not allow it (anything but Linux).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+def status_mb(field):
+    """
+    VmRSS or VmHWM (peak RSS) of the process from /proc/self/status.
+    """
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+
+def sample_params(tables, page_size):
+    """
+    Pick the entity ids the parameterized questions run with: a failed batch,
+    its PO and the first asset, so every question returns data, and the POs
+    of the multi-id comparison. The time window covers the whole dataset.
+    """
+    lims = tables["lims"]
+    failed = lims[lims["Status"] == "Failed"]
+    batch_id = failed["BatchID"].iloc[0] if len(failed) else tables["batch"]["id"].iloc[0]
+    po_id = tables["batch"].set_index("id").loc[batch_id, "POID"]
+    days = pd.concat([with_dates(tables[table])["StartDate"] for table in DATED_TABLES])
+    return {
+        "po_id": str(po_id),
+        "batch_id": str(batch_id),
+        "asset_id": str(tables["asset"]["id"].iloc[0]),
+        "po_ids": [str(po_id)],
+        "batch_ids": [str(batch_id)],
+        "asset_ids": [str(tables["asset"]["id"].iloc[0])],
+        "compare_po_ids": [str(po) for po in tables["po"]["id"].iloc[:COMPARE_POS]],
+        "start_date": days.min(),
+        "end_date": days.max(),
+        "after": None,
+        "page_size": page_size,
+    }
+
+def run_question(driver, kind, query, params, html_path, node_budget):
+    """
+    Run one question end to end and return its metrics.
+    """
+    with driver.session() as session:
+        started = time.perf_counter()
+        if kind == "table":
+            table = session.execute_read(lambda tx: records_to_arrow(tx.run(query, params)))
+            query_ms = (time.perf_counter() - started) * 1000
+            return {"query_ms": query_ms, "convert_ms": 0.0, "html_ms": 0.0,
+                    "arrow_bytes": table.nbytes, "rows": table.num_rows}
+        subgraph, truncated = session.execute_read(
+            lambda tx: collect_within_budget(tx.run(query, params), result_budget["nodes"],
+                                             result_budget["relationships"]))
+        query_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    summarized, _ = summarize_subgraph(subgraph, node_budget)
+    graph, _ = generate_nodes_edges(summarized)
+    convert_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    html = save_graph_file(graph, html_path)
+    html_ms = (time.perf_counter() - started) * 1000
+    return {"query_ms": query_ms, "convert_ms": convert_ms, "html_ms": html_ms,
+            "html_bytes": len(html.encode("utf-8")), "rows": len(subgraph["nodes"]),
+            "truncated": int(truncated), "nodes": len(graph.nodes), "edges": len(graph.edges)}
+
+def run_benchmarks(driver, params, repeat, html_path, node_budget):
+    results = {}
+    for name, kind, query, _ in canned_queries():
+        measured = reset_peak_rss()
+        before = status_mb("VmRSS") if measured else None
+        runs = [run_question(driver, kind, query, params, html_path, node_budget) for _ in range(repeat)]
+        metrics = {key: round(statistics.median(run[key] for run in runs), 2) for key in runs[0]}
+        if measured:
+            metrics["rss_delta_mb"] = round(status_mb("VmHWM") - before, 1)
+        results[name] = metrics
+        size = f"html {metrics['html_bytes'] / 1024:9.1f} KB" if kind == "graph" else \
+            f"arrow {metrics['arrow_bytes'] / 1024:8.1f} KB"
+        print(f"{name[:60]:60} query {metrics['query_ms']:9.1f} ms  convert {metrics['convert_ms']:9.1f} ms  "
+              f"{size}  rss +{metrics.get('rss_delta_mb', float('nan')):6.1f} MB")
+    if params.get("compare_po_ids"):
+        results.update(compare_lineages(driver, params, repeat, html_path, node_budget))
+    return results
+
+def compare_lineages(driver, params, repeat, html_path, node_budget):
+    """
+    Lineage of the compare_po_ids POs as one UNWIND query and one query per PO.
+    """
+    po_ids = params["compare_po_ids"]
+    batched = [run_question(driver, "graph", PO_LINEAGE, dict(params, po_ids=po_ids), html_path, node_budget)
+               for _ in range(repeat)]
+    one_by_one = [sum(run_question(driver, "graph", PO_LINEAGE, dict(params, po_ids=[po_id]), html_path,
+                                   node_budget)["query_ms"] for po_id in po_ids) for _ in range(repeat)]
+    results = {
+        f"PO lineage x{len(po_ids)}, one query": {"query_ms": round(statistics.median(r["query_ms"] for r in batched), 2),
+                                                  "rows": batched[0]["rows"]},
+        f"PO lineage x{len(po_ids)}, one query per PO": {"query_ms": round(statistics.median(one_by_one), 2)},
+    }
+    for name, metrics in results.items():
+        print(f"{name[:60]:60} query {metrics['query_ms']:9.1f} ms")
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    List every metric that is worse than the baseline by more than threshold.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            continue
+        for metric in METRICS:
+            before, after = reference.get(metric), metrics.get(metric)
+            # ignore sub-millisecond noise on timings and sub-megabyte noise on memory
+            if before is None or after is None or (metric.endswith(("_ms", "_mb")) and after < 1):
+                continue
+            if after > before * (1 + threshold):
+                regressions.append((name, metric, before, after))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-process-orders", type=int, default=None,
+                        help="dataset size, default is the simulator's 2 POs per product")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--data-folder", help="reuse an existing dataset instead of generating one")
+    parser.add_argument("--skip-load", action="store_true", help="the database already holds the dataset")
+    parser.add_argument("--reset", action="store_true", help="delete everything in the database before loading")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--node-budget", type=int, default=config["node_budget"],
+                        help="nodes rendered per graph before sibling nodes are collapsed")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression, 0.2 = 20%%")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="exit with status 2 when there is no baseline to compare with (CI)")
+    parser.add_argument("--record", help="capture the live results into this cassette file")
+    parser.add_argument("--replay", help="run from a cassette recorded with --record, no database needed")
+    parser.add_argument("--replay-latency-ms", type=float, default=0, help="simulated round trip per query")
+    args = parser.parse_args()
+
+    html_path = os.path.join(tempfile.mkdtemp(prefix="genealogy_html_"), "graph.html")
+    if args.replay:
+        # the dataset and parameters the cassette was recorded with
+        with open(args.replay + ".json", encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        dataset, params = meta["dataset"], meta["params"]
+        with ReplayDriver(args.replay, latency_ms=args.replay_latency_ms) as driver:
+            results = run_benchmarks(driver, params, args.repeat, html_path, args.node_budget)
+        return finish(args, dataset, results)
+
+    load_dotenv()
+    data_folder = args.data_folder
+    if data_folder is None:
+        data_folder = tempfile.mkdtemp(prefix="genealogy_bench_")
+        save_dataset(generate_dataset(num_process_orders=args.num_process_orders, seed=args.seed), data_folder)
+    tables = read_tables(data_folder)
+    dataset = {table: len(df) for table, df in tables.items()}
+    params = sample_params(tables, args.page_size)
+    print(f"Dataset {data_folder}: {sum(dataset.values())} rows")
+
+    driver = GraphDatabase.driver(os.environ["NEO4J_URI"],
+                                  auth=(os.environ["NEO4J_USERNAME"], os.environ["NEO4J_PASSWORD"]))
+    with driver:
+        if args.reset:
+            with driver.session() as session:
+                session.run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS").consume()
+        if not args.skip_load:
+            started = time.perf_counter()
+            ingest(driver, data_folder)
+            print(f"Loaded in {time.perf_counter() - started:.1f} s")
+        if args.record:
+            recorder = RecordingDriver(driver, args.record)
+            results = run_benchmarks(recorder, params, args.repeat, html_path, args.node_budget)
+            recorder.flush()
+            with open(args.record + ".json", "w", encoding="utf-8") as meta_file:
+                json.dump({"dataset": dataset, "params": params}, meta_file, indent=2, default=str)
+        else:
+            results = run_benchmarks(driver, params, args.repeat, html_path, args.node_budget)
+    return finish(args, dataset, results)
+
+def finish(args, dataset, results):
+    """
+    Store the results and compare them with the baseline.
+    """
+    report = {"dataset": dataset, "seed": args.seed, "peak_rss_mb": peak_rss_mb(), "results": results}
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(report, output, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as baseline:
+            json.dump(report, baseline, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline yet, run with --update-baseline to store one")
+        return 2 if args.require_baseline else 0
+    with open(args.baseline, encoding="utf-8") as baseline:
+        regressions = compare(results, json.load(baseline), args.threshold)
+    for name, metric, before, after in regressions:
+        print(f"REGRESSION {name}: {metric} {before} -> {after}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
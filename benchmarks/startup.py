@@ -0,0 +1,106 @@
+"""
+Measure the cold start of the app in fresh processes: the import time of the
+heavy modules and the time to first paint (the first complete script run of
+a new session), plus the time of a warm rerun.
+
+    python benchmarks/startup.py --replay benchmarks/cassettes/app.bin
+    python benchmarks/startup.py --runs 5 --target-ms 1000
+
+Without --replay the app connects to NEO4J_URI/NEO4J_USERNAME/NEO4J_PASSWORD
+(environment or .env). The script exits with status 1 when the median time
+to first paint is over the target.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dotenv import load_dotenv
+
+APP_PATH = os.path.join(ROOT, "app.py")
+HEAVY_MODULES = ["neo4j", "pyvis.network", "pandas", "pyarrow", "streamlit.components.v1", "htbuilder"]
+
+FIRST_PAINT = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_ms = (time.perf_counter() - started) * 1000
+app_path, secrets, timeout, heavy = json.loads(sys.argv[1])
+at = AppTest.from_file(app_path, default_timeout=timeout)
+for key, value in secrets.items():
+    at.secrets[key] = value
+started = time.perf_counter()
+at.run()
+first_paint_ms = (time.perf_counter() - started) * 1000
+loaded = [module for module in heavy if module in sys.modules]
+started = time.perf_counter()
+at.run()
+rerun_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({"streamlit_ms": streamlit_ms, "first_paint_ms": first_paint_ms, "rerun_ms": rerun_ms,
+                  "loaded_at_first_paint": loaded,
+                  "error": at.exception[0].message if at.exception else None}))
+"""
+
+IMPORT_TIME = """
+import sys, time
+import streamlit
+started = time.perf_counter()
+__import__(sys.argv[1])
+print((time.perf_counter() - started) * 1000)
+"""
+
+def run_child(code, *args):
+    output = subprocess.run([sys.executable, "-c", code, *args], cwd=ROOT, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--replay", help="serve the app from a cassette instead of the database")
+    parser.add_argument("--target-ms", type=float, default=1000, help="time to first paint to stay under")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", "startup.json"))
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.replay:
+        secrets = {"NEO4J_REPLAY_FILE": args.replay}
+    else:
+        secrets = {key: os.environ[key] for key in ("NEO4J_URI", "NEO4J_USERNAME", "NEO4J_PASSWORD")}
+
+    imports = {module: round(statistics.median(run_child(IMPORT_TIME, module) for _ in range(args.runs)), 1)
+               for module in HEAVY_MODULES}
+    runs = [run_child(FIRST_PAINT, json.dumps([APP_PATH, secrets, args.timeout, HEAVY_MODULES]))
+            for _ in range(args.runs)]
+    errors = [run["error"] for run in runs if run["error"]]
+    result = {
+        "import_ms": imports,
+        "streamlit_ms": round(statistics.median(run["streamlit_ms"] for run in runs), 1),
+        "first_paint_ms": round(statistics.median(run["first_paint_ms"] for run in runs), 1),
+        "rerun_ms": round(statistics.median(run["rerun_ms"] for run in runs), 1),
+        "loaded_at_first_paint": runs[-1]["loaded_at_first_paint"],
+        "target_ms": args.target_ms,
+        "errors": errors,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(result, output, indent=2)
+
+    for module, ms in imports.items():
+        print(f"import {module:28} {ms:8.1f} ms")
+    print(f"import streamlit.testing      {result['streamlit_ms']:8.1f} ms")
+    print(f"first paint                   {result['first_paint_ms']:8.1f} ms (target {args.target_ms:.0f} ms)")
+    print(f"warm rerun                    {result['rerun_ms']:8.1f} ms")
+    print(f"loaded at first paint: {', '.join(result['loaded_at_first_paint']) or 'none'}")
+    for error in errors:
+        print(f"ERROR {error}")
+    return 1 if errors or result["first_paint_ms"] > args.target_ms else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
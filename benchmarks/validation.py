@@ -0,0 +1,63 @@
+"""
+Time the integrity validation of a large dataset. The transactional tables
+(batch, wo, lims, maintenance) of --data-folder are repeated with new ids,
+their references drawn from the repeated rows, up to --rows rows in total.
+
+    python benchmarks/validation.py --rows 10000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from validate import KEYS, format_report, read_csv, validate_tables
+
+# share of the rows per repeated table
+SHARES = {"wo": 0.6, "lims": 0.3, "batch": 0.03, "maintenance": 0.07}
+
+def repeat(df, rows):
+    """
+    rows rows of df, the ids suffixed with the number of the copy.
+    """
+    copies = pd.concat([df] * -(-rows // len(df)), ignore_index=True).iloc[:rows].copy()
+    copies["id"] = copies["id"].astype(str) + "-" + (np.arange(rows) // len(df)).astype(str)
+    return copies
+
+def scaled_dataset(data_folder, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    tables = {table: read_csv(os.path.join(data_folder, f"{table}.csv")) for table in KEYS}
+    for table, share in SHARES.items():
+        tables[table] = repeat(tables[table], int(rows * share))
+    batch_ids, wo_ids = tables["batch"]["id"].to_numpy(), tables["wo"]["id"].to_numpy()
+    tables["wo"]["BatchID"] = batch_ids[rng.integers(0, len(batch_ids), len(tables["wo"]))]
+    tables["lims"]["BatchID"] = batch_ids[rng.integers(0, len(batch_ids), len(tables["lims"]))]
+    tables["lims"]["WOID"] = wo_ids[rng.integers(0, len(wo_ids), len(tables["lims"]))]
+    # the consumed batches of the dataset are the first copy of its batches
+    for column in ["BatchID", "ConsumedBatchID"]:
+        tables["batch_consumption"][column] = tables["batch_consumption"][column] + "-0"
+    return tables
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-folder", default=os.path.join(ROOT, "data"))
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    tables = scaled_dataset(args.data_folder, args.rows)
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        report = validate_tables(tables)
+        timings.append(time.perf_counter() - started)
+    print(format_report(report))
+    print(f"{sum(len(df) for df in tables.values())} rows validated in {np.median(timings):.2f} s (median of {args.runs})")
+
+if __name__ == "__main__":
+    main()
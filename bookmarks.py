@@ -0,0 +1,30 @@
+"""
+Bookmarks handed from the loader to the app for read-your-writes.
+
+ingest.py stores the bookmarks of its last write in a small JSON file; the
+app opens its read sessions with them, so a follower of a cluster answers
+only once it has caught up with the load.
+"""
+import json
+import os
+
+def save_bookmarks(path, bookmarks):
+    """
+    Write the raw values of a neo4j Bookmarks object.
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as bookmarks_file:
+        json.dump(sorted(bookmarks.raw_values), bookmarks_file)
+    os.replace(path + ".tmp", path)
+
+def load_bookmarks(path):
+    """
+    Bookmarks saved by save_bookmarks, None when there are none.
+    """
+    if not os.path.exists(path):
+        return None
+    from neo4j import Bookmarks
+    with open(path, encoding="utf-8") as bookmarks_file:
+        return Bookmarks.from_raw_values(json.load(bookmarks_file))
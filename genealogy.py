@@ -0,0 +1,169 @@
+"""
+Batch to batch genealogy through intermediate batches.
+
+An intermediate batch is consumed by later batches ((a)-[:CONSUMED_BY]->(b),
+from the batch_consumption table), which can be consumed in turn, any number
+of levels deep. trace expands a batch one level at a time, upstream to the
+batches it was made from or downstream to the batches made from it:
+
+- one query per level for the whole frontier (in chunks of CHUNK_SIZE ids),
+  so 20 levels are 20 round trips whatever the width of the genealogy
+- a batch reached before is not expanded again, so a batch shared by many
+  descendants costs one visit; a variable-length pattern
+  ([:CONSUMED_BY*..20]) enumerates every path instead, which grows
+  exponentially with the shared ancestors
+- max_depth bounds the levels, max_fanout the neighbours taken per batch and
+  max_nodes the batches of the whole result
+
+The result is a layered DAG: the batches per level (their shortest
+consumption distance from the root) and the edges between them.
+
+    python genealogy.py BPO20-20-1 --direction upstream --data-folder ./data
+    python genealogy.py BPO1-1-1 --direction downstream --from-neo4j
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from queries import BATCH_INPUTS, BATCH_OUTPUTS
+
+UPSTREAM = "upstream"
+DOWNSTREAM = "downstream"
+
+# frontier ids per query
+CHUNK_SIZE = 5000
+
+class LayeredDag:
+    """
+    levels[i] holds the batches i consumption steps from the root (levels[0]
+    is [root]), edges are (consumed, consumer, qty) between kept batches,
+    cut maps the batches with more than max_fanout neighbours to their
+    count, and complete is False when max_depth or max_nodes stopped the
+    expansion before it ran out of batches.
+    """
+    def __init__(self, root, direction):
+        self.root = root
+        self.direction = direction
+        self.levels = [[root]]
+        self.edges = []
+        self.cut = {}
+        self.complete = True
+
+    @property
+    def depth(self):
+        return len(self.levels) - 1
+
+    def __len__(self):
+        return sum(len(level) for level in self.levels)
+
+    def level_of(self):
+        return {batch: number for number, level in enumerate(self.levels) for batch in level}
+
+    def summary(self):
+        """
+        One row per level: Level, Batches, Edges reaching the level from the
+        one before it or from further back, Cut batches of the level.
+        """
+        level_of = self.level_of()
+        end = 0 if self.direction == UPSTREAM else 1
+        edges = np.bincount([level_of[edge[end]] for edge in self.edges], minlength=len(self.levels))
+        cut = np.bincount([level_of[batch] for batch in self.cut], minlength=len(self.levels))
+        return pd.DataFrame({"Level": range(len(self.levels)), "Batches": [len(level) for level in self.levels],
+                             "Edges": edges, "Cut": cut})
+
+def trace(neighbours, root, direction=UPSTREAM, max_depth=25, max_fanout=50, max_nodes=20000):
+    """
+    LayeredDag of root. neighbours(ids, fanout) returns (id, [(next, qty),
+    ...], total) for the ids of a frontier: at most fanout neighbours per
+    batch and how many it has. Neighbours already in the DAG only add an
+    edge; new ones beyond max_nodes are left out.
+    """
+    dag = LayeredDag(root, direction)
+    kept = {root}
+    frontier = [root]
+    while frontier:
+        if dag.depth == max_depth:
+            # only the counts: is there anything beyond the last level
+            dag.complete = not any(total for start in range(0, len(frontier), CHUNK_SIZE)
+                                   for _, _, total in neighbours(frontier[start:start + CHUNK_SIZE], 0))
+            break
+        level = []
+        for start in range(0, len(frontier), CHUNK_SIZE):
+            for batch, following, total in neighbours(frontier[start:start + CHUNK_SIZE], max_fanout):
+                if total > len(following):
+                    dag.cut[batch] = total
+                for other, qty in following:
+                    if other not in kept:
+                        if len(kept) >= max_nodes:
+                            dag.complete = False
+                            continue
+                        kept.add(other)
+                        level.append(other)
+                    dag.edges.append((other, batch, qty) if direction == UPSTREAM else (batch, other, qty))
+        if level:
+            dag.levels.append(level)
+        frontier = level
+    return dag
+
+def cypher_neighbours(tx, direction, track=iter):
+    """
+    neighbours for trace that reads a level in the transaction tx; track
+    wraps the records, the app counts them for the progress of its jobs.
+    """
+    query = BATCH_INPUTS if direction == UPSTREAM else BATCH_OUTPUTS
+    def neighbours(ids, fanout):
+        return [(record["id"], record["next"], record["total"])
+                for record in track(tx.run(query, ids=ids, fanout=fanout))]
+    return neighbours
+
+def table_neighbours(consumption, direction):
+    """
+    neighbours for trace over a batch_consumption table, sorted like the
+    Cypher ones.
+    """
+    key, other = ("BatchID", "ConsumedBatchID") if direction == UPSTREAM else ("ConsumedBatchID", "BatchID")
+    consumption = consumption.sort_values([key, other])
+    keys = consumption[key].to_numpy()
+    pairs = list(zip(consumption[other].tolist(), consumption["Qty"].tolist()))
+    batches, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    spans = {batch: (start, start + count) for batch, start, count in zip(batches.tolist(), starts, counts)}
+    def neighbours(ids, fanout):
+        for batch in ids:
+            start, end = spans.get(batch, (0, 0))
+            yield batch, pairs[start:min(end, start + fanout)], end - start
+    return neighbours
+
+def main():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")) as config_file:
+        limits = json.load(config_file)["genealogy"]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("batch_id")
+    parser.add_argument("--direction", choices=[UPSTREAM, DOWNSTREAM], default=UPSTREAM)
+    parser.add_argument("--data-folder", default="./data")
+    parser.add_argument("--from-neo4j", action="store_true", help="read the genealogy from the database")
+    parser.add_argument("--max-depth", type=int, default=limits["max_depth"])
+    parser.add_argument("--max-fanout", type=int, default=limits["max_fanout"])
+    parser.add_argument("--max-nodes", type=int, default=limits["max_nodes"])
+    args = parser.parse_args()
+
+    bounds = {"max_depth": args.max_depth, "max_fanout": args.max_fanout, "max_nodes": args.max_nodes}
+    started = time.perf_counter()
+    if args.from_neo4j:
+        from graph_snapshot import neo4j_session
+        driver, session = neo4j_session()
+        with driver, session:
+            dag = session.execute_read(lambda tx: trace(cypher_neighbours(tx, args.direction), args.batch_id,
+                                                        args.direction, **bounds))
+    else:
+        consumption = pd.read_csv(os.path.join(args.data_folder, "batch_consumption.csv"))
+        dag = trace(table_neighbours(consumption, args.direction), args.batch_id, args.direction, **bounds)
+    print(dag.summary().to_string(index=False))
+    print(f"{len(dag)} batches, {len(dag.edges)} edges, {dag.depth} levels {args.direction} of {args.batch_id}"
+          f"{'' if dag.complete else ' (cut off)'} in {time.perf_counter() - started:.3f} s")
+
+if __name__ == "__main__":
+    main()
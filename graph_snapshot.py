@@ -0,0 +1,347 @@
+"""
+Compressed sparse row (CSR) snapshot of the genealogy graph for analytics
+outside of the database.
+
+export writes the nodes and relationships of ingest.py, read from a dataset
+folder or from Neo4j, to a folder of .npy files that are memory mapped on
+load:
+
+    meta.json               labels, relationship types, node/edge counts, product families
+    nodes.label.npy         int8 label index per node
+    nodes.id.npy            id per node
+    <TYPE>.offsets.npy      int64 [nodes + 1], out-edges of node i are targets[offsets[i]:offsets[i + 1]]
+    <TYPE>.targets.npy      int32 node indices
+
+analyze runs degree, PageRank, approximate betweenness (Brandes on sampled
+sources) and connected components per product family with numpy on the
+snapshot and writes the results back as node properties (Degree, PageRank,
+Betweenness, FamilyComponent). PageRank, betweenness and components treat
+the relationships as undirected.
+
+    python graph_snapshot.py export --data-folder ./data
+    python graph_snapshot.py export --from-neo4j
+    python graph_snapshot.py analyze --top 5 --write
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from ingest import NODES, RELATIONSHIPS, read_tables
+
+# relationships between the product family and the nodes of its batches
+FAMILY_TYPES = ["YIELDS", "MANUFACTURES", "EXECUTED_BY", "ANALYZED_IN", "PERFORMED_ON"]
+
+def build_snapshot(path, node_ids, edges, product_family):
+    """
+    Write a snapshot. node_ids is label -> ids, edges type -> (start label,
+    start ids, end label, end ids); relationships to unknown nodes are left
+    out and duplicates merged, like MATCH/MERGE do on load.
+    """
+    os.makedirs(path, exist_ok=True)
+    labels = list(node_ids)
+    frames = [pd.DataFrame({"label": i, "id": pd.unique(pd.Series(ids).dropna().astype(str))})
+              for i, ids in enumerate(node_ids.values())]
+    nodes = pd.concat(frames, ignore_index=True)
+    count = len(nodes)
+    index = {label: pd.Index(nodes.loc[nodes["label"] == i, "id"]) for i, label in enumerate(labels)}
+    base = {label: int(np.flatnonzero(nodes["label"] == i)[0]) if len(index[label]) else 0
+            for i, label in enumerate(labels)}
+    np.save(os.path.join(path, "nodes.label.npy"), nodes["label"].to_numpy(np.int8))
+    np.save(os.path.join(path, "nodes.id.npy"), nodes["id"].to_numpy().astype(str))
+
+    def positions(label, ids):
+        found = index[label].get_indexer(pd.Series(ids).astype(str))
+        return np.where(found >= 0, found + base[label], -1)
+
+    edge_counts = {}
+    for rel_type, (start_label, start_ids, end_label, end_ids) in edges.items():
+        start, end = positions(start_label, start_ids), positions(end_label, end_ids)
+        keep = (start >= 0) & (end >= 0)
+        pairs = np.unique(start[keep].astype(np.int64) * count + end[keep])
+        sources, targets = (pairs // count).astype(np.int32), (pairs % count).astype(np.int32)
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=count), out=offsets[1:])
+        np.save(os.path.join(path, f"{rel_type}.offsets.npy"), offsets)
+        np.save(os.path.join(path, f"{rel_type}.targets.npy"), targets)
+        edge_counts[rel_type] = len(targets)
+
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as meta_file:
+        json.dump({"labels": labels, "types": list(edges), "nodes": count, "edges": edge_counts,
+                   "product_family": product_family}, meta_file, indent=2)
+
+def export_tables(path, tables):
+    """
+    Snapshot of the graph ingest.py builds from tables.
+    """
+    node_ids = {label: tables[table]["id"] for table, (label, _) in NODES.items() if table in tables}
+    edges = {}
+    for table, start_label, start_col, rel_type, end_label, end_col, end_key, _ in RELATIONSHIPS:
+        if table not in tables:
+            continue
+        df = tables[table]
+        end_ids = df[end_col]
+        if end_key != "id":
+            end_table = next(name for name, (label, _) in NODES.items() if label == end_label)
+            end_ids = end_ids.map(tables[end_table].drop_duplicates(end_key).set_index(end_key)["id"])
+        edges[rel_type] = (start_label, df[start_col], end_label, end_ids)
+    product_family = dict(zip(tables["product"]["id"], tables["product"]["FamilyID"]))
+    build_snapshot(path, node_ids, edges, product_family)
+
+def export_neo4j(path, session):
+    """
+    Snapshot of the nodes and relationships of ingest.py as they are in the
+    database, one read per label and relationship type.
+    """
+    read = lambda query: pd.DataFrame([record.values() for record in session.run(query)])
+    node_ids = {}
+    for label, _ in NODES.values():
+        ids = read(f"MATCH (n:{label}) RETURN n.id")
+        node_ids[label] = ids[0] if len(ids) else pd.Series(dtype=str)
+    edges = {}
+    for _, start_label, _, rel_type, end_label, _, _, _ in RELATIONSHIPS:
+        pairs = read(f"MATCH (a:{start_label})-[:{rel_type}]->(b:{end_label}) RETURN a.id, b.id")
+        if len(pairs) == 0:
+            pairs = pd.DataFrame({0: [], 1: []})
+        edges[rel_type] = (start_label, pairs[0], end_label, pairs[1])
+    product_family = dict(read("MATCH (p:Product) RETURN p.id, p.FamilyID").values.tolist())
+    build_snapshot(path, node_ids, edges, product_family)
+
+class Snapshot:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as meta_file:
+            self.meta = json.load(meta_file)
+        self.labels = self.meta["labels"]
+        self.count = self.meta["nodes"]
+        self.label = np.load(os.path.join(path, "nodes.label.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(path, "nodes.id.npy"), mmap_mode="r")
+        self.offsets = {t: np.load(os.path.join(path, f"{t}.offsets.npy"), mmap_mode="r") for t in self.meta["types"]}
+        self.targets = {t: np.load(os.path.join(path, f"{t}.targets.npy"), mmap_mode="r") for t in self.meta["types"]}
+
+    def nodes(self, label):
+        return np.flatnonzero(self.label == self.labels.index(label))
+
+    def index(self, label, ids):
+        """
+        Node indices of ids of a label, -1 for unknown ids.
+        """
+        nodes = self.nodes(label)
+        found = pd.Index(np.asarray(self.ids[nodes])).get_indexer(list(ids))
+        return np.where(found >= 0, nodes[found], -1)
+
+    def edges(self, types=None):
+        """
+        (sources, targets) of the relationships of types, all by default.
+        """
+        types = types or self.meta["types"]
+        sources = [np.repeat(np.arange(self.count, dtype=np.int32), np.diff(self.offsets[t])) for t in types]
+        return np.concatenate(sources), np.concatenate([np.asarray(self.targets[t]) for t in types])
+
+def undirected_csr(sources, targets, count):
+    """
+    offsets, neighbours of the graph with every edge in both directions.
+    """
+    starts, ends = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+    order = np.argsort(starts, kind="stable")
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(starts, minlength=count), out=offsets[1:])
+    return offsets, ends[order]
+
+def neighbours(offsets, adjacent, frontier):
+    """
+    (node, neighbour) pairs of every node of frontier.
+    """
+    counts = offsets[frontier + 1] - offsets[frontier]
+    nodes = np.repeat(frontier, counts)
+    first = np.repeat(offsets[frontier] - np.cumsum(counts) + counts, counts)
+    return nodes, adjacent[first + np.arange(counts.sum())]
+
+def degree(sources, targets, count):
+    """
+    (in degree, out degree) per node.
+    """
+    return np.bincount(targets, minlength=count), np.bincount(sources, minlength=count)
+
+def pagerank(sources, targets, count, damping=0.85, iterations=100, tolerance=1e-10):
+    starts, ends = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+    out_degree = np.bincount(starts, minlength=count).astype(float)
+    dangling = out_degree == 0
+    rank = np.full(count, 1 / count)
+    for _ in range(iterations):
+        share = np.divide(rank, out_degree, out=np.zeros(count), where=~dangling)
+        updated = (1 - damping) / count + damping * (np.bincount(ends, weights=share[starts], minlength=count)
+                                                     + rank[dangling].sum() / count)
+        converged = np.abs(updated - rank).sum() < tolerance
+        rank = updated
+        if converged:
+            break
+    return rank
+
+def betweenness(sources, targets, count, samples=64, seed=0):
+    """
+    Betweenness centrality estimated from the shortest paths of samples
+    random sources (Brandes), scaled to all sources; exact with samples >=
+    the node count. Level-synchronous BFS, one numpy pass per level.
+    """
+    offsets, adjacent = undirected_csr(sources, targets, count)
+    pivots = np.random.default_rng(seed).permutation(count)[:samples]
+    score = np.zeros(count)
+    for source in pivots:
+        distance = np.full(count, -1)
+        paths = np.zeros(count)
+        distance[source], paths[source] = 0, 1
+        levels, frontier, depth = [], np.array([source]), 0
+        while len(frontier):
+            nodes, adjacent_nodes = neighbours(offsets, adjacent, frontier)
+            distance[adjacent_nodes[distance[adjacent_nodes] == -1]] = depth + 1
+            onward = distance[adjacent_nodes] == depth + 1
+            nodes, adjacent_nodes = nodes[onward], adjacent_nodes[onward]
+            paths += np.bincount(adjacent_nodes, weights=paths[nodes], minlength=count)
+            levels.append((nodes, adjacent_nodes))
+            frontier, depth = np.unique(adjacent_nodes), depth + 1
+        dependency = np.zeros(count)
+        for nodes, adjacent_nodes in reversed(levels):
+            dependency += np.bincount(nodes, weights=paths[nodes] / paths[adjacent_nodes]
+                                      * (1 + dependency[adjacent_nodes]), minlength=count)
+        dependency[source] = 0
+        score += dependency
+    # every path is counted from both of its ends
+    return score * count / len(pivots) / 2 if len(pivots) else score
+
+def components(sources, targets, count):
+    """
+    Connected component per node, the smallest node index in it.
+    """
+    component = np.arange(count)
+    while True:
+        updated = component.copy()
+        np.minimum.at(updated, sources, component[targets])
+        np.minimum.at(updated, targets, component[sources])
+        updated = updated[updated]
+        if np.array_equal(updated, component):
+            return component
+        component = updated
+
+def family_components(snapshot):
+    """
+    Connected components of the subgraph of each product family: its
+    products, their batches, POs, WOs, LIMS results and assets. Returns
+    (family per node or None, component root per node or -1, summary).
+    Assets shared between families get no family.
+    """
+    sources, targets = snapshot.edges([t for t in FAMILY_TYPES if t in snapshot.meta["types"]])
+    offsets, adjacent = undirected_csr(sources, targets, snapshot.count)
+    family_of = np.full(snapshot.count, None, dtype=object)
+    component_of = np.full(snapshot.count, -1)
+    products = pd.Series(snapshot.meta["product_family"])
+    rows = []
+    for family, product_ids in products.groupby(products).groups.items():
+        members = snapshot.index("Product", product_ids)
+        members = members[members >= 0]
+        # product -> batches -> POs, WOs, LIMS -> assets
+        for _ in range(3):
+            members = np.union1d(members, neighbours(offsets, adjacent, members)[1])
+        inside = np.zeros(snapshot.count, dtype=bool)
+        inside[members] = True
+        keep = inside[sources] & inside[targets]
+        component = components(sources[keep], targets[keep], snapshot.count)[members]
+        shared = family_of[members] != None
+        family_of[members[shared]] = ""
+        family_of[members[~shared]] = family
+        component_of[members] = component
+        sizes = np.unique(component, return_counts=True)[1]
+        rows.append({"FamilyID": family, "nodes": len(members), "components": len(sizes),
+                     "largest": int(sizes.max()) if len(sizes) else 0})
+    family_of[family_of == ""] = None
+    return family_of, component_of, pd.DataFrame(rows)
+
+def analyze(snapshot, samples=64):
+    """
+    Node properties per node index as a DataFrame, plus the family summary.
+    """
+    sources, targets = snapshot.edges()
+    in_degree, out_degree = degree(sources, targets, snapshot.count)
+    family_of, component_of, summary = family_components(snapshot)
+    ids = np.asarray(snapshot.ids)
+    results = pd.DataFrame({
+        "label": np.array(snapshot.labels)[np.asarray(snapshot.label)],
+        "id": ids,
+        "InDegree": in_degree,
+        "OutDegree": out_degree,
+        "Degree": in_degree + out_degree,
+        "PageRank": pagerank(sources, targets, snapshot.count),
+        "Betweenness": betweenness(sources, targets, snapshot.count, samples),
+        "FamilyComponent": [f"{family}:{ids[root]}" if family is not None else None
+                            for family, root in zip(family_of, component_of)],
+    })
+    return results, summary
+
+def write_analytics(session, results, batch_size=1000):
+    """
+    Set the analytics properties on the nodes, one UNWIND per label and batch.
+    """
+    for label, frame in results.groupby("label"):
+        props = frame.drop(columns=["label", "id"]).astype(object)
+        rows = [{"id": node_id, "props": {k: v for k, v in row.items() if v is not None}}
+                for node_id, row in zip(frame["id"], props.where(props.notna(), None).to_dict("records"))]
+        query = f"""
+        UNWIND $rows AS row
+        MATCH (n:{label} {{id: row.id}})
+        SET n += row.props
+        """
+        for start in range(0, len(rows), batch_size):
+            session.run(query, rows=rows[start:start + batch_size]).consume()
+
+def neo4j_session():
+    from dotenv import load_dotenv
+    from neo4j import GraphDatabase
+    load_dotenv()
+    driver = GraphDatabase.driver(os.environ["NEO4J_URI"],
+                                  auth=(os.environ["NEO4J_USERNAME"], os.environ["NEO4J_PASSWORD"]))
+    return driver, driver.session()
+
+def main():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")) as config_file:
+        snapshot_path = json.load(config_file)["snapshot"]["path"]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshot", default=snapshot_path)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write the snapshot")
+    export_parser.add_argument("--data-folder", default="./data")
+    export_parser.add_argument("--from-neo4j", action="store_true", help="read the graph from the database")
+    analyze_parser = commands.add_parser("analyze", help="run the analytics on the snapshot")
+    analyze_parser.add_argument("--samples", type=int, default=64, help="betweenness sources")
+    analyze_parser.add_argument("--top", type=int, default=10)
+    analyze_parser.add_argument("--write", action="store_true", help="write the results to Neo4j")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "export":
+        if args.from_neo4j:
+            driver, session = neo4j_session()
+            with driver, session:
+                export_neo4j(args.snapshot, session)
+        else:
+            export_tables(args.snapshot, read_tables(args.data_folder))
+        snapshot = Snapshot(args.snapshot)
+        print(f"{snapshot.count} nodes, {sum(snapshot.meta['edges'].values())} relationships "
+              f"written to {args.snapshot} in {time.perf_counter() - started:.2f} s")
+        return
+    results, summary = analyze(Snapshot(args.snapshot), args.samples)
+    print(f"Analytics of {len(results)} nodes in {time.perf_counter() - started:.2f} s")
+    for label in ["Asset", "Supplier"]:
+        central = results[results["label"] == label].nlargest(args.top, "Betweenness")
+        print(f"Most central {label} nodes:")
+        print(central[["id", "Degree", "PageRank", "Betweenness"]].to_string(index=False))
+    print(summary.to_string(index=False))
+    if args.write:
+        driver, session = neo4j_session()
+        with driver, session:
+            write_analytics(session, results)
+        print("Written to Neo4j")
+
+if __name__ == "__main__":
+    main()
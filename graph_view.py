@@ -0,0 +1,495 @@
+import json
+import os
+import threading
+from collections import Counter
+from functools import lru_cache
+
+# Load configuration
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json'), 'r') as file:
+    config = json.load(file)
+legend_mapping = config["legend_mapping"]
+# node label -> label of the parent it is collapsed under when a graph is over budget
+collapse_parents = config["collapse_parents"]
+
+def generate_nodes_edges(data):
+    from pyvis.network import Network
+    net = Network(
+        notebook=False,
+        cdn_resources="remote",
+        bgcolor="white",
+        font_color="black",
+        height="750px",
+        width="100%",
+        select_menu=True,
+        # filter_menu=False
+    )
+    # net.show_buttons(filter_=True)
+    # Adjust physics settings
+    net.barnes_hut(gravity=-50000, central_gravity=0.3, spring_length=75, spring_strength=0.05, damping=0.09)
+    # net.repulsion()
+    added_nodes = set()
+    node_properties = {}
+    batch_connections = {}
+    wo_connections = {}
+    asset_connections = {}
+    for record in data:
+        for key, value in record.items():
+            if value is not None and "id" in value.keys() and value["id"] not in added_nodes:
+                node_id = value.get('id')
+                node_label = list(value.labels)[0].upper() if value.labels else "UNKNOWN"
+                node_color = legend_mapping.get(node_label, "#000000")
+                node_size = 25  # Default size
+                node_prop_html = "\n".join(f"{k} : {v}" for k, v in value._properties.items())
+
+                if node_label == "lims".upper() and value._properties.get("Status") == "Failed":
+                    node_color = "red"
+                if node_label == "ProcessOrder".upper():
+                    node_size =  50 # Increase size
+                if node_label == "batch".upper():
+                    node_size = 35  # Increase size
+                if node_label == "asset".upper():
+                    node_size = 35  # Increase size
+                if node_label == "Attributes".upper() and (value._properties.get("Temperature") or 0) > 24:
+                    node_color = "red"
+                if value._properties.get("Collapsed"):
+                    node_size = 45
+                    if value._properties.get("Failed"):
+                        node_color = "red"
+
+                net.add_node(node_id, label=value.get('Name'), title=node_prop_html, color = node_color, size=node_size)
+                added_nodes.add(node_id)
+                node_properties[node_id] = value._properties
+
+                # Track batch connections
+                if node_label == "batch".upper():
+                    batch_connections[node_id] = []
+                elif node_label == "wo".upper():
+                    wo_connections[node_id] = []
+                elif node_label == "asset".upper():
+                    asset_connections[node_id] = []
+
+        for key, value in record.items():
+            if value is not None and hasattr(value, 'start_node'):
+                if value.start_node["id"] in added_nodes and value.end_node["id"] in added_nodes:
+                    net.add_edge(value.start_node["id"], value.end_node["id"], title=value.type)
+
+                    # Track batch to LIMS connections
+                    start_label = list(value.start_node.labels)[0].upper() if value.start_node.labels else "UNKNOWN"
+                    end_label = list(value.end_node.labels)[0].upper() if value.end_node.labels else "UNKNOWN"
+                    if start_label == "batch".upper() and end_label == "LIMS":
+                        batch_connections[value.start_node["id"]].append(value.end_node["id"])
+                    elif start_label == "LIMS" and end_label == "batch".upper():
+                        batch_connections[value.end_node["id"]].append(value.start_node["id"])
+
+                    # Track WO connections
+                    if start_label == "wo".upper() and end_label == "asset".upper():
+                        wo_connections[value.start_node["id"]].append(value.end_node["id"])
+                    elif start_label == "asset".upper() and end_label == "wo".upper():
+                        wo_connections[value.end_node["id"]].append(value.start_node["id"])
+
+                    # Track asset to OEE connections
+                    if start_label == "asset".upper() and end_label == "Attributes".upper():
+                        asset_connections[value.start_node["id"]].append(value.end_node["id"])
+                    elif start_label == "Attributes".upper() and end_label == "asset".upper():
+                        asset_connections[value.end_node["id"]].append(value.start_node["id"])
+
+    #Update batch nodes color if any connected LIMS node failed
+    failed_batches = set()
+    for batch_id, lims_ids in batch_connections.items():
+        for lims_id in lims_ids:
+            if node_properties[lims_id].get("Status") == "Failed":
+                net.get_node(batch_id)["color"] = "red"
+                failed_batches.add(batch_id)
+                break
+    #Update asset nodes color if any connected OEE node has OEE < 70
+    for asset_id, machine_ids in asset_connections.items():
+        for id in machine_ids:
+            if (node_properties[id].get("Temperature") or 0) > 24:
+                net.get_node(asset_id)["color"] = "red"
+                break
+    return net, node_properties
+
+def new_subgraph():
+    """
+    Client side graph of explore mode: nodes and relationships by element id
+    and the ids of the nodes whose neighbours were fetched already.
+    """
+    return {"nodes": {}, "relationships": {}, "expanded": set()}
+
+def merge_records(subgraph, records):
+    """
+    Merge the nodes and relationships of query records into a subgraph.
+    Returns the number of nodes that were new.
+    """
+    before = len(subgraph["nodes"])
+    for record in records:
+        for value in record.values():
+            if value is None:
+                continue
+            if hasattr(value, "start_node"):
+                subgraph["relationships"][value.element_id] = value
+            elif hasattr(value, "labels"):
+                subgraph["nodes"][value.element_id] = value
+    return len(subgraph["nodes"]) - before
+
+def new_elements(record, nodes, relationships):
+    """
+    Element ids of the nodes and relationships of a record that are not in
+    nodes / relationships yet.
+    """
+    new_nodes, new_relationships = set(), set()
+    for value in record.values():
+        if value is None:
+            continue
+        if hasattr(value, "start_node"):
+            if value.element_id not in relationships:
+                new_relationships.add(value.element_id)
+        elif hasattr(value, "labels") and value.element_id not in nodes:
+            new_nodes.add(value.element_id)
+    return new_nodes, new_relationships
+
+def take_within_budget(records, max_nodes, max_relationships):
+    """
+    The leading whole records of a stream within max_nodes distinct nodes
+    and max_relationships distinct relationships, read no further than the
+    first record over it. Returns (records, truncated).
+    """
+    nodes, relationships, taken = set(), set(), []
+    for record in records:
+        new_nodes, new_relationships = new_elements(record, nodes, relationships)
+        if len(nodes) + len(new_nodes) > max_nodes or \
+                len(relationships) + len(new_relationships) > max_relationships:
+            return taken, True
+        nodes |= new_nodes
+        relationships |= new_relationships
+        taken.append(record)
+    return taken, False
+
+def collect_within_budget(records, max_nodes, max_relationships):
+    """
+    Merge streamed records into a new subgraph and stop reading as soon as
+    the next record would take it over max_nodes distinct nodes or
+    max_relationships distinct relationships. Only whole records are merged,
+    so the partial subgraph stays consistent. The nodes of records with an
+    `entity` (multi-id queries) are grouped under it in subgraph["entities"].
+    Returns (subgraph, truncated).
+    """
+    subgraph = new_subgraph()
+    nodes, relationships = subgraph["nodes"], subgraph["relationships"]
+    entities = subgraph["entities"] = {}
+    for record in records:
+        new_nodes, new_relationships = new_elements(record, nodes, relationships)
+        if len(nodes) + len(new_nodes) > max_nodes or \
+                len(relationships) + len(new_relationships) > max_relationships:
+            return subgraph, True
+        merge_records(subgraph, [record])
+        entity = record.get("entity")
+        if entity is not None:
+            entities.setdefault(entity, set()).update(
+                value.element_id for value in record.values() if hasattr(value, "labels"))
+    return subgraph, False
+
+def entity_summary(subgraph):
+    """
+    One row per entity of a multi-id query: its nodes, how many of them it
+    shares with the other entities, and its batches, WOs, assets and failed
+    LIMS results.
+    """
+    entities = subgraph.get("entities", {})
+    owners = Counter(node_id for node_ids in entities.values() for node_id in node_ids)
+    rows = []
+    for entity, node_ids in entities.items():
+        nodes = [subgraph["nodes"][node_id] for node_id in node_ids]
+        labels = Counter(node_label(node) for node in nodes)
+        rows.append({"Entity": entity, "Nodes": len(node_ids),
+                     "Shared": sum(owners[node_id] > 1 for node_id in node_ids),
+                     "Batches": labels["Batch"], "WOs": labels["WO"], "Assets": labels["Asset"],
+                     "Failed LIMS": sum(node_label(node) == "LIMS" and is_failed(node) for node in nodes)})
+    return rows
+
+def subgraph_records(subgraph):
+    """
+    The subgraph as records for generate_nodes_edges, nodes first so every
+    relationship finds both of its ends.
+    """
+    return [{"n": node} for node in subgraph["nodes"].values()] + \
+        [{"r": rel} for rel in subgraph["relationships"].values()]
+
+class SummaryEntity:
+    """
+    Property container with the parts of the neo4j Node/Relationship
+    interface generate_nodes_edges relies on.
+    """
+    def __init__(self, element_id, properties):
+        self.element_id = element_id
+        self._properties = properties
+
+    def keys(self):
+        return self._properties.keys()
+
+    def items(self):
+        return self._properties.items()
+
+    def get(self, key, default=None):
+        return self._properties.get(key, default)
+
+    def __getitem__(self, key):
+        return self._properties[key]
+
+    def __contains__(self, key):
+        return key in self._properties
+
+class SummaryNode(SummaryEntity):
+    """
+    Aggregate node standing in for a group of collapsed sibling nodes.
+    """
+    def __init__(self, element_id, label, properties):
+        super().__init__(element_id, properties)
+        self.labels = frozenset([label])
+
+class SummaryRelationship(SummaryEntity):
+    """
+    Relationship between visible nodes, merging parallel ones of one type.
+    """
+    def __init__(self, element_id, rel_type, start_node, end_node, properties):
+        super().__init__(element_id, properties)
+        self.type = rel_type
+        self.start_node = start_node
+        self.end_node = end_node
+
+def node_label(node):
+    return list(node.labels)[0] if node.labels else "UNKNOWN"
+
+def collapse_tree(subgraph):
+    """
+    Parent of every node according to collapse_parents (the first neighbour
+    with the parent label) and the depth of every node below its root.
+    """
+    nodes = subgraph["nodes"]
+    neighbours = {element_id: [] for element_id in nodes}
+    for rel in subgraph["relationships"].values():
+        start, end = rel.start_node.element_id, rel.end_node.element_id
+        if start in neighbours and end in neighbours:
+            neighbours[start].append(end)
+            neighbours[end].append(start)
+    parent = {}
+    for element_id, node in nodes.items():
+        parent_label = collapse_parents.get(node_label(node))
+        candidates = sorted(n for n in neighbours[element_id] if node_label(nodes[n]) == parent_label)
+        if candidates:
+            parent[element_id] = candidates[0]
+    depth = {}
+    for element_id in nodes:
+        chain = []
+        current = element_id
+        # walk up until a known depth, a root or a cycle in the data
+        while current not in depth and current in parent and current not in chain:
+            chain.append(current)
+            current = parent[current]
+        base = depth.get(current, 0)
+        depth.setdefault(current, base)
+        for offset, node_id in enumerate(reversed(chain), start=1):
+            depth[node_id] = base + offset
+    return parent, depth
+
+def is_failed(node):
+    return node.get("Status") == "Failed"
+
+def summarize_subgraph(subgraph, node_budget, expanded=()):
+    """
+    Level of detail: collapse sibling nodes of one label under a shared
+    parent into super-nodes ("PO17 -> 42 Batch, 3 failed") until at most
+    node_budget nodes are left. Descendants of collapsed nodes are folded
+    into the super-node as counts. The deepest level collapses first, the
+    largest groups of a level first; group ids listed in expanded stay open.
+    Returns the records to render and the collapsed groups {id: name}.
+    """
+    nodes = subgraph["nodes"]
+    if len(nodes) <= node_budget:
+        return subgraph_records(subgraph), {}
+    parent, depth = collapse_tree(subgraph)
+    children = {}
+    for element_id, parent_id in parent.items():
+        children.setdefault(parent_id, []).append(element_id)
+
+    def subtree(element_id):
+        stack, seen = [element_id], []
+        while stack:
+            current = stack.pop()
+            seen.append(current)
+            stack.extend(children.get(current, []))
+        return seen
+
+    groups = {}
+    for element_id, parent_id in parent.items():
+        group_id = f"{node_label(nodes[element_id])}@{parent_id}"
+        groups.setdefault(group_id, []).append(element_id)
+    representative = {element_id: element_id for element_id in nodes}
+    collapsed = {}
+    visible = len(nodes)
+    for level in sorted({depth[members[0]] for members in groups.values()}, reverse=True):
+        level_groups = [(group_id, members) for group_id, members in groups.items()
+                        if depth[members[0]] == level and len(members) > 1 and group_id not in expanded]
+        for group_id, members in sorted(level_groups, key=lambda group: -len(group[1])):
+            if visible <= node_budget:
+                break
+            folded = [node_id for member in members for node_id in subtree(member)]
+            # nodes already folded into a deeper super-node move into this one
+            hidden_before = {representative[node_id] for node_id in folded}
+            for node_id in folded:
+                representative[node_id] = group_id
+            for old_group in hidden_before & collapsed.keys():
+                del collapsed[old_group]
+            collapsed[group_id] = (members, folded)
+            visible -= len(hidden_before) - 1
+        if visible <= node_budget:
+            break
+
+    summary_nodes = {}
+    for group_id, (members, folded) in collapsed.items():
+        label = node_label(nodes[members[0]])
+        parent_node = nodes[parent[members[0]]]
+        failed = sum(any(is_failed(nodes[node_id]) for node_id in subtree(member)) for member in members)
+        name = f"{parent_node.get('Name') or parent_node.get('id')} -> {len(members)} {label}"
+        if failed:
+            name += f", {failed} failed"
+        properties = {"id": group_id, "Name": name, "Collapsed": True, "Count": len(members), "Failed": failed}
+        for node_id in folded:
+            folded_label = node_label(nodes[node_id])
+            if folded_label != label:
+                properties[folded_label] = properties.get(folded_label, 0) + 1
+        properties["Members"] = ", ".join(str(nodes[m].get("id")) for m in members[:20])
+        summary_nodes[group_id] = SummaryNode(group_id, label, properties)
+
+    def visible_node(element_id):
+        rep = representative[element_id]
+        return summary_nodes[rep] if rep in summary_nodes else nodes[rep]
+
+    edges = {}
+    for rel in subgraph["relationships"].values():
+        start_id, end_id = rel.start_node.element_id, rel.end_node.element_id
+        if start_id not in nodes or end_id not in nodes:
+            continue
+        start, end = visible_node(start_id), visible_node(end_id)
+        if start is end:
+            continue
+        key = (start.element_id, end.element_id, rel.type)
+        if key in edges:
+            edges[key][1] += 1
+        else:
+            edges[key] = [rel, 1, start, end]
+    records = [{"n": node} for node_id, node in nodes.items() if representative[node_id] == node_id]
+    records += [{"n": node} for node in summary_nodes.values()]
+    for (start_id, end_id, rel_type), (rel, count, start, end) in edges.items():
+        if count == 1 and start_id == rel.start_node.element_id and end_id == rel.end_node.element_id:
+            records.append({"r": rel})
+        else:
+            merged = SummaryRelationship(f"{start_id}-{rel_type}-{end_id}", rel_type, start, end, {"Count": count})
+            records.append({"r": merged})
+    return records, {group_id: node.get("Name") for group_id, node in summary_nodes.items()}
+
+@lru_cache(maxsize=None)
+def legend_html():
+    """
+    Legend overlay of the node colors, built once per process.
+    """
+    top_position=150
+    # Add legend to the HTML file
+    html = f"""
+    <style>
+        #legend {{
+            position: absolute;
+            top: {top_position}px; /* Adjusted top position */
+            right: 10px;
+            background: rgba(255, 255, 255, 0.8);
+            border: 1px solid black;
+            padding: 10px;
+            display: none; /* Initially hidden */
+            z-index: 1000;
+        }}
+        #legend h5 {{
+            margin: 0;
+            padding: 0;
+            text-align: center;
+        }}
+        #legend ul {{
+            list-style: none;
+            padding: 0;
+            margin: 0;
+        }}
+        #legend li {{
+            margin: 5px 0;
+            display: flex;
+            align-items: center;
+        }}
+        #legend span {{
+            width: 15px;
+            height: 15px;
+            display: inline-block;
+            margin-right: 10px;
+            border: 1px solid #000;
+        }}
+        #legend-toggle {{
+            position: absolute;
+            top: {top_position - 40}px; /* Adjusted top position */
+            right: 10px;
+            padding: 5px 10px;
+            background: #28a745; /* Green color */
+            color: white;
+            border: none;
+            cursor: pointer;
+            z-index: 1000;
+        }}
+        #legend-toggle:hover {{
+            background: #218838; /* Darker green on hover */
+        }}
+    </style>
+    <button id="legend-toggle">Node Info</button>
+    <div id="legend">
+        <h5>Node Legend</h5>
+        <ul>
+    """
+    for node_type, color in legend_mapping.items():
+        html += f'<li><span style="background: {color};"></span> {node_type}</li>'
+    html += """
+        </ul>
+    </div>
+    <script>
+        document.getElementById('legend-toggle').addEventListener('click', function() {
+            var legend = document.getElementById('legend');
+            if (legend.style.display === 'none' || legend.style.display === '') {
+                legend.style.display = 'block';
+            } else {
+                legend.style.display = 'none';
+            }
+        });
+    </script>
+    """
+    return html
+
+def save_graph_file(graph,html_file_path):
+    # Build the page in memory and replace the file atomically, concurrent
+    # sessions must never read each other's half written graph
+    updated_html = graph.generate_html().replace("</body>", legend_html() + "</body>")
+    temp_path = f"{html_file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as html_file:
+        html_file.write(updated_html)
+    os.replace(temp_path, html_file_path)
+    return updated_html
+
+def records_to_arrow(result):
+    """
+    Convert a query result into an Arrow table column by column.
+    """
+    import pyarrow as pa
+    keys = result.keys()
+    rows = result.values()
+    columns = list(zip(*rows)) if rows else [()] * len(keys)
+    arrays = []
+    for column in columns:
+        try:
+            arrays.append(pa.array(column))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # neo4j temporal and spatial values are not Arrow native
+            arrays.append(pa.array([None if v is None else str(v) for v in column]))
+    return pa.Table.from_arrays(arrays, names=list(keys))
@@ -0,0 +1,189 @@
+import json
+import os
+import sys
+import pandas as pd
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+from bookmarks import save_bookmarks
+from rollups import compute_rollups, records, rollup_deltas, write_rollups
+from validate import KEYS, check_tables, clear_placeholders, format_report, read_csv
+
+BATCH_SIZE = 1000
+
+# table name -> node label, properties kept on the node (None = all columns)
+NODES = {
+    "region": ("Region", None),
+    "site": ("Site", None),
+    "facility": ("Facility", None),
+    "line": ("Line", None),
+    "oem": ("OEM", None),
+    "asset": ("Asset", None),
+    "asset_info": ("AssetInfo", None),
+    "asset_oper": ("Operation", None),
+    "asset_oee": ("OEE", None),
+    "asset_machine": ("Attributes", None),
+    "maintenance": ("Maintenance", None),
+    "calibration": ("Calibration", None),
+    "compliance": ("Compliance", None),
+    "product": ("Product", None),
+    "po": ("ProcessOrder", None),
+    "batch": ("Batch", None),
+    "material": ("Materials", None),
+    "plant_material": ("PlantMaterial", None),
+    "recipe": ("Recipe", ["id", "Name"]),
+    "supplier": ("Supplier", None),
+    "wo": ("WO", ["id", "Name", "WOType", "POID", "ProductID", "BatchID", "Status",
+                  "StartDate", "EndDate", "FacilityID", "SiteID", "BatchQty"]),
+    "lims": ("LIMS", None),
+}
+
+# tables whose StartDate/EndDate are stored as dates; StartDate is range
+# indexed so the time window of the app is an index seek, not a scan
+DATED_TABLES = ["po", "batch", "wo"]
+
+# table -> further columns stored as dates, compared with the dates above
+DATE_COLUMNS = {"maintenance": ["LastMaintenanceDate", "NextMaintenanceDate"]}
+
+# table -> property the top/bottom-N questions sort by, range indexed as well
+RANKED_PROPERTIES = {"asset_oee": "OEE"}
+
+# (table, start label, start column, type, end label, end column, end key, properties)
+RELATIONSHIPS = [
+    ("batch", "ProcessOrder", "POID", "MANUFACTURES", "Batch", "id", "id", []),
+    ("batch", "Batch", "id", "YIELDS", "Product", "ProductID", "id", []),
+    ("batch", "Batch", "id", "WAREHOUSED_IN", "Facility", "WarehouseFacilityID", "id", []),
+    ("batch_consumption", "Batch", "ConsumedBatchID", "CONSUMED_BY", "Batch", "BatchID", "id", ["Qty"]),
+    ("product", "Product", "id", "FORMULATED_WITH", "Recipe", "RecipeID", "id", []),
+    ("recipe", "Recipe", "id", "USES_MATERIAL", "Materials", "MaterialID", "id", ["Qty"]),
+    ("material_supplier_rel", "Materials", "MaterialID", "SUPPLIED_BY", "Supplier", "SupplierID", "id", []),
+    ("plant_material", "Materials", "MaterialID", "STORED_IN", "PlantMaterial", "id", "id", []),
+    ("plant_material", "PlantMaterial", "id", "AVAILABLE_AT", "Facility", "FacilityID", "id", []),
+    ("facility", "Facility", "id", "LOCATED_AT_SITE", "Site", "SiteID", "id", []),
+    ("site", "Site", "id", "LOCATED_IN_REGION", "Region", "Region", "Name", []),
+    ("wo", "Batch", "BatchID", "EXECUTED_BY", "WO", "id", "id", []),
+    ("lims", "Batch", "BatchID", "ANALYZED_IN", "LIMS", "id", "id", []),
+    ("wo", "WO", "id", "PERFORMED_ON", "Asset", "AssetID", "id", ["Task", "AssetType", "UnitProcedureID"]),
+    ("asset", "Asset", "id", "ASSIGNED_TO_LINE", "Line", "LineID", "id", []),
+    ("line", "Line", "id", "LOCATED_IN_FACILITY", "Facility", "FacilityID", "id", []),
+    ("asset_info", "Asset", "AssetID", "HAS_INFO", "AssetInfo", "id", "id", []),
+    ("asset_oper", "Asset", "AssetID", "HAS_METADATA", "Operation", "id", "id", []),
+    ("asset_machine", "Asset", "AssetID", "HAS_ATTRIBUTE", "Attributes", "id", "id", []),
+    ("asset_oee", "Asset", "AssetID", "HAS_OEE", "OEE", "id", "id", []),
+    ("asset", "Asset", "id", "PROVIDED_BY_OEM", "OEM", "ManufacturerID", "id", []),
+    ("compliance", "Asset", "AssetID", "ENSURES_COMPLIANCE", "Compliance", "id", "id", []),
+    ("maintenance", "Asset", "AssetID", "REQUIRES_MAINTENANCE", "Maintenance", "id", "id", []),
+    ("calibration", "Asset", "AssetID", "REQUIRES_CALIBRATION", "Calibration", "id", "id", []),
+]
+
+# tables a dataset of an older simulator does not have
+OPTIONAL_TABLES = {"batch_consumption"}
+
+def read_tables(data_folder):
+    """
+    Read the simulator CSV files into DataFrames keyed by table name, the
+    loaded ones and the ones the validation needs. Placeholders are missing
+    values, the region "NA" is kept.
+    """
+    tables = {}
+    for table in set(NODES) | {rel[0] for rel in RELATIONSHIPS} | set(KEYS):
+        path = os.path.join(data_folder, f"{table}.csv")
+        if table in OPTIONAL_TABLES and not os.path.exists(path):
+            continue
+        tables[table] = read_csv(path)
+    return clear_placeholders(tables)
+
+def with_dates(df, columns=("StartDate", "EndDate")):
+    """
+    Copy of a dated table with its date columns as datetime.date, which the
+    driver writes as Cypher dates.
+    """
+    df = df.copy()
+    for column in columns:
+        if column in df:
+            df[column] = pd.to_datetime(df[column], format="ISO8601").dt.date
+    return df
+
+def run_batched(session, query, rows, **params):
+    for start in range(0, len(rows), BATCH_SIZE):
+        session.run(query, rows=rows[start:start + BATCH_SIZE], **params).consume()
+
+def load_nodes(session, tables):
+    for table, (label, columns) in NODES.items():
+        if table not in tables:
+            continue
+        session.run(f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.id IS UNIQUE")
+        df = tables[table] if columns is None else tables[table][columns]
+        if table in DATED_TABLES:
+            session.run(f"CREATE INDEX IF NOT EXISTS FOR (n:{label}) ON (n.StartDate)")
+            df = with_dates(df)
+        if table in DATE_COLUMNS:
+            df = with_dates(df, DATE_COLUMNS[table])
+        if table in RANKED_PROPERTIES:
+            session.run(f"CREATE INDEX IF NOT EXISTS FOR (n:{label}) ON (n.{RANKED_PROPERTIES[table]})")
+        query = f"""
+        UNWIND $rows AS row
+        MERGE (n:{label} {{id: row.id}})
+        SET n += row
+        """
+        run_batched(session, query, records(df))
+
+def load_relationships(session, tables):
+    for table, start_label, start_col, rel_type, end_label, end_col, end_key, props in RELATIONSHIPS:
+        if table not in tables:
+            continue
+        df = tables[table].rename(columns={start_col: "start", end_col: "end"})
+        rows = [{"start": row["start"], "end": row["end"], "props": {p: row[p] for p in props}}
+                for row in records(df[["start", "end"] + props].dropna(subset=["start", "end"]))]
+        query = f"""
+        UNWIND $rows AS row
+        MATCH (a:{start_label} {{id: row.start}})
+        MATCH (b:{end_label} {{{end_key}: row.end}})
+        MERGE (a)-[r:{rel_type}]->(b)
+        SET r += row.props
+        """
+        run_batched(session, query, rows)
+
+def ingest(driver, data_folder, bookmarks_path=None):
+    """
+    Load a simulator dataset into Neo4j and refresh the rollups.
+    With bookmarks_path the bookmarks of the load are saved for the app.
+    Nothing is written when the dataset has integrity errors (IntegrityError).
+    """
+    tables = read_tables(data_folder)
+    report = check_tables(tables)
+    if len(report):
+        print(f"Integrity warnings:\n{format_report(report)}")
+    with driver.session() as session:
+        load_nodes(session, tables)
+        load_relationships(session, tables)
+        write_rollups(session, compute_rollups(tables))
+        if bookmarks_path:
+            save_bookmarks(bookmarks_path, session.last_bookmarks())
+    return tables
+
+def ingest_increment(session, tables, increment, known):
+    """
+    Load the new rows of a micro-batch (table -> DataFrame) and add their
+    deltas to the rollups; tables is the context rollup_deltas needs.
+    Rows must arrive after the nodes they refer to: the increment is checked
+    against the keys loaded before (validate.KnownKeys) and nothing is
+    written when it has integrity errors (IntegrityError). Its keys are
+    added to known once it is loaded.
+    """
+    check_tables(increment, known)
+    increment = clear_placeholders(increment)
+    load_nodes(session, increment)
+    load_relationships(session, increment)
+    write_rollups(session, rollup_deltas(tables, increment), replace=False)
+    known.add(increment)
+
+if __name__ == "__main__":
+    load_dotenv()
+    data_folder = sys.argv[1] if len(sys.argv) > 1 else "./data"
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")) as config_file:
+        bookmarks_path = json.load(config_file)["neo4j"]["bookmarks_path"]
+    driver = GraphDatabase.driver(os.environ["NEO4J_URI"],
+                                  auth=(os.environ["NEO4J_USERNAME"], os.environ["NEO4J_PASSWORD"]))
+    with driver:
+        ingest(driver, data_folder, bookmarks_path)
+    print("Successful")
@@ -0,0 +1,170 @@
+"""
+Intent router of the GEN AI tab: free text to a canned question and its ids.
+
+Every intent is a canned query with a few example questions. route scores
+the question against the examples with TF-IDF (words and character
+trigrams, so "consumption" still finds "consumed") and cosine similarity,
+all local. PO, batch and asset ids are found with one precompiled pattern
+and looked up in the index of the known ids; in the text they are replaced
+by their type (po_id, batch_id, asset_id), so an intent about batches
+scores higher when a batch id is mentioned. Ids the routed intent cannot
+use are returned as well, the app asks again instead of answering without
+them. The app caches answers by (intent, parameters), a repeated or
+paraphrased question is not queried again.
+"""
+import math
+import re
+from collections import Counter
+
+from queries import (asset_questions, batch_questions, asset_queries, batch_queries,
+                     PO_LINEAGE, AI_BATCH_ASSETS, FAILED_BATCH_ROOT_CAUSE)
+
+# (intent, kind, graph query or table_queries key, id parameter, example questions)
+INTENTS = [
+    ("po_lineage", "graph", PO_LINEAGE, "po_ids",
+     ["Show the batches and assets of process order po_id", "lineage of po_id",
+      "trace the process order po_id through batches materials and suppliers"]),
+    ("batch_assets", "graph", AI_BATCH_ASSETS, "batch_ids",
+     ["Which assets ran batch batch_id", "assets and machines used for batch_id",
+      "show the equipment and oee of batch batch_id"]),
+    ("asset_monitoring", "graph", asset_queries[asset_questions[0]], "asset_ids",
+     [asset_questions[0], "monitor asset asset_id", "maintenance calibration and compliance of asset_id",
+      "where is asset asset_id located"]),
+    ("failed_batches", "table", "ai_table", None,
+     ["show failed batches", "which batches failed", "list the batches with failed lims tests"]),
+    ("failed_batch_root_cause", "graph", FAILED_BATCH_ROOT_CAUSE, None,
+     ["root cause of the failed batches", "why did batches fail", "failed batches on hot machines"]),
+    ("asset_amc", "graph", asset_queries[asset_questions[1]], None,
+     [asset_questions[1], "assets with short amc and insurance coverage"]),
+    ("most_utilized_assets", "table", "utilized_assets_table", None,
+     [asset_questions[2], "busiest assets", "which assets are used the most", "most utilized machines"]),
+    ("high_oee_assets", "graph", asset_queries[asset_questions[3]], None,
+     [asset_questions[3], "best performing assets", "assets with the highest oee"]),
+    ("low_oee_assets", "graph", asset_queries[asset_questions[4]], None,
+     [asset_questions[4], "worst performing assets", "assets with poor efficiency"]),
+    ("all_batches", "graph", batch_queries[batch_questions[0]], None,
+     [batch_questions[0], "status of the batches", "batch progress"]),
+    ("consumed_materials", "table", "consumed_materials_table", None,
+     [batch_questions[1], "top consumed materials", "material consumption"]),
+    ("po_to_batches", "graph", batch_queries[batch_questions[2]], None,
+     [batch_questions[2], "process orders and their batches", "po to batch conversion"]),
+    ("batches_below_95", "graph", batch_queries[batch_questions[3]], None,
+     [batch_questions[3], "low quality batches", "batches under 95 percent quality"]),
+    ("warehouse_distribution", "graph", batch_queries[batch_questions[4]], None,
+     [batch_questions[4], "products per warehouse", "warehouse distribution"]),
+    ("failure_rate", "table", "failure_rate_table", None,
+     [batch_questions[5], "failure rate by product site and line"]),
+]
+
+# id parameter -> token the ids are replaced with
+ID_TOKENS = {"po_ids": "po_id", "batch_ids": "batch_id", "asset_ids": "asset_id"}
+# id parameter -> what to ask for when a question needs one
+ID_HINTS = {"po_ids": "a PO id like PO3", "batch_ids": "a batch id like BPO1-1-1", "asset_ids": "an asset id like A12"}
+# batch ids first, BPO1-1-1 is no PO id
+ID_PATTERN = re.compile(r"\b(?:(?P<batch_ids>BPO\d+-\d+-\d+)|(?P<po_ids>PO\d+)|(?P<asset_ids>A\d+))\b",
+                        re.IGNORECASE)
+WORD = re.compile(r"[a-z0-9_]+")
+STOP_WORDS = {"a", "an", "and", "are", "be", "by", "can", "do", "for", "has", "have", "how", "i", "in", "is",
+              "it", "me", "of", "on", "or", "please", "show", "that", "the", "their", "them", "to", "was",
+              "were", "what", "which", "with", "you"}
+
+# weight of the character trigrams against the words, they only help with
+# other forms of a word and would match unrelated words just as well
+TRIGRAM_WEIGHT = 0.3
+
+def features(text):
+    """
+    Term counts of a question: its words and the character trigrams of the
+    words, the id tokens as a whole.
+    """
+    terms = Counter()
+    for word in WORD.findall(text.lower()):
+        if word in STOP_WORDS:
+            continue
+        terms[word] += 1
+        if word not in ID_TOKENS.values():
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                terms[padded[i:i + 3]] += TRIGRAM_WEIGHT
+    return terms
+
+class IntentRouter:
+    """
+    TF-IDF index of the example questions of INTENTS and the known ids
+    (id parameter -> ids) the extracted ids are checked against.
+    """
+    def __init__(self, ids, min_score=0.3, entity_bonus=0.15, intents=INTENTS):
+        self.min_score = min_score
+        self.entity_bonus = entity_bonus
+        self.intents = {intent: (kind, target, parameter) for intent, kind, target, parameter, _ in intents}
+        self.known = {parameter: {str(value).upper(): value for value in values}
+                      for parameter, values in ids.items()}
+        examples = [(intent, features(example)) for intent, _, _, _, questions in intents for example in questions]
+        document_frequency = Counter(term for _, terms in examples for term in terms)
+        self.idf = {term: math.log((1 + len(examples)) / (1 + count)) + 1
+                    for term, count in document_frequency.items()}
+        self.examples = [(intent, self.vector(terms)) for intent, terms in examples]
+
+    def vector(self, terms):
+        """
+        L2 normalized TF-IDF weights, sublinear term frequency; unknown terms
+        are dropped.
+        """
+        weights = {term: (1 + math.log(count) if count >= 1 else count) * self.idf[term]
+                   for term, count in terms.items() if term in self.idf}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        return {term: weight / norm for term, weight in weights.items()}
+
+    def entities(self, text):
+        """
+        (ids per parameter in order of mention, ids that are not known, text
+        with every id replaced by its token).
+        """
+        found, unknown = {}, []
+        def replace(match):
+            parameter = match.lastgroup
+            value = self.known.get(parameter, {}).get(match.group().upper())
+            if value is None:
+                unknown.append(match.group())
+            elif value not in found.setdefault(parameter, []):
+                found[parameter].append(value)
+            return f" {ID_TOKENS[parameter]} "
+        text = ID_PATTERN.sub(replace, text)
+        return {parameter: values for parameter, values in found.items() if values}, unknown, text
+
+    def scores(self, text):
+        """
+        Best cosine similarity per intent, plus entity_bonus when the question
+        names ids of the intent's parameter; (scores, found ids, unknown ids).
+        """
+        found, unknown, text = self.entities(text)
+        query = self.vector(features(text))
+        scores = {}
+        for intent, example in self.examples:
+            score = sum(weight * example.get(term, 0.0) for term, weight in query.items())
+            scores[intent] = max(scores.get(intent, 0.0), score)
+        for intent, (_, _, parameter) in self.intents.items():
+            if parameter is not None and parameter in found:
+                scores[intent] += self.entity_bonus
+        return scores, found, unknown
+
+    def route(self, text):
+        """
+        The best intent for a question as {"intent", "kind", "target",
+        "params", "score", "missing", "unknown", "ignored"}, intent None
+        below min_score. missing is the id parameter the intent needs and
+        the question does not name, unknown the ids not in the index and
+        ignored the known ids the intent has no parameter for.
+        """
+        scores, found, unknown = self.scores(text)
+        intent, score = max(scores.items(), key=lambda item: item[1]) if scores else (None, 0.0)
+        if score < self.min_score:
+            return {"intent": None, "kind": None, "target": None, "params": {}, "score": score,
+                    "missing": None, "unknown": unknown,
+                    "ignored": [value for values in found.values() for value in values]}
+        kind, target, parameter = self.intents[intent]
+        params = {parameter: found[parameter]} if parameter in found else {}
+        missing = parameter if parameter is not None and parameter not in found else None
+        ignored = [value for other, values in found.items() if other != parameter for value in values]
+        return {"intent": intent, "kind": kind, "target": target, "params": params, "score": round(score, 3),
+                "missing": missing, "unknown": unknown, "ignored": ignored}
@@ -0,0 +1,146 @@
+"""
+Background runner for long queries.
+
+A bounded thread pool runs the query of a job outside of the Streamlit script
+thread. The job counts the rows it has received, can be cancelled, and keeps
+its result until the session that started it picks it up. A JobCache shares
+jobs between sessions, running or finished, so a prefetched query serves the
+click that asks for it. Sessions join the jobs they wait for and leave them
+instead of cancelling: a job is cancelled when the last waiter leaves.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class JobCancelled(Exception):
+    pass
+
+class QueryJob:
+    def __init__(self):
+        self.rows = 0
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+        self.runner = None
+        self.future = None
+        self.waiters = 0
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def track(self, records):
+        """
+        Pass records through, counting them, and stop with JobCancelled once
+        the job is cancelled; the transaction is then rolled back.
+        """
+        for record in records:
+            if self._cancel.is_set():
+                raise JobCancelled()
+            self.rows += 1
+            yield record
+
+    def cancel(self):
+        self._cancel.set()
+        # a job still waiting for a worker never starts
+        self.future.cancel()
+
+    def join(self):
+        """
+        One more session waits for the job; returns the job.
+        """
+        with self._lock:
+            self.waiters += 1
+        return self
+
+    def leave(self, only_queued=False):
+        """
+        A session stops waiting for the job. Once nobody waits for it, an
+        unfinished job is cancelled; with only_queued only if it has not
+        started, a running prefetch still fills the cache.
+        """
+        with self._lock:
+            self.waiters -= 1
+            idle = self.waiters <= 0
+        if idle and not self.done() and (not only_queued or self.status == "queued"):
+            self.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self.future.done()
+
+    @property
+    def status(self):
+        if self.cancelled:
+            return "cancelled"
+        if self.started is None:
+            return "queued"
+        if not self.done():
+            return "running"
+        return "failed" if self.future.exception() else "done"
+
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - (self.started or self.submitted)
+
+    def result(self):
+        return self.future.result()
+
+class JobRunner:
+    """
+    Thread pool of max_workers query jobs shared by all sessions; further
+    jobs wait in its queue.
+    """
+    def __init__(self, max_workers):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query-job")
+
+    def submit(self, work, *args, **kwargs):
+        """
+        Run work(job, *args, **kwargs) on a worker and return the job.
+        """
+        job = QueryJob()
+        job.runner = self
+        job.future = self.pool.submit(self._run, job, work, args, kwargs)
+        return job
+
+    def _run(self, job, work, args, kwargs):
+        job.started = time.perf_counter()
+        try:
+            return work(job, *args, **kwargs)
+        finally:
+            job.finished = time.perf_counter()
+
+class JobCache:
+    """
+    Jobs by query key shared by all sessions, least recently used first out.
+    Cancelled and failed jobs and results older than ttl_seconds are dropped.
+    """
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def usable(self, job):
+        if job.cancelled or (job.done() and job.future.exception() is not None):
+            return False
+        return job.finished is None or time.perf_counter() - job.finished < self.ttl_seconds
+
+    def get(self, key):
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is None:
+                return None
+            if not self.usable(job):
+                del self.jobs[key]
+                return None
+            self.jobs.move_to_end(key)
+            return job
+
+    def put(self, key, job):
+        with self.lock:
+            self.jobs[key] = job
+            self.jobs.move_to_end(key)
+            while len(self.jobs) > self.max_entries:
+                self.jobs.popitem(last=False)
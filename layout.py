@@ -13,7 +13,10 @@ def link(link, text, **style):
 
 
 # MainMenu {visibility: hidden;}
-def layout(*args):
+def layout_html(*args):
+    """
+    Page style and footer HTML for the given footer content.
+    """
 
     hide_stuff = """
     <style>
@@ -74,11 +77,20 @@ def layout(*args):
         elif isinstance(arg, HtmlElement):
             body(arg)
 
+    return hide_stuff, str(foot)
+
+
+def layout(*args):
+    hide_stuff, foot = layout_html(*args)
     st.markdown(hide_stuff, unsafe_allow_html=True)
-    st.markdown(str(foot), unsafe_allow_html=True)
+    st.markdown(foot, unsafe_allow_html=True)
 
 
-def footer():
+@st.cache_resource
+def footer_html():
+    """
+    The footer never changes, so its HTML is built once per process.
+    """
     myargs = [
         "Made in &nbsp; ",
         image('https://avatars3.githubusercontent.com/u/45109972?s=400&v=4',
@@ -86,7 +98,13 @@ def footer():
         "	&nbsp; by &nbsp;",
         link("https://www.tredence.com/services/industry-x-iot-solution", "@Tredence"),
     ]
-    layout(*myargs)
+    return layout_html(*myargs)
+
+
+def footer():
+    hide_stuff, foot = footer_html()
+    st.markdown(hide_stuff, unsafe_allow_html=True)
+    st.markdown(foot, unsafe_allow_html=True)
 
 
 if __name__ == "__main__":
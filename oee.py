@@ -0,0 +1,270 @@
+"""
+Rolling OEE of the assets from operation events.
+
+An operation event reports what an asset did over a stretch of time:
+PlannedMinutes, Downtime (minutes), ProductionQuantity, GoodQuantity and
+IdealCycleTime (minutes per unit). OEE only needs sums of those,
+
+    Availability = (planned - downtime) / planned
+    Performance  = ideal cycle time x quantity / (planned - downtime)
+    Quality      = good quantity / quantity
+
+so the engine keeps hourly buckets of the sums per asset and a running total
+per window (shift, day and week up to the latest event). An event or an
+expiring hour costs O(1) per window. The assets are kept in a sorted index
+per window, the top and bottom N are read off its ends instead of a scan.
+write_oee writes the assets that changed to their OEE nodes in bulk.
+
+    python oee.py simulate --data-folder ./data --hours 336 --top 5
+    python oee.py simulate --data-folder ./data --hours 24 --publish
+"""
+import argparse
+import bisect
+import heapq
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+WINDOWS = {"shift": 8 * 3600, "day": 86400, "week": 7 * 86400}
+BUCKET_SECONDS = 3600
+# the sums kept per bucket, in this order
+SUMS = ["PlannedMinutes", "Downtime", "IdealMinutes", "ProductionQuantity", "GoodQuantity"]
+
+def oee_metrics(sums):
+    """
+    Availability, Performance, Quality and OEE in percent, like asset_oper
+    and asset_oee, from the sums of a window. None without planned time.
+    """
+    planned, downtime, ideal, quantity, good = map(float, sums)
+    if planned <= 0:
+        return None
+    run = max(planned - downtime, 0)
+    availability = run / planned
+    performance = min(ideal / run, 1) if run > 0 else 0
+    quality = good / quantity if quantity > 0 else 0
+    return {
+        "Availability": round(availability * 100, 2),
+        "Performance": round(performance * 100, 2),
+        "Quality": round(quality * 100, 2),
+        "OEE": round(availability * performance * quality * 100, 2),
+    }
+
+def event_sums(events):
+    """
+    Operation events as rows of SUMS.
+    """
+    return np.column_stack([
+        events["PlannedMinutes"], events["Downtime"],
+        events["IdealCycleTime"] * events["ProductionQuantity"],
+        events["ProductionQuantity"], events["GoodQuantity"],
+    ]).astype(float)
+
+class OEEEngine:
+    def __init__(self, windows=WINDOWS, bucket_seconds=BUCKET_SECONDS):
+        self.windows = windows
+        self.bucket_seconds = bucket_seconds
+        self.clock = None
+        self.late = 0
+        # asset -> {bucket start: sums}, kept while the longest window holds them
+        self.buckets = {}
+        # per window: heap of (bucket start, asset) to expire, asset -> [buckets, sums]
+        self.expiry = {window: [] for window in windows}
+        self.totals = {window: {} for window in windows}
+        # per window: sorted [(OEE, asset)], asset -> metrics, assets to re-rank
+        self.ranking = {window: [] for window in windows}
+        self.metrics = {window: {} for window in windows}
+        self.dirty = {window: set() for window in windows}
+        # assets whose OEE changed since the last write_oee
+        self.changed = set()
+
+    def window_start(self, window):
+        return self.clock // self.bucket_seconds * self.bucket_seconds - self.windows[window] + self.bucket_seconds
+
+    def advance(self, now):
+        """
+        Move the clock to now and take the hours that left a window out of
+        its totals.
+        """
+        if self.clock is not None and now <= self.clock:
+            return
+        self.clock = now
+        longest = max(self.windows, key=self.windows.get)
+        for window, heap in self.expiry.items():
+            start = self.window_start(window)
+            while heap and heap[0][0] < start:
+                bucket, asset = heapq.heappop(heap)
+                total = self.totals[window][asset]
+                total[0] -= 1
+                total[1] -= self.buckets[asset][bucket]
+                if total[0] == 0:
+                    del self.totals[window][asset]
+                self.dirty[window].add(asset)
+                if window == longest:
+                    del self.buckets[asset][bucket]
+
+    def add(self, asset, when, sums):
+        """
+        Add the sums of events of an asset at epoch second when. Events
+        older than the longest window are counted in late and dropped.
+        """
+        if self.clock is not None and when < self.clock - max(self.windows.values()) + self.bucket_seconds:
+            self.late += 1
+            return
+        self.advance(when)
+        bucket = when // self.bucket_seconds * self.bucket_seconds
+        asset_buckets = self.buckets.setdefault(asset, {})
+        new = bucket not in asset_buckets
+        if new:
+            asset_buckets[bucket] = np.zeros(len(SUMS))
+        asset_buckets[bucket] += sums
+        for window in self.windows:
+            if bucket < self.window_start(window):
+                continue
+            total = self.totals[window].setdefault(asset, [0, np.zeros(len(SUMS))])
+            if new:
+                heapq.heappush(self.expiry[window], (bucket, asset))
+                total[0] += 1
+            total[1] += sums
+            self.dirty[window].add(asset)
+
+    def add_events(self, events):
+        """
+        Add a DataFrame of operation events (AssetID, Time and the fields of
+        an event), summed per asset and hour first.
+        """
+        if len(events) == 0:
+            return
+        frame = pd.DataFrame(event_sums(events), columns=SUMS)
+        frame["AssetID"] = events["AssetID"].to_numpy()
+        frame["Time"] = pd.to_datetime(events["Time"], utc=True).astype("int64").to_numpy() // 10**9
+        frame["Bucket"] = frame["Time"] // self.bucket_seconds
+        grouped = frame.groupby(["Bucket", "AssetID"], sort=True).agg({**{s: "sum" for s in SUMS}, "Time": "max"})
+        for (_, asset), row in zip(grouped.index, grouped.to_numpy()):
+            self.add(asset, int(row[-1]), row[:-1])
+
+    def refresh(self):
+        """
+        Re-rank the assets whose totals changed.
+        """
+        for window, dirty in self.dirty.items():
+            ranking, metrics = self.ranking[window], self.metrics[window]
+            for asset in dirty:
+                if asset in metrics:
+                    del ranking[bisect.bisect_left(ranking, (metrics[asset]["OEE"], asset))]
+                    del metrics[asset]
+                total = self.totals[window].get(asset)
+                current = oee_metrics(total[1]) if total else None
+                if current is not None:
+                    metrics[asset] = current
+                    bisect.insort(ranking, (current["OEE"], asset))
+            self.changed |= dirty
+            dirty.clear()
+
+    def top(self, window, n=10):
+        """
+        [(asset, metrics)] of the n assets with the highest OEE of a window.
+        """
+        self.refresh()
+        return [(asset, self.metrics[window][asset]) for _, asset in reversed(self.ranking[window][-n:])]
+
+    def bottom(self, window, n=10):
+        self.refresh()
+        return [(asset, self.metrics[window][asset]) for _, asset in self.ranking[window][:n]]
+
+def write_oee(session, engine, window="day", batch_size=1000):
+    """
+    Write the metrics of the assets that changed since the last call to
+    their OEE nodes: OEE is the one of window (the value the app questions
+    read), OEE_<window>, Availability_<window>, ... hold every window.
+    """
+    session.run("CREATE INDEX IF NOT EXISTS FOR (n:OEE) ON (n.OEE)")
+    engine.refresh()
+    updated_at = datetime.fromtimestamp(engine.clock, tz=timezone.utc) if engine.clock is not None else None
+    rows = []
+    for asset in sorted(engine.changed):
+        props = {"OEEWindow": window, "OEEUpdatedAt": updated_at}
+        for name in engine.windows:
+            current = engine.metrics[name].get(asset) or dict.fromkeys(["Availability", "Performance", "Quality", "OEE"])
+            props.update({f"{key}_{name}": value for key, value in current.items()})
+        if asset in engine.metrics[window]:
+            props["OEE"] = engine.metrics[window][asset]["OEE"]
+        rows.append({"AssetID": asset, "props": props})
+    query = """
+    UNWIND $rows AS row
+    MATCH (a:Asset {id: row.AssetID})-[:HAS_OEE]->(oee:OEE)
+    SET oee += row.props
+    """
+    for start in range(0, len(rows), batch_size):
+        session.run(query, rows=rows[start:start + batch_size]).consume()
+    engine.changed.clear()
+    return len(rows)
+
+def simulate_events(asset_oper_df, start, hours, seed=None):
+    """
+    One operation event per asset and hour, around the Downtime,
+    Performance and Quality of generate_asset_operation. The ideal rate is a
+    shift's TotalProductionQuantity per 8 hours.
+    """
+    rng = np.random.default_rng(seed)
+    assets = asset_oper_df.reset_index(drop=True)
+    count = len(assets) * hours
+    index = np.tile(np.arange(len(assets)), hours)
+    hour = np.repeat(np.arange(hours), len(assets))
+    downtime = np.clip(60 * assets["Downtime"].to_numpy()[index] / 100 * rng.gamma(2, 0.5, count), 0, 60)
+    cycle_time = 60 / (assets["TotalProductionQuantity"].to_numpy()[index] / 8)
+    performance = np.clip(assets["Performance"].to_numpy()[index] / 100 * rng.normal(1, 0.03, count), 0, 1)
+    quantity = np.floor((60 - downtime) / cycle_time * performance)
+    quality = np.clip(assets["Quality"].to_numpy()[index] / 100 * rng.normal(1, 0.02, count), 0, 1)
+    begin = pd.Timestamp(start, tz="UTC")
+    events = pd.DataFrame({
+        "AssetID": assets["AssetID"].to_numpy()[index],
+        "Time": begin + pd.to_timedelta(hour * 3600 + rng.integers(0, 3600, count), unit="s"),
+        "PlannedMinutes": 60.0,
+        "Downtime": downtime.round(2),
+        "ProductionQuantity": quantity,
+        "GoodQuantity": np.floor(quantity * quality),
+        "IdealCycleTime": cycle_time,
+    })
+    return events.sort_values("Time", ignore_index=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    simulate_parser = commands.add_parser("simulate", help="feed simulated operation events to the engine")
+    simulate_parser.add_argument("--data-folder", default="./data")
+    simulate_parser.add_argument("--start", default="2024-12-01")
+    simulate_parser.add_argument("--hours", type=int, default=168)
+    simulate_parser.add_argument("--seed", type=int, default=None)
+    simulate_parser.add_argument("--window", choices=list(WINDOWS), default="day")
+    simulate_parser.add_argument("--top", type=int, default=5)
+    simulate_parser.add_argument("--publish", action="store_true", help="write the OEE nodes in Neo4j")
+    args = parser.parse_args()
+
+    events = simulate_events(pd.read_csv(os.path.join(args.data_folder, "asset_oper.csv")),
+                             args.start, args.hours, args.seed)
+    engine = OEEEngine()
+    started = time.perf_counter()
+    # one hour at a time, as a stream would deliver them
+    for _, hour_events in events.groupby(events["Time"].dt.floor("h")):
+        engine.add_events(hour_events)
+        engine.refresh()
+    elapsed = time.perf_counter() - started
+    print(f"{len(events)} events in {elapsed:.2f} s, {len(events) / elapsed:.0f} events/s")
+    for title, assets in [("Highest", engine.top(args.window, args.top)),
+                          ("Lowest", engine.bottom(args.window, args.top))]:
+        print(f"{title} OEE over the last {args.window}:")
+        print(pd.DataFrame([dict(metrics, AssetID=asset) for asset, metrics in assets]).to_string(index=False))
+    if args.publish:
+        from dotenv import load_dotenv
+        from neo4j import GraphDatabase
+        load_dotenv()
+        driver = GraphDatabase.driver(os.environ["NEO4J_URI"],
+                                      auth=(os.environ["NEO4J_USERNAME"], os.environ["NEO4J_PASSWORD"]))
+        with driver, driver.session() as session:
+            print(f"OEE of {write_oee(session, engine, args.window)} assets written")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+class BufferedResult:
+    """
+    Fully consumed query result that still looks like a neo4j Result
+    (iteration, keys(), values(), consume()) to the rendering code.
+    """
+    def __init__(self, keys, records, summary):
+        self._keys = keys
+        self._records = records
+        self._summary = summary
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def keys(self):
+        return self._keys
+
+    def values(self):
+        return [record.values() for record in self._records]
+
+    def consume(self):
+        return self._summary
+
+def encode_value(value):
+    """
+    JSON friendly form of a value returned by the driver.
+    """
+    if hasattr(value, "start_node"):
+        return {"type": value.type, "properties": dict(value)}
+    if hasattr(value, "labels"):
+        return {"labels": list(value.labels), "properties": dict(value)}
+    return str(value)
+
+def payload_bytes(records):
+    """
+    Estimate the bytes transferred for a result from its JSON encoding.
+    """
+    return len(json.dumps([record.values() for record in records], default=encode_value))
+
+def flatten_plan(plan, depth=0):
+    """
+    Flatten a PROFILE plan tree into one row per operator.
+    """
+    if not plan:
+        return []
+    rows = [{
+        "operator": "  " * depth + plan.get("operatorType", ""),
+        "db_hits": plan.get("dbHits", 0),
+        "rows": plan.get("rows", 0),
+        "details": plan.get("args", {}).get("Details", ""),
+    }]
+    for child in plan.get("children", []):
+        rows.extend(flatten_plan(child, depth + 1))
+    return rows
+
+def run_profiled(session, query, params=None, profile=False, budget=None):
+    """
+    Run a query, drain it and collect the result summary timings.
+    With a budget ({"nodes", "relationships"}) reading stops at the first
+    record over it, like collect_within_budget; consume() then discards the
+    rest of the result.
+    With profile=True the query is run a second time under PROFILE to get
+    db hits and rows per operator.
+    Returns (BufferedResult, stats).
+    """
+    started = time.perf_counter()
+    result = session.run(query, params)
+    keys = result.keys()
+    if budget is None:
+        records, truncated = list(result), False
+    else:
+        from graph_view import take_within_budget
+        records, truncated = take_within_budget(result, budget["nodes"], budget["relationships"])
+    summary = result.consume()
+    client_ms = (time.perf_counter() - started) * 1000
+    stats = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "query": " ".join(query.split()),
+        "result_available_after_ms": summary.result_available_after,
+        "result_consumed_after_ms": summary.result_consumed_after,
+        "client_ms": round(client_ms, 2),
+        "rows": len(records),
+        "truncated": truncated,
+        "bytes": payload_bytes(records),
+        "db_hits": None,
+        "operators": [],
+    }
+    if profile:
+        plan = session.run("PROFILE " + query, params).consume().profile
+        stats["operators"] = flatten_plan(plan)
+        stats["db_hits"] = sum(row["db_hits"] for row in stats["operators"])
+    return BufferedResult(keys, records, summary), stats
+
+def log_query_stats(stats, log_path, **extra):
+    """
+    Append one JSON line per profiled query for trend analysis.
+    """
+    folder = os.path.dirname(log_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(log_path, "a", encoding="utf-8") as log_file:
+        log_file.write(json.dumps(dict(stats, **extra), default=str) + "\n")
@@ -0,0 +1,429 @@
+# Canned questions of the app and their Cypher.
+# Queries are parameterized ($po_id, $asset_id, $batch_id) so they can be
+# run by the app, the benchmarks and any other tool without string building.
+# The lineage questions take a list of ids ($po_ids, $batch_ids, $asset_ids)
+# and UNWIND it, so several entities are one query; every record carries the
+# id it belongs to as `entity`.
+# Questions over POs, batches and WOs are limited to the production window
+# $start_date..$end_date; the rollup and asset master data questions are not.
+
+options_list = ["Manufacturing Knowledge Graph", "Batch Genealogy", "Assets Traceability"]
+asset_questions = [
+    "Asset Monitoring",
+    "Provide a list of assets with both AMC and insurance coverage of less than 2 years?",
+    "Identify the most utilized assets?",
+    "List down assets that has high Efficiency(OEE)",
+    "List down assets that has low Efficiency(OEE)"
+]
+batch_questions = [
+    "Monitor the status and progress of all batches?",
+    "Which materials are being consumed the most in the production process?",
+    "Visualize how Process Orders are converted into batches?",
+    "Which batches have a quality rating below 95%?",
+    "How is the distribution of products across different warehouses managed?",
+    "Which products, sites and lines have the highest LIMS failure rate?",
+    "Trace a batch through the intermediate batches it was made from or went into?",
+    "Compare the assets and machines that ran several batches?"
+]
+
+def keyset_predicate(*order_keys):
+    """
+    Build the WHERE condition that resumes an ordered result after the $after cursor.
+    order_keys are (column, "ASC"/"DESC") pairs, the last one must be unique.
+    """
+    clauses = []
+    for i, (column, direction) in enumerate(order_keys):
+        op = "<" if direction.upper() == "DESC" else ">"
+        equal = [f"{col} = $after[{j}]" for j, (col, _) in enumerate(order_keys[:i])]
+        clauses.append("(" + " AND ".join(equal + [f"{column} {op} $after[{i}]"]) + ")")
+    return "$after IS NULL OR " + " OR ".join(clauses)
+
+def time_window_predicate(variable):
+    """
+    Condition keeping the POs/batches/WOs whose StartDate is in the window
+    [$start_date, $end_date]; served by the StartDate range index.
+    """
+    return f"{variable}.StartDate >= $start_date AND {variable}.StartDate <= $end_date"
+
+#UI Tracking: lineage of a PO
+PO_LINEAGE = f"""
+UNWIND $po_ids AS entity
+MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder {{id: entity}})
+MATCH (b)-[YI:YIELDS]->(p:Product)
+MATCH (p)-[FW:FORMULATED_WITH]->(r:Recipe)
+MATCH (r)-[UM:USES_MATERIAL]->(m:Materials)
+MATCH (m)-[SB:SUPPLIED_BY]->(sup:Supplier)
+MATCH (m)-[SI:STORED_IN]->(pm:PlantMaterial)
+MATCH (pm)-[AA:AVAILABLE_AT]->(f:Facility)
+MATCH (f)-[LS:LOCATED_AT_SITE]->(s:Site)
+MATCH (s)-[LR:LOCATED_IN_REGION]->(re:Region)
+MATCH (b)-[EB:EXECUTED_BY]->(wo:WO)
+MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
+MATCH (wo)-[PER:PERFORMED_ON]->(a:Asset)
+MATCH (a)-[AL:ASSIGNED_TO_LINE]->(l:Line)
+MATCH (l)-[LF:LOCATED_IN_FACILITY]->(af:Facility)
+MATCH (a)-[HI:HAS_INFO]->(ai:AssetInfo)
+MATCH (a)-[HM:HAS_METADATA]->(ao:Operation)
+MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
+MATCH (a)-[HO:HAS_OEE]->(oee:OEE)
+MATCH (a)-[PBO:PROVIDED_BY_OEM]->(oem:OEM)
+WHERE {time_window_predicate("b")}
+RETURN *
+"""
+
+#UI Tracking: POs whose lineage is prefetched at startup
+RECENT_PROCESS_ORDERS = f"""
+MATCH (po:ProcessOrder)
+WHERE {time_window_predicate("po")}
+RETURN po.id AS id
+ORDER BY po.StartDate DESC
+LIMIT $limit
+"""
+
+#Saved Question: failed batches and their root cause
+FAILED_BATCH_ROOT_CAUSE = f"""
+MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder)
+MATCH (b)-[YI:YIELDS]->(p:Product)
+MATCH (p)-[FW:FORMULATED_WITH]->(r:Recipe)
+MATCH (r)-[UM:USES_MATERIAL]->(m:Materials)
+MATCH (m)-[SB:SUPPLIED_BY]->(sup:Supplier)
+MATCH (m)-[SI:STORED_IN]->(pm:PlantMaterial)
+MATCH (pm)-[AA:AVAILABLE_AT]->(f:Facility)
+MATCH (f)-[LS:LOCATED_AT_SITE]->(s:Site)
+MATCH (s)-[LR:LOCATED_IN_REGION]->(re:Region)
+MATCH (b)-[EB:EXECUTED_BY]->(wo:WO)
+MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
+MATCH (wo)-[PER:PERFORMED_ON]->(a:Asset)
+MATCH (a)-[AL:ASSIGNED_TO_LINE]->(l:Line)
+OPTIONAL MATCH (l)-[LF:LOCATED_IN_FACILITY]->(f)
+MATCH (a)-[HI:HAS_INFO]->(ai:AssetInfo)
+MATCH (a)-[HM:HAS_METADATA]->(ao:Operation)
+MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
+MATCH (a)-[HO:HAS_OEE]->(oee:OEE)
+MATCH (a)-[PBO:PROVIDED_BY_OEM]->(oem:OEM)
+WHERE lims.Status = "Failed" and am.Temperature >24 AND {time_window_predicate("b")}
+RETURN *
+"""
+
+#Saved Question: root cause features of the batches that started since $since
+ROOT_CAUSE_ASSETS = """
+MATCH (b:Batch)-[:YIELDS]->(p:Product)
+WHERE b.StartDate >= $since
+OPTIONAL MATCH (b)-[:ANALYZED_IN]->(lims:LIMS)
+WITH b, p, count(lims) AS Tests,
+    sum(CASE lims.Status WHEN "Passed" THEN 1 ELSE 0 END) AS Passed,
+    sum(CASE lims.Status WHEN "Failed" THEN 1 ELSE 0 END) AS Failures
+MATCH (b)-[:EXECUTED_BY]->(:WO)-[:PERFORMED_ON]->(a:Asset)
+MATCH (a)-[:ASSIGNED_TO_LINE]->(l:Line)
+OPTIONAL MATCH (a)-[:HAS_ATTRIBUTE]->(am:Attributes)
+OPTIONAL MATCH (a)-[:HAS_OEE]->(oee:OEE)
+OPTIONAL MATCH (a)-[:REQUIRES_MAINTENANCE]->(mr:Maintenance)
+WHERE mr.LastMaintenanceDate <= b.StartDate
+RETURN b.id AS BatchID, p.id AS ProductID, b.StartDate AS StartDate, Tests, Passed, Failures,
+    a.id AS AssetID, l.id AS LineID, l.FacilityID AS FacilityID,
+    am.Temperature AS Temperature, am.Vibration AS Vibration, oee.OEE AS OEE,
+    max(mr.LastMaintenanceDate) AS LastMaintenance
+"""
+
+# LIMS results of batches the matrix has no outcome for yet, whenever they started
+ROOT_CAUSE_OUTCOMES = """
+UNWIND $batch_ids AS id
+MATCH (b:Batch {id: id})
+OPTIONAL MATCH (b)-[:ANALYZED_IN]->(lims:LIMS)
+RETURN b.id AS BatchID, count(lims) AS Tests,
+    sum(CASE lims.Status WHEN "Passed" THEN 1 ELSE 0 END) AS Passed,
+    sum(CASE lims.Status WHEN "Failed" THEN 1 ELSE 0 END) AS Failures
+"""
+
+ROOT_CAUSE_MATERIALS = """
+MATCH (b:Batch)-[:YIELDS]->(:Product)-[:FORMULATED_WITH]->(:Recipe)-[:USES_MATERIAL]->(m:Materials)
+WHERE b.StartDate >= $since
+OPTIONAL MATCH (m)-[:SUPPLIED_BY]->(sup:Supplier)
+RETURN b.id AS BatchID, m.id AS MaterialID, sup.id AS SupplierID
+"""
+
+FAILED_BATCH_TABLE_KEYS = [("Batch_ID", "ASC"), ("Asset_ID", "ASC")]
+FAILED_BATCH_TABLE = f"""
+MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder)
+MATCH (b)-[EB:EXECUTED_BY]->(wo:WO)
+MATCH (wo)-[PER:PERFORMED_ON]->(a:Asset)
+MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
+MATCH (a)-[AL:ASSIGNED_TO_LINE]->(l:Line)
+MATCH (l)-[LF:LOCATED_IN_FACILITY]->(f:Facility)
+MATCH (f)-[LS:LOCATED_AT_SITE]->(s:Site)
+MATCH (s)-[LR:LOCATED_IN_REGION]->(re:Region)
+MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
+WHERE po.id = $po_id AND lims.Status = "Failed" AND am.Temperature > 24 AND {time_window_predicate("b")}
+WITH DISTINCT po.id AS PO_ID,
+    b.id AS Batch_ID,
+    a.id AS Asset_ID,
+    a.Name AS Asset_Name,
+    lims.Status AS Lims_Status,
+    am.Temperature AS Machine_Temperature,
+    l.id AS Line_ID,
+    f.id AS Facility_ID,
+    s.Name AS Site,
+    re.Name AS Region
+WHERE {keyset_predicate(*FAILED_BATCH_TABLE_KEYS)}
+RETURN PO_ID, Batch_ID, Asset_ID, Asset_Name, Lims_Status,
+    Machine_Temperature, Line_ID, Facility_ID, Site, Region
+ORDER BY Batch_ID, Asset_ID
+LIMIT $page_size
+"""
+
+#GEN AI
+AI_FAILED_BATCHES_KEYS = [("Batch_ID", "ASC")]
+AI_FAILED_BATCHES = f"""
+MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder)
+MATCH (b)-[EB:EXECUTED_BY]->(wo:WO)
+MATCH (wo)-[PER:PERFORMED_ON]->(a:Asset)
+MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
+MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
+WHERE lims.Status = "Failed" AND am.Temperature > 24 AND {time_window_predicate("b")}
+WITH DISTINCT b.id AS Batch_ID
+WHERE {keyset_predicate(*AI_FAILED_BATCHES_KEYS)}
+RETURN Batch_ID
+ORDER BY Batch_ID
+LIMIT $page_size
+"""
+
+AI_BATCH_ASSETS = f"""
+UNWIND $batch_ids AS entity
+MATCH (b:Batch {{id: entity}})-[EB:EXECUTED_BY]->(wo:WO)
+MATCH (wo)-[PER:PERFORMED_ON]->(a:Asset)
+MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(machine:Attributes)
+MATCH (a)-[HM:HAS_METADATA]->(op:Operation)
+MATCH (a)-[HO:HAS_OEE]->(oee:OEE)
+MATCH (a)-[PBO:PROVIDED_BY_OEM]->(oem:OEM)
+WHERE {time_window_predicate("b")}
+RETURN *
+"""
+
+#Asset Monitoring
+ASSET_MONITORING = f"""
+UNWIND $asset_ids AS entity
+MATCH (a:Asset {{id: entity}})-[AL:ASSIGNED_TO_LINE]->(l:Line)
+MATCH (l)-[LF:LOCATED_IN_FACILITY]->(f:Facility)
+MATCH (f)-[FS:LOCATED_AT_SITE]->(s:Site)
+MATCH (s)-[SR:LOCATED_IN_REGION]->(r:Region)
+MATCH (a)-[HI:HAS_INFO]->(ai:AssetInfo)
+MATCH (a)-[HM:HAS_METADATA]->(ao:Operation)
+MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
+MATCH (a)-[HO:HAS_OEE]->(oee:OEE)
+MATCH (a)-[PBO:PROVIDED_BY_OEM]->(oem:OEM)
+OPTIONAL MATCH (a)<-[PER:PERFORMED_ON]-(wo:WO)
+WHERE {time_window_predicate("wo")}
+OPTIONAL MATCH (a)-[ENSURES_COMPLIANCE]->(com:Compliance)
+OPTIONAL MATCH (a)-[REQUIRES_MAINTENANCE]->(main:Maintenance)
+OPTIONAL MATCH (a)-[REQUIRES_CALIBRATION]->(cal:Calibration)
+RETURN *
+"""
+
+#AMC < 2years
+ASSET_AMC = """
+MATCH (a:Asset)-[AL:ASSIGNED_TO_LINE]->(l:Line)
+MATCH (l)-[LF:LOCATED_IN_FACILITY]->(f:Facility)
+MATCH (f)-[FS:LOCATED_AT_SITE]->(s:Site)
+MATCH (s)-[SR:LOCATED_IN_REGION]->(r:Region)
+MATCH (a)-[HI:HAS_INFO]->(ai:AssetInfo)
+MATCH (a)-[HM:HAS_METADATA]->(ao:Operation)
+MATCH (a)-[ATTR:HAS_ATTRIBUTE]->(am:Attributes)
+MATCH (a)-[HO:HAS_OEE]->(oee:OEE)
+MATCH (a)-[PBO:PROVIDED_BY_OEM]->(oem:OEM)
+MATCH (a)-[ENSURES_COMPLIANCE]->(com:Compliance)
+MATCH (a)-[REQUIRES_MAINTENANCE]->(main:Maintenance)
+MATCH (a)-[REQUIRES_CALIBRATION]->(cal:Calibration)
+WHERE ai.HasInsurance = "YES" AND ai.AMCYears < 2
+RETURN *
+"""
+
+#Most utilized assets
+MOST_UTILIZED_ASSETS = """
+MATCH (u:AssetUtilization)
+WHERE u.TotalWOs IS NOT NULL
+WITH u ORDER BY u.TotalWOs DESC LIMIT 10
+MATCH (u)-[SU:SUMMARIZES]->(a:Asset)
+RETURN u, SU, a
+"""
+
+MOST_UTILIZED_ASSETS_TABLE_KEYS = [("TotalWOs", "DESC"), ("AssetID", "ASC")]
+MOST_UTILIZED_ASSETS_TABLE = f"""
+MATCH (u:AssetUtilization)
+WHERE u.TotalWOs IS NOT NULL
+WITH u.AssetID AS AssetID, u.AssetName AS AssetName, u.TotalWOs AS TotalWOs
+WHERE {keyset_predicate(*MOST_UTILIZED_ASSETS_TABLE_KEYS)}
+RETURN AssetID, AssetName, TotalWOs
+ORDER BY TotalWOs DESC, AssetID
+LIMIT $page_size
+"""
+
+#High/low performing assets: OEE.OEE is range indexed, the ORDER BY reads the index
+HIGH_OEE_ASSETS = """
+MATCH (oee:OEE)
+WHERE oee.OEE IS NOT NULL
+WITH oee ORDER BY oee.OEE DESC LIMIT 10
+MATCH (a:Asset)-[HO:HAS_OEE]->(oee)
+RETURN a, HO, oee
+"""
+
+LOW_OEE_ASSETS = """
+MATCH (oee:OEE)
+WHERE oee.OEE IS NOT NULL
+WITH oee ORDER BY oee.OEE ASC LIMIT 10
+MATCH (a:Asset)-[HO:HAS_OEE]->(oee)
+RETURN a, HO, oee
+"""
+
+#Monitor All Batchs
+ALL_BATCHES = f"""
+MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder)
+MATCH (b)-[YI:YIELDS]->(p:Product)
+MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
+MATCH (p)-[FW:FORMULATED_WITH]->(r:Recipe)
+MATCH (r)-[UM:USES_MATERIAL]->(m:Materials)
+MATCH (m)-[SB:SUPPLIED_BY]->(sup:Supplier)
+MATCH (m)-[SI:STORED_IN]->(pm:PlantMaterial)
+MATCH (pm)-[AA:AVAILABLE_AT]->(f:Facility)
+MATCH (f)-[LS:LOCATED_AT_SITE]->(s:Site)
+MATCH (s)-[LR:LOCATED_IN_REGION]->(re:Region)
+WHERE {time_window_predicate("b")}
+RETURN *
+"""
+
+#Most Consumed Materials
+MOST_CONSUMED_MATERIALS_TABLE_KEYS = [("TotalBatch", "DESC"), ("MaterialID", "ASC"), ("SupplierID", "ASC")]
+MOST_CONSUMED_MATERIALS_TABLE = f"""
+MATCH (mc:MaterialConsumption)
+WHERE mc.TotalBatch IS NOT NULL
+WITH mc.MaterialID AS MaterialID, mc.SupplierID AS SupplierID, mc.Location AS Location,
+    mc.TotalBatch AS TotalBatch, mc.TotalQty AS TotalQty, mc.Storage AS Storage
+WHERE {keyset_predicate(*MOST_CONSUMED_MATERIALS_TABLE_KEYS)}
+RETURN MaterialID, SupplierID, Location, TotalBatch, TotalQty, Storage
+ORDER BY TotalBatch DESC, MaterialID, SupplierID
+LIMIT $page_size
+"""
+
+#PO to Batches
+PO_TO_BATCHES = f"""
+MATCH (b)<-[MU:MANUFACTURES]-(po:ProcessOrder)
+WHERE {time_window_predicate("po")}
+RETURN *
+"""
+
+#batches have a quality rating below 95%?
+BATCHES_BELOW_95 = f"""
+MATCH (b:Batch)<-[MA:MANUFACTURES]-(po:ProcessOrder)
+MATCH (b)-[YI:YIELDS]->(p:Product)
+MATCH (p)-[FW:FORMULATED_WITH]->(r:Recipe)
+MATCH (r)-[UM:USES_MATERIAL]->(m:Materials)
+MATCH (b)-[EB:EXECUTED_BY]->(wo:WO)
+MATCH (b)-[AIN:ANALYZED_IN]->(lims:LIMS)
+WHERE lims.Status = 'Failed' AND {time_window_predicate("b")}
+Return *
+"""
+
+#Distribution of products to Warehouse
+WAREHOUSE_DISTRIBUTION = f"""
+MATCH (b:Batch)-[WI:WAREHOUSED_IN]->(f:Facility)
+MATCH (b)<-[MA:MANUFACTURES]-(po:ProcessOrder)
+MATCH (b)-[YI:YIELDS]->(p:Product)
+WHERE {time_window_predicate("b")}
+RETURN *
+"""
+
+#LIMS failure rate per product/site/line
+FAILURE_RATE_TABLE_KEYS = [("FailureRate", "DESC"), ("RollupID", "ASC")]
+FAILURE_RATE_TABLE = f"""
+MATCH (q:QualityRollup)
+WHERE q.FailureRate IS NOT NULL
+WITH q.id AS RollupID, q.Scope AS Scope, q.Key AS ID, q.Tests AS Tests,
+    q.Failed AS Failed, q.FailureRate AS FailureRate
+WHERE {keyset_predicate(*FAILURE_RATE_TABLE_KEYS)}
+RETURN Scope, ID, Tests, Failed, FailureRate, RollupID
+ORDER BY FailureRate DESC, RollupID
+LIMIT $page_size
+"""
+
+#Explore mode: one hop around a node, fetched on demand
+def neighborhood_query(label):
+    """
+    The node with id $node_id and at most $limit of its relationships and neighbours.
+    Labels cannot be parameters, so label is checked and put into the text to keep
+    the lookup on the :Label(id) constraint index.
+    """
+    if not label.isidentifier():
+        raise ValueError(f"Invalid node label {label!r}")
+    return f"""
+MATCH (n:{label} {{id: $node_id}})
+OPTIONAL MATCH (n)-[r]-(m)
+RETURN n, r, m
+LIMIT $limit
+"""
+
+#Batch genealogy: one level of CONSUMED_BY for the frontier batches $ids, per batch
+#its first $fanout neighbours by id with the consumed Qty and how many there are
+BATCH_INPUTS = """
+UNWIND $ids AS id
+MATCH (:Batch {id: id})<-[c:CONSUMED_BY]-(n:Batch)
+WITH id, n.id AS next, c.Qty AS qty ORDER BY next
+WITH id, collect([next, qty]) AS neighbours
+RETURN id, neighbours[..$fanout] AS next, size(neighbours) AS total
+"""
+
+BATCH_OUTPUTS = """
+UNWIND $ids AS id
+MATCH (:Batch {id: id})-[c:CONSUMED_BY]->(n:Batch)
+WITH id, n.id AS next, c.Qty AS qty ORDER BY next
+WITH id, collect([next, qty]) AS neighbours
+RETURN id, neighbours[..$fanout] AS next, size(neighbours) AS total
+"""
+
+#Batch genealogy: the traced batch and the CONSUMED_BY relationships of the kept $edges
+GENEALOGY_ROOT = """
+MATCH (b:Batch {id: $batch_id})
+RETURN b
+"""
+
+GENEALOGY_EDGES = """
+UNWIND $edges AS edge
+MATCH (a:Batch {id: edge[0]})-[c:CONSUMED_BY]->(b:Batch {id: edge[1]})
+RETURN a, c, b
+"""
+
+# Graph query behind the "Visualize" button of each question
+asset_queries = {
+    asset_questions[0]: ASSET_MONITORING,
+    asset_questions[1]: ASSET_AMC,
+    asset_questions[2]: MOST_UTILIZED_ASSETS,
+    asset_questions[3]: HIGH_OEE_ASSETS,
+    asset_questions[4]: LOW_OEE_ASSETS,
+}
+batch_queries = {
+    batch_questions[0]: ALL_BATCHES,
+    batch_questions[2]: PO_TO_BATCHES,
+    batch_questions[3]: BATCHES_BELOW_95,
+    batch_questions[4]: WAREHOUSE_DISTRIBUTION,
+    batch_questions[7]: AI_BATCH_ASSETS,
+}
+# Table query and keyset order keys behind each "TABLE" button
+table_queries = {
+    "failed_batch_table": (FAILED_BATCH_TABLE, FAILED_BATCH_TABLE_KEYS),
+    "ai_table": (AI_FAILED_BATCHES, AI_FAILED_BATCHES_KEYS),
+    "utilized_assets_table": (MOST_UTILIZED_ASSETS_TABLE, MOST_UTILIZED_ASSETS_TABLE_KEYS),
+    "consumed_materials_table": (MOST_CONSUMED_MATERIALS_TABLE, MOST_CONSUMED_MATERIALS_TABLE_KEYS),
+    "failure_rate_table": (FAILURE_RATE_TABLE, FAILURE_RATE_TABLE_KEYS),
+}
+
+def canned_queries():
+    """
+    Every canned question as (name, kind, query, order_keys), kind is "graph" or "table".
+    """
+    catalog = [
+        ("PO lineage", "graph", PO_LINEAGE, None),
+        ("Failed batch root cause", "graph", FAILED_BATCH_ROOT_CAUSE, None),
+        ("GEN AI batch assets", "graph", AI_BATCH_ASSETS, None),
+    ]
+    catalog += [(question, "graph", query, None) for question, query in asset_queries.items()]
+    catalog += [(question, "graph", query, None) for question, query in batch_queries.items()]
+    catalog += [(name, "table", query, keys) for name, (query, keys) in table_queries.items()]
+    return catalog
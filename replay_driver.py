@@ -0,0 +1,456 @@
+"""
+Record/replay stand-in for the neo4j driver.
+
+RecordingDriver wraps a real driver and captures every result stream
+(nodes, relationships, labels, properties and scalar values) into a
+compressed cassette file. ReplayDriver serves those results back through
+the same driver.session().run() and session.execute_read() interface, at
+full speed or with simulated network latency, so the app and the benchmarks
+run without a database.
+
+Cassettes are pickled; only replay files you recorded yourself.
+"""
+import gzip
+import json
+import os
+import pickle
+import threading
+import time
+
+CASSETTE_VERSION = 1
+
+def query_key(query, parameters=None, **kwargs):
+    """
+    Cassette key of a query: whitespace-normalized text plus its parameters.
+    """
+    params = dict(parameters or {}, **kwargs)
+    return " ".join(str(query).split()) + "\n" + json.dumps(params, sort_keys=True, default=str)
+
+class ReplayEntity:
+    """
+    Property container shared by replayed nodes and relationships.
+    """
+    def __init__(self, element_id, properties):
+        self.element_id = element_id
+        self._properties = properties
+
+    @property
+    def id(self):
+        return self.element_id
+
+    def get(self, key, default=None):
+        return self._properties.get(key, default)
+
+    def keys(self):
+        return self._properties.keys()
+
+    def values(self):
+        return self._properties.values()
+
+    def items(self):
+        return self._properties.items()
+
+    def __getitem__(self, key):
+        return self._properties[key]
+
+    def __contains__(self, key):
+        return key in self._properties
+
+    def __iter__(self):
+        return iter(self._properties)
+
+    def __len__(self):
+        return len(self._properties)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.element_id == other.element_id
+
+    def __hash__(self):
+        return hash(self.element_id)
+
+class ReplayNode(ReplayEntity):
+    def __init__(self, element_id, labels, properties):
+        super().__init__(element_id, properties)
+        self.labels = frozenset(labels)
+
+    def __repr__(self):
+        return f"<ReplayNode element_id={self.element_id!r} labels={set(self.labels)} properties={self._properties!r}>"
+
+class ReplayRelationship(ReplayEntity):
+    def __init__(self, element_id, rel_type, start_node, end_node, properties):
+        super().__init__(element_id, properties)
+        self.type = rel_type
+        self.start_node = start_node
+        self.end_node = end_node
+        self.nodes = (start_node, end_node)
+
+    def __repr__(self):
+        return f"<ReplayRelationship element_id={self.element_id!r} type={self.type!r}>"
+
+class ReplayRecord:
+    """
+    Immutable record with the lookup methods of neo4j.Record.
+    """
+    def __init__(self, keys, values):
+        self._keys = keys
+        self._values = values
+
+    def keys(self):
+        return list(self._keys)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return list(zip(self._keys, self._values))
+
+    def get(self, key, default=None):
+        return self._values[self._keys.index(key)] if key in self._keys else default
+
+    def data(self):
+        return dict(self.items())
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._values[key]
+        return self._values[self._keys.index(key)]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+class ReplaySummary:
+    def __init__(self, query, parameters, result_available_after, result_consumed_after, profile=None):
+        self.query = query
+        self.parameters = parameters
+        self.result_available_after = result_available_after
+        self.result_consumed_after = result_consumed_after
+        self.profile = profile
+        self.plan = profile
+
+class ReplayResult:
+    """
+    Result of a replayed query; records are decoded lazily while iterating.
+    """
+    def __init__(self, keys, rows, summary, decode, delay_per_record=0.0):
+        self._keys = keys
+        self._rows = rows
+        self._summary = summary
+        self._decode = decode
+        self._delay_per_record = delay_per_record
+        self._position = 0
+
+    def __iter__(self):
+        while self._position < len(self._rows):
+            row = self._rows[self._position]
+            self._position += 1
+            if self._delay_per_record:
+                time.sleep(self._delay_per_record)
+            yield ReplayRecord(self._keys, [self._decode(value) for value in row])
+
+    def keys(self):
+        return list(self._keys)
+
+    def values(self, *keys):
+        indexes = [self._keys.index(key) for key in keys] if keys else range(len(self._keys))
+        return [[record[i] for i in indexes] for record in self]
+
+    def data(self, *keys):
+        return [record.data() if not keys else {k: record[k] for k in keys} for record in self]
+
+    def single(self, strict=False):
+        records = list(self)
+        if strict and len(records) != 1:
+            raise ValueError(f"Expected exactly one record, got {len(records)}")
+        return records[0] if records else None
+
+    def consume(self):
+        self._position = len(self._rows)
+        return self._summary
+
+class Cassette:
+    """
+    Interned storage of recorded results: nodes and relationships are stored
+    once per cassette and rows refer to them by index.
+    """
+    def __init__(self):
+        self.nodes = []
+        self.relationships = []
+        self.results = {}
+        self._node_index = {}
+        self._relationship_index = {}
+        self._decoded_nodes = {}
+        self._decoded_relationships = {}
+
+    def encode(self, value):
+        if hasattr(value, "start_node"):
+            return ("r", self.add_relationship(value))
+        if hasattr(value, "labels"):
+            return ("n", self.add_node(value))
+        if isinstance(value, list):
+            return ("l", [self.encode(v) for v in value])
+        if isinstance(value, dict):
+            return ("m", {k: self.encode(v) for k, v in value.items()})
+        return ("v", value)
+
+    def add_node(self, node):
+        if node.element_id not in self._node_index:
+            self._node_index[node.element_id] = len(self.nodes)
+            self.nodes.append((node.element_id, tuple(node.labels), dict(node.items())))
+        return self._node_index[node.element_id]
+
+    def add_relationship(self, rel):
+        if rel.element_id not in self._relationship_index:
+            start, end = self.add_node(rel.start_node), self.add_node(rel.end_node)
+            self._relationship_index[rel.element_id] = len(self.relationships)
+            self.relationships.append((rel.element_id, rel.type, start, end, dict(rel.items())))
+        return self._relationship_index[rel.element_id]
+
+    def decode(self, encoded):
+        kind, value = encoded
+        if kind == "v":
+            return value
+        if kind == "n":
+            return self.node(value)
+        if kind == "r":
+            return self.relationship(value)
+        if kind == "l":
+            return [self.decode(v) for v in value]
+        return {k: self.decode(v) for k, v in value.items()}
+
+    def node(self, index):
+        if index not in self._decoded_nodes:
+            element_id, labels, properties = self.nodes[index]
+            self._decoded_nodes[index] = ReplayNode(element_id, labels, properties)
+        return self._decoded_nodes[index]
+
+    def relationship(self, index):
+        if index not in self._decoded_relationships:
+            element_id, rel_type, start, end, properties = self.relationships[index]
+            self._decoded_relationships[index] = ReplayRelationship(
+                element_id, rel_type, self.node(start), self.node(end), properties)
+        return self._decoded_relationships[index]
+
+    def record(self, key, keys, records, summary):
+        rows = [tuple(self.encode(value) for value in record.values()) for record in records]
+        profile = getattr(summary, "profile", None)
+        self.results[key] = (list(keys), rows, summary.result_available_after,
+                             summary.result_consumed_after, profile)
+
+    def save(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        payload = (CASSETTE_VERSION, self.nodes, self.relationships, self.results)
+        with gzip.open(path + ".tmp", "wb") as cassette_file:
+            pickle.dump(payload, cassette_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        cassette = cls()
+        with gzip.open(path, "rb") as cassette_file:
+            version, nodes, relationships, results = pickle.load(cassette_file)
+        if version != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version {version} in {path}")
+        cassette.nodes, cassette.relationships, cassette.results = nodes, relationships, results
+        cassette._node_index = {node[0]: i for i, node in enumerate(nodes)}
+        cassette._relationship_index = {rel[0]: i for i, rel in enumerate(relationships)}
+        return cassette
+
+class ReplayTransaction:
+    def __init__(self, driver):
+        self.driver = driver
+        self._closed = False
+
+    def run(self, query, parameters=None, **kwargs):
+        return self.driver.replay(query, parameters, **kwargs)
+
+    def commit(self):
+        self._closed = True
+
+    def rollback(self):
+        self._closed = True
+
+    def close(self):
+        self._closed = True
+
+    def closed(self):
+        return self._closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ReplaySession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, query, parameters=None, **kwargs):
+        return self.driver.replay(query, parameters, **kwargs)
+
+    def begin_transaction(self, **config):
+        return ReplayTransaction(self.driver)
+
+    def execute_read(self, transaction_function, *args, **kwargs):
+        with ReplayTransaction(self.driver) as tx:
+            return transaction_function(tx, *args, **kwargs)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ReplayDriver:
+    """
+    Serve recorded results through driver.session().run().
+    latency_ms is added once per query (round trip), record_latency_ms per
+    record; with recorded_timing=True the recorded server times are replayed too.
+    """
+    def __init__(self, path, latency_ms=0, record_latency_ms=0, recorded_timing=False):
+        self.path = path
+        self.cassette = Cassette.load(path)
+        self.latency_ms = latency_ms
+        self.record_latency_ms = record_latency_ms
+        self.recorded_timing = recorded_timing
+
+    def replay(self, query, parameters=None, **kwargs):
+        key = query_key(query, parameters, **kwargs)
+        if key not in self.cassette.results:
+            raise LookupError(f"Query not found in cassette {self.path}: {' '.join(str(query).split())[:200]}")
+        keys, rows, available_after, consumed_after, profile = self.cassette.results[key]
+        delay = self.latency_ms / 1000
+        if self.recorded_timing:
+            delay += ((available_after or 0) + (consumed_after or 0)) / 1000
+        if delay:
+            time.sleep(delay)
+        summary = ReplaySummary(query, dict(parameters or {}, **kwargs), available_after, consumed_after, profile)
+        return ReplayResult(keys, rows, summary, self.cassette.decode, self.record_latency_ms / 1000)
+
+    def session(self, **config):
+        return ReplaySession(self)
+
+    def verify_connectivity(self, **config):
+        pass
+
+    def close(self):
+        # the cassette stays readable, unlike a closed neo4j driver
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class RecordingTransaction:
+    def __init__(self, driver, transaction):
+        self.driver = driver
+        self.transaction = transaction
+
+    def run(self, query, parameters=None, **kwargs):
+        return self.driver.capture(self.transaction.run(query, parameters, **kwargs), query, parameters, **kwargs)
+
+    def commit(self):
+        self.transaction.commit()
+
+    def rollback(self):
+        self.transaction.rollback()
+
+    def close(self):
+        self.transaction.close()
+
+    def closed(self):
+        return self.transaction.closed()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class RecordingSession:
+    def __init__(self, driver, session):
+        self.driver = driver
+        self.session = session
+
+    def run(self, query, parameters=None, **kwargs):
+        return self.driver.capture(self.session.run(query, parameters, **kwargs), query, parameters, **kwargs)
+
+    def begin_transaction(self, **config):
+        return RecordingTransaction(self.driver, self.session.begin_transaction(**config))
+
+    def execute_read(self, transaction_function, *args, **kwargs):
+        def work(tx, *args, **kwargs):
+            return transaction_function(RecordingTransaction(self.driver, tx), *args, **kwargs)
+        return self.session.execute_read(work, *args, **kwargs)
+
+    def close(self):
+        self.session.close()
+        self.driver.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class RecordingDriver:
+    """
+    Wrap a neo4j driver and capture every result into a cassette file.
+    The cassette is written whenever a session closes; an existing file is
+    extended so several runs can be recorded into one cassette. Results are
+    drained completely while recording, even if the caller stops early.
+    """
+    def __init__(self, driver, path):
+        self.driver = driver
+        self.path = path
+        self.cassette = Cassette.load(path) if os.path.exists(path) else Cassette()
+        self.lock = threading.Lock()
+        self.dirty = False
+
+    def session(self, **config):
+        return RecordingSession(self, self.driver.session(**config))
+
+    def capture(self, result, query, parameters=None, **kwargs):
+        """
+        Drain a live result into the cassette and replay it to the caller.
+        """
+        keys = result.keys()
+        records = list(result)
+        summary = result.consume()
+        key = query_key(query, parameters, **kwargs)
+        with self.lock:
+            self.cassette.record(key, keys, records, summary)
+            keys, rows, available_after, consumed_after, profile = self.cassette.results[key]
+            self.dirty = True
+        replay_summary = ReplaySummary(query, dict(parameters or {}, **kwargs),
+                                       available_after, consumed_after, profile)
+        return ReplayResult(keys, rows, replay_summary, self.cassette.decode)
+
+    def verify_connectivity(self, **config):
+        return self.driver.verify_connectivity(**config)
+
+    def flush(self):
+        with self.lock:
+            if self.dirty:
+                self.cassette.save(self.path)
+                self.dirty = False
+
+    def close(self):
+        self.flush()
+        self.driver.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
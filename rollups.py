@@ -0,0 +1,133 @@
+import pandas as pd
+
+# Rollup nodes written next to the graph so the top-N questions never scan it.
+# (label, sort property) pairs; the sort property is range indexed.
+ROLLUP_INDEXES = [
+    ("AssetUtilization", "TotalWOs"),
+    ("MaterialConsumption", "TotalBatch"),
+    ("QualityRollup", "FailureRate"),
+]
+
+def asset_utilization(tables):
+    """
+    WO count per asset (one PERFORMED_ON edge per WO and asset).
+    """
+    wo = tables["wo"][["id", "AssetID"]].drop_duplicates()
+    counts = wo.groupby("AssetID").size().rename("TotalWOs").reset_index()
+    assets = tables["asset"][["id", "Name"]].rename(columns={"id": "AssetID", "Name": "AssetName"})
+    rollup = counts.merge(assets, on="AssetID", how="left")
+    rollup["id"] = rollup["AssetID"]
+    return rollup
+
+def material_consumption(tables):
+    """
+    Batch count and consumed quantity per material and supplier.
+    """
+    batches = tables["batch"][["id", "ProductID"]].rename(columns={"id": "BatchID"})
+    products = tables["product"][["id", "RecipeID"]].rename(columns={"id": "ProductID"})
+    recipe = tables["recipe"][["id", "MaterialID", "Qty"]].rename(columns={"id": "RecipeID"})
+    consumed = (batches.merge(products, on="ProductID")
+                .merge(recipe, on="RecipeID")
+                .merge(tables["material_supplier_rel"], on="MaterialID"))
+    rollup = (consumed.groupby(["MaterialID", "SupplierID"])
+              .agg(TotalBatch=("BatchID", "nunique"), TotalQty=("Qty", "sum"))
+              .reset_index())
+    materials = tables["material"][["id", "Location", "Storage"]].rename(columns={"id": "MaterialID"})
+    rollup = rollup.merge(materials, on="MaterialID", how="left")
+    rollup["id"] = rollup["MaterialID"] + "|" + rollup["SupplierID"]
+    return rollup
+
+def quality_rollup(tables):
+    """
+    LIMS tests and failures per product, site and line.
+    """
+    lims = tables["lims"][["id", "name", "BatchID", "SiteID", "Status"]].copy()
+    # LIMS names are generated as LIMS-<AssetID>-<WOID>
+    lims["AssetID"] = lims["name"].str.extract(r"^LIMS-(A\d+)-", expand=False)
+    lims = lims.merge(tables["batch"][["id", "ProductID"]].rename(columns={"id": "BatchID"}),
+                      on="BatchID", how="left")
+    lims = lims.merge(tables["asset"][["id", "LineID"]].rename(columns={"id": "AssetID"}),
+                      on="AssetID", how="left")
+    lims["Failed"] = (lims["Status"] == "Failed").astype(int)
+    frames = []
+    for scope, column in [("Product", "ProductID"), ("Site", "SiteID"), ("Line", "LineID")]:
+        grouped = (lims.dropna(subset=[column]).groupby(column)
+                   .agg(Tests=("id", "count"), Failed=("Failed", "sum"))
+                   .reset_index().rename(columns={column: "Key"}))
+        grouped["Scope"] = scope
+        frames.append(grouped)
+    rollup = pd.concat(frames, ignore_index=True)
+    rollup["FailureRate"] = (rollup["Failed"] / rollup["Tests"]).round(4)
+    rollup["id"] = rollup["Scope"] + "|" + rollup["Key"]
+    return rollup
+
+def compute_rollups(tables):
+    """
+    Compute every rollup from the ingested tables.
+    """
+    return {
+        "AssetUtilization": asset_utilization(tables),
+        "MaterialConsumption": material_consumption(tables),
+        "QualityRollup": quality_rollup(tables),
+    }
+
+def rollup_deltas(tables, increment):
+    """
+    Rollup rows to add to the stored ones (write_rollups with replace=False)
+    for the rows of an incremental load, only the rollups whose source rows
+    changed. increment holds only the new rows; tables the master data, with
+    every batch the new LIMS results refer to.
+    """
+    deltas = {}
+    if "wo" in increment:
+        deltas["AssetUtilization"] = asset_utilization(dict(tables, wo=increment["wo"]))
+    if "batch" in increment:
+        deltas["MaterialConsumption"] = material_consumption(dict(tables, batch=increment["batch"]))
+    if "lims" in increment:
+        deltas["QualityRollup"] = quality_rollup(dict(tables, lims=increment["lims"]))
+    return deltas
+
+def records(df):
+    """
+    DataFrame rows as driver friendly dicts (NaN -> None, numpy -> python).
+    """
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+def write_rollups(session, rollups, replace=True, batch_size=1000):
+    """
+    Write rollup nodes. With replace=False the counts are added to the stored
+    ones, which lets incremental loads maintain the rollups from deltas only.
+    """
+    for label, prop in ROLLUP_INDEXES:
+        session.run(f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.id IS UNIQUE")
+        session.run(f"CREATE INDEX IF NOT EXISTS FOR (n:{label}) ON (n.{prop})")
+    add = lambda prop: f"row.{prop}" if replace else f"coalesce(n.{prop}, 0) + row.{prop}"
+    queries = {
+        "AssetUtilization": f"""
+            UNWIND $rows AS row
+            MERGE (n:AssetUtilization {{id: row.id}})
+            SET n.AssetID = row.AssetID, n.AssetName = row.AssetName, n.TotalWOs = {add("TotalWOs")}
+            SET n.Name = coalesce(n.AssetName, n.AssetID) + ": " + toString(n.TotalWOs) + " WOs"
+            WITH n, row
+            MATCH (a:Asset {{id: row.AssetID}})
+            MERGE (n)-[:SUMMARIZES]->(a)
+            """,
+        "MaterialConsumption": f"""
+            UNWIND $rows AS row
+            MERGE (n:MaterialConsumption {{id: row.id}})
+            SET n.MaterialID = row.MaterialID, n.SupplierID = row.SupplierID,
+                n.Location = row.Location, n.Storage = row.Storage,
+                n.TotalBatch = {add("TotalBatch")}, n.TotalQty = {add("TotalQty")}
+            """,
+        "QualityRollup": f"""
+            UNWIND $rows AS row
+            MERGE (n:QualityRollup {{id: row.id}})
+            SET n.Scope = row.Scope, n.Key = row.Key,
+                n.Tests = {add("Tests")}, n.Failed = {add("Failed")}
+            SET n.FailureRate = round(toFloat(n.Failed) / n.Tests, 4)
+            """,
+    }
+    for label, df in rollups.items():
+        rows = records(df)
+        for start in range(0, len(rows), batch_size):
+            session.run(queries[label], rows=rows[start:start + batch_size]).consume()
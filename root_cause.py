@@ -0,0 +1,240 @@
+"""
+Root cause of failed batches from a batch x factor feature matrix.
+
+Every batch is described by its factors: the assets its WOs ran on, their
+line and facility, the machine state of the assets (Temperature, Vibration,
+OEE and the time since their last maintenance, binned), and the materials
+and suppliers of its recipe. A batch failed when one of its LIMS results
+failed and passed when all of them passed; batches still in progress are
+left out.
+
+suspects contrasts failed with passed batches of the same product: per
+factor the failures of the batches having it are compared with the failures
+expected from the failure rate of their products (lift = failed / expected),
+all factors at once with bincount. The matrix is kept between calls and
+updated with the rows of new or changed batches only.
+
+    python root_cause.py ./data
+"""
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# (column, test, factor) the numeric machine state is binned into
+BINS = [
+    ("Temperature", lambda v: v > 24, "Temperature > 24"),
+    ("Vibration", lambda v: v > 15, "Vibration > 15"),
+    ("OEE", lambda v: v < 60, "OEE < 60"),
+    ("MaintenanceDays", lambda v: v <= 30, "Maintained within 30 days"),
+    ("MaintenanceDays", lambda v: v > 90, "Not maintained for 90 days"),
+]
+
+def to_datetime(values):
+    """
+    Timestamps of dates as the driver or a dataset returns them: Cypher
+    dates, datetime.date or ISO strings.
+    """
+    return pd.to_datetime(values.map(str, na_action="ignore"), format="ISO8601")
+
+def outcomes(results):
+    """
+    Outcome of every row of Tests, Passed and Failures counts.
+    """
+    return np.select([results["Failures"] > 0, (results["Tests"] > 0) & (results["Passed"] == results["Tests"])],
+                     ["Failed", "Passed"], "Pending")
+
+def batch_features(assets, materials):
+    """
+    (batches, factors) from the rows of ROOT_CAUSE_ASSETS and
+    ROOT_CAUSE_MATERIALS: one row per batch (BatchID, ProductID, StartDate,
+    Outcome) and one per batch and factor (BatchID, Kind, Factor).
+    Tests, Passed and Failures count the LIMS results of a batch.
+    """
+    first = assets.drop_duplicates("BatchID")
+    batches = first[["BatchID", "ProductID", "StartDate"]].copy()
+    batches["StartDate"] = to_datetime(batches["StartDate"])
+    batches["Outcome"] = outcomes(first)
+    assets = assets.copy()
+    assets["MaintenanceDays"] = (to_datetime(assets["StartDate"]) - to_datetime(assets["LastMaintenance"])).dt.days
+    frames = [assets[["BatchID", column]].dropna().set_axis(["BatchID", "Factor"], axis=1).assign(Kind=kind)
+              for kind, column in [("Asset", "AssetID"), ("Line", "LineID"), ("Facility", "FacilityID")]]
+    for column, test, factor in BINS:
+        values = pd.to_numeric(assets[column], errors="coerce")
+        frames.append(pd.DataFrame({"BatchID": assets.loc[test(values), "BatchID"], "Factor": factor,
+                                    "Kind": "Machine"}))
+    frames.append(pd.DataFrame({"BatchID": assets.loc[assets["LastMaintenance"].isna(), "BatchID"],
+                                "Factor": "Never maintained", "Kind": "Machine"}))
+    frames += [materials[["BatchID", column]].dropna().set_axis(["BatchID", "Factor"], axis=1).assign(Kind=kind)
+               for kind, column in [("Material", "MaterialID"), ("Supplier", "SupplierID")]]
+    factors = pd.concat(frames, ignore_index=True).drop_duplicates()
+    # batches without a WO yet have materials but no assets; they come in
+    # with their factors once their WOs are loaded
+    factors = factors[factors["BatchID"].isin(batches["BatchID"])]
+    return batches, factors[["BatchID", "Kind", "Factor"]]
+
+OUTCOMES = {"Pending": 0, "Passed": 1, "Failed": 2}
+
+class FeatureMatrix:
+    """
+    Batches and their factors as integer codes, shared by the sessions of
+    the app. update appends the rows of new or changed batches; the old rows
+    of a changed batch are only marked dead, so an update costs the size of
+    its rows, not of the matrix.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.refreshed = None
+        self.batch_rows = {}
+        self.product_codes = {}
+        self.factor_codes = {}
+        self.factor_names = []
+        # per batch row
+        self.product = np.empty(0, dtype=np.int32)
+        self.start = np.empty(0, dtype="datetime64[ns]")
+        self.outcome = np.empty(0, dtype=np.int8)
+        self.alive = np.empty(0, dtype=bool)
+        # per (batch, factor) pair
+        self.rows = np.empty(0, dtype=np.int32)
+        self.codes = np.empty(0, dtype=np.int32)
+
+    def latest(self):
+        return self.start[self.alive].max() if self.alive.any() else None
+
+    def pending(self, before=None):
+        """
+        Ids of the batches without an outcome yet that started before before.
+        """
+        with self.lock:
+            rows = self.alive & (self.outcome == OUTCOMES["Pending"])
+            if before is not None:
+                rows &= self.start < np.datetime64(pd.Timestamp(before))
+            return [batch for batch, row in self.batch_rows.items() if rows[row]]
+
+    def update_outcomes(self, results):
+        """
+        Set the outcome of known batches from rows of ROOT_CAUSE_OUTCOMES;
+        their factors do not change.
+        """
+        with self.lock:
+            rows = [self.batch_rows[b] for b in results["BatchID"]]
+            self.outcome[rows] = pd.Series(outcomes(results)).map(OUTCOMES).to_numpy(np.int8)
+
+    def update(self, assets, materials):
+        batches, factors = batch_features(assets, materials)
+        uniques_codes, uniques = pd.factorize(pd.MultiIndex.from_frame(factors[["Kind", "Factor"]]))
+        with self.lock:
+            old = [self.batch_rows[b] for b in batches["BatchID"] if b in self.batch_rows]
+            self.alive[old] = False
+            base = len(self.alive)
+            self.batch_rows.update(zip(batches["BatchID"], range(base, base + len(batches))))
+            products = [self.product_codes.setdefault(p, len(self.product_codes)) for p in batches["ProductID"]]
+            for name in uniques:
+                if name not in self.factor_codes:
+                    self.factor_codes[name] = len(self.factor_names)
+                    self.factor_names.append(name)
+            codes = np.array([self.factor_codes[name] for name in uniques], dtype=np.int32)
+            self.product = np.concatenate([self.product, np.asarray(products, dtype=np.int32)])
+            self.start = np.concatenate([self.start, batches["StartDate"].to_numpy("datetime64[ns]")])
+            self.outcome = np.concatenate([self.outcome, batches["Outcome"].map(OUTCOMES).to_numpy(np.int8)])
+            self.alive = np.concatenate([self.alive, np.ones(len(batches), dtype=bool)])
+            rows = pd.Index(batches["BatchID"]).get_indexer(factors["BatchID"]) + base
+            self.rows = np.concatenate([self.rows, rows.astype(np.int32)])
+            self.codes = np.concatenate([self.codes, codes[uniques_codes]])
+            if (~self.alive).sum() > len(self.alive) / 2:
+                self.compact()
+            self.refreshed = time.time()
+
+    def compact(self):
+        """
+        Drop the dead rows of changed batches.
+        """
+        keep = self.alive[self.rows]
+        renumber = np.cumsum(self.alive) - 1
+        self.rows, self.codes = renumber[self.rows[keep]].astype(np.int32), self.codes[keep]
+        self.batch_rows = {batch: int(renumber[row]) for batch, row in self.batch_rows.items()}
+        self.product, self.start, self.outcome = self.product[self.alive], self.start[self.alive], self.outcome[self.alive]
+        self.alive = np.ones(len(self.product), dtype=bool)
+
+    def suspects(self, start_date=None, end_date=None, min_failed=2, top=20):
+        """
+        Factors ranked by lift over the decided batches that started in
+        [start_date, end_date]: Batches having the factor, Failed among them,
+        FailureRate, Expected failures from the failure rate of their
+        products, Lift = Failed / Expected and Products.
+        """
+        with self.lock:
+            product, rows, codes = self.product, self.rows, self.codes
+            keep = self.alive & (self.outcome > 0)
+            if start_date is not None:
+                keep &= self.start >= np.datetime64(pd.Timestamp(start_date))
+            if end_date is not None:
+                keep &= self.start <= np.datetime64(pd.Timestamp(end_date))
+            failed = keep & (self.outcome == OUTCOMES["Failed"])
+            names, product_size, size = self.factor_names, len(self.product_codes), len(self.factor_names)
+        product_count = np.bincount(product[keep], minlength=product_size)
+        product_failed = np.bincount(product[failed], minlength=product_size)
+        product_rate = np.divide(product_failed, product_count, out=np.zeros(product_size), where=product_count > 0)
+        pairs = keep[rows]
+        rows, codes = rows[pairs], codes[pairs]
+        batches = np.bincount(codes, minlength=size)
+        failures = np.bincount(codes, weights=failed[rows], minlength=size)
+        expected = np.bincount(codes, weights=product_rate[product[rows]], minlength=size)
+        spread = np.bincount(codes.astype(np.int64) * product_size + product[rows],
+                             minlength=size * product_size).reshape(size, product_size)
+        shown = np.flatnonzero(failures >= min_failed)
+        ranked = pd.DataFrame({
+            "Kind": [names[i][0] for i in shown], "Factor": [names[i][1] for i in shown],
+            "Batches": batches[shown], "Failed": failures[shown].astype(int),
+            "FailureRate": (failures[shown] / batches[shown]).round(3),
+            "Expected": expected[shown].round(2),
+            "Lift": np.divide(failures[shown], expected[shown], out=np.zeros(len(shown)),
+                              where=expected[shown] > 0).round(2),
+            "Products": (spread[shown] > 0).sum(axis=1),
+        })
+        return ranked.sort_values(["Lift", "Failed", "Kind", "Factor"], ascending=[False, False, True, True]) \
+            .head(top).reset_index(drop=True)
+
+def features_from_tables(tables):
+    """
+    The rows of ROOT_CAUSE_ASSETS and ROOT_CAUSE_MATERIALS from the tables
+    of a dataset.
+    """
+    lims = tables["lims"].assign(Failed=tables["lims"]["Status"] == "Failed",
+                                 Pass=tables["lims"]["Status"] == "Passed")
+    results = lims.groupby("BatchID").agg(Tests=("id", "count"), Failures=("Failed", "sum"),
+                                          Passed=("Pass", "sum")).reset_index()
+    batches = tables["batch"][["id", "ProductID", "StartDate"]].rename(columns={"id": "BatchID"})
+    batches = batches.merge(results, on="BatchID", how="left").fillna({"Tests": 0, "Failures": 0, "Passed": 0})
+    wo = tables["wo"][["BatchID", "AssetID"]].drop_duplicates()
+    line = tables["line"][["id", "FacilityID"]].rename(columns={"id": "LineID"})
+    asset = tables["asset"][["id", "LineID"]].rename(columns={"id": "AssetID"}).merge(line, on="LineID", how="left")
+    assets = (batches.merge(wo, on="BatchID").merge(asset, on="AssetID", how="left")
+              .merge(tables["asset_machine"][["AssetID", "Temperature", "Vibration"]], on="AssetID", how="left")
+              .merge(tables["asset_oee"][["AssetID", "OEE"]], on="AssetID", how="left"))
+    maintenance = assets[["BatchID", "AssetID", "StartDate"]].merge(
+        tables["maintenance"][["AssetID", "LastMaintenanceDate"]], on="AssetID")
+    maintenance["LastMaintenanceDate"] = to_datetime(maintenance["LastMaintenanceDate"])
+    maintenance = maintenance[maintenance["LastMaintenanceDate"] <= to_datetime(maintenance["StartDate"])]
+    last = maintenance.groupby(["BatchID", "AssetID"])["LastMaintenanceDate"].max().rename("LastMaintenance")
+    assets = assets.merge(last.reset_index(), on=["BatchID", "AssetID"], how="left")
+    recipe = (tables["product"][["id", "RecipeID"]].rename(columns={"id": "ProductID"})
+              .merge(tables["recipe"][["id", "MaterialID"]].rename(columns={"id": "RecipeID"}), on="RecipeID")
+              .merge(tables["material_supplier_rel"], on="MaterialID", how="left"))
+    materials = batches[["BatchID", "ProductID"]].merge(recipe, on="ProductID")[["BatchID", "MaterialID", "SupplierID"]]
+    return assets, materials
+
+if __name__ == "__main__":
+    from ingest import read_tables
+    assets, materials = features_from_tables(read_tables(sys.argv[1] if len(sys.argv) > 1 else "./data"))
+    matrix = FeatureMatrix()
+    started = time.perf_counter()
+    matrix.update(assets, materials)
+    built = time.perf_counter() - started
+    started = time.perf_counter()
+    ranked = matrix.suspects()
+    print(ranked.to_string(index=False))
+    print(f"{len(matrix.batch_rows)} batches, {len(matrix.rows)} batch factors: "
+          f"built in {built:.2f} s, ranked in {time.perf_counter() - started:.3f} s")
@@ -0,0 +1,269 @@
+"""
+Continuous event stream on top of a generated dataset, for ingestion soak tests.
+
+The static dataset provides the master data (sites, lines, assets, products,
+recipes, ...). New process orders then arrive one per simulated day, each with
+its batches, work orders and LIMS results following the rules of
+generate_batch, generate_wo and generate_lims, and maintenance records come
+in for the assets. Events are released in time order as micro-batches, one
+per simulated day, and written as JSONL or Parquet files or loaded straight
+into Neo4j:
+
+    python simulator/event_stream.py --data-folder ./data --out ./stream --format jsonl --pos-per-minute 6
+    python simulator/event_stream.py --data-folder ./data --load --pos-per-minute 60 --duration 14400
+    python simulator/event_stream.py --data-folder ./data --load --steps 500 --no-wait
+
+--load expects the dataset of --data-folder to be loaded already (ingest.py)
+and reads NEO4J_URI/NEO4J_USERNAME/NEO4J_PASSWORD from the environment or .env.
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from genealogy_simulation import generate_po, generate_batch, generate_wo, generate_dataset
+
+# LIMS results come in half a day after their work order started
+LIMS_DELAY = pd.Timedelta(hours=12)
+
+def last_number(ids, prefix):
+    """
+    Highest number of the ids <prefix><number>, 0 when there is none.
+    """
+    numbers = ids.astype(str).str.extract(rf"^{prefix}(\d+)$", expand=False).dropna()
+    return int(numbers.astype(int).max()) if len(numbers) else 0
+
+def read_dataset(data_folder):
+    """
+    Every table of a dataset written by save_dataset, read like ingest.py
+    reads it (the region "NA" is no missing value).
+    """
+    return {name[:-4]: pd.read_csv(os.path.join(data_folder, name), keep_default_na=False, na_values=[""])
+            for name in os.listdir(data_folder) if name.endswith(".csv")}
+
+class EventStream:
+    """
+    Generate new POs on top of the tables of a dataset and release their
+    events day by day. Ids continue after the ones of the dataset.
+    """
+    def __init__(self, tables, maintenance_per_day=1.0):
+        self.tables = tables
+        self.maintenance_per_day = maintenance_per_day
+        last_start = pd.to_datetime(tables["po"]["StartDate"], format="ISO8601").max()
+        self.clock = last_start.date() + timedelta(days=1)
+        self.po_count = last_number(tables["po"]["id"], "PO")
+        self.lims_count = last_number(tables["lims"]["id"], "LIMS-")
+        self.maintenance_count = last_number(tables["maintenance"]["id"], "MR")
+        # like generate_maintenance: assets with an OEE below 70 need about 8 repairs to 3
+        oee = tables["asset"][["id"]].merge(tables["asset_oee"][["AssetID", "OEE"]],
+                                            left_on="id", right_on="AssetID", how="left")
+        weights = np.where(oee["OEE"].fillna(90) < 70, 8.0, 3.0)
+        self.maintenance_assets = oee["id"].tolist()
+        self.maintenance_weights = weights / weights.sum()
+        self.batch_products = {}
+        self.pending = []
+        self.sequence = 0
+
+    def queue(self, when, table, df):
+        for row in df.to_dict("records"):
+            heapq.heappush(self.pending, (when(row), self.sequence, table, row))
+            self.sequence += 1
+
+    def arrive(self):
+        """
+        The next PO starts today: queue it with its batches, work orders, LIMS
+        results and the maintenance records of the day.
+        """
+        self.po_count += 1
+        po = generate_po(self.tables["product"], num_BOMs=10, num_process_orders=1)
+        duration = po.loc[0, "EndDate"] - po.loc[0, "StartDate"]
+        po["id"] = po["Name"] = f"PO{self.po_count}"
+        po["StartDate"] = self.clock
+        po["EndDate"] = self.clock + duration
+        # generate_batch numbers batches after the row index: B<POID>-<index + 1>-<n>
+        po.index = [self.po_count - 1]
+        batch = generate_batch(po, self.tables["product"], self.tables["facility"])
+        wo = generate_wo(batch, self.tables["up"], self.tables["asset"])
+        lims = self.lims(wo)
+        self.batch_products.update(zip(batch["id"], batch["ProductID"]))
+        self.queue(lambda row: pd.Timestamp(row["StartDate"]), "po", po)
+        self.queue(lambda row: pd.Timestamp(row["StartDate"]), "batch", batch)
+        self.queue(lambda row: pd.Timestamp(row["StartDate"]), "wo", wo)
+        starts = dict(zip(wo["id"], wo["StartDate"]))
+        self.queue(lambda row: pd.Timestamp(starts[row["WOID"]]) + LIMS_DELAY, "lims", lims)
+        self.queue(lambda row: pd.Timestamp(row["LastMaintenanceDate"]), "maintenance", self.maintenance())
+
+    def lims(self, wo_df):
+        """
+        A LIMS result per LIMS work order, named like generate_lims does. The
+        90% passed / 7% in progress / 3% failed split is drawn per result, so
+        it holds for the few results of one PO too.
+        """
+        lims_wo = wo_df[wo_df["WOType"] == "LIMS"]
+        statuses = np.random.choice(["Passed", "InProgress", "Failed"], size=len(lims_wo), p=[0.90, 0.07, 0.03])
+        ranges = {"Passed": (91, 101), "InProgress": (81, 90), "Failed": (60, 80)}
+        results = [np.random.randint(*ranges[status]) for status in statuses]
+        numbers = range(self.lims_count + 1, self.lims_count + len(lims_wo) + 1)
+        self.lims_count += len(lims_wo)
+        return pd.DataFrame({
+            "id": [f"LIMS-{n}" for n in numbers],
+            "name": [f"LIMS-{asset_id}-{wo_id}" for asset_id, wo_id in zip(lims_wo["AssetID"], lims_wo["id"])],
+            "Test": lims_wo["Task"].tolist(),
+            "Result": results,
+            "BatchID": lims_wo["BatchID"].tolist(),
+            "WOID": lims_wo["id"].tolist(),
+            "Status": statuses,
+            "FacilityID": lims_wo["FacilityID"].tolist(),
+            "SiteID": lims_wo["SiteID"].tolist(),
+        })
+
+    def maintenance(self):
+        """
+        The repairs of the day with the fields of generate_maintenance.
+        """
+        count = np.random.poisson(self.maintenance_per_day)
+        asset_ids = np.random.choice(self.maintenance_assets, size=count, p=self.maintenance_weights)
+        days = [pd.Timestamp(self.clock) + pd.Timedelta(hours=int(h)) for h in np.random.randint(0, 24, size=count)]
+        numbers = range(self.maintenance_count + 1, self.maintenance_count + count + 1)
+        self.maintenance_count += count
+        return pd.DataFrame({
+            "id": [f"MR{n}" for n in numbers],
+            "AssetID": asset_ids,
+            "MaintenanceSchedule": "On REPAIR",
+            "LastMaintenanceDate": days,
+            "NextMaintenanceDate": [day + pd.DateOffset(months=1) for day in days],
+            "MaintenancePerformedBy": np.random.choice(["John", "Jane Smith", "Tony"], size=count),
+            "MaintenanceRecords": "Replaced filter and checked lubrication",
+        })
+
+    def step(self):
+        """
+        Advance one simulated day and return its events in time order as
+        [(time, table, row)].
+        """
+        self.arrive()
+        end = pd.Timestamp(self.clock) + pd.Timedelta(days=1)
+        events = []
+        while self.pending and self.pending[0][0] < end:
+            when, _, table, row = heapq.heappop(self.pending)
+            events.append((when, table, row))
+        self.clock += timedelta(days=1)
+        return events
+
+    def rollup_context(self, increment):
+        """
+        The tables rollup_deltas needs for an increment: the master data and
+        the batches its LIMS results belong to.
+        """
+        batch_ids = increment["lims"]["BatchID"].unique() if "lims" in increment else []
+        batches = pd.DataFrame({"id": batch_ids, "ProductID": [self.batch_products[b] for b in batch_ids]},
+                               dtype=object)
+        return dict(self.tables, batch=batches)
+
+def to_tables(events):
+    """
+    Events of a micro-batch as table -> DataFrame.
+    """
+    rows = {}
+    for _, table, row in events:
+        rows.setdefault(table, []).append(row)
+    return {table: pd.DataFrame(table_rows) for table, table_rows in rows.items()}
+
+def write_jsonl(folder, number, events):
+    with open(os.path.join(folder, f"{number:06d}.jsonl"), "w", encoding="utf-8") as events_file:
+        for when, table, row in events:
+            events_file.write(json.dumps({"time": when.isoformat(), "table": table, "row": row}, default=str) + "\n")
+
+def write_parquet(folder, number, events):
+    batch_folder = os.path.join(folder, f"{number:06d}")
+    os.makedirs(batch_folder, exist_ok=True)
+    for table, df in to_tables(events).items():
+        df.astype({column: str for column in df.columns if df[column].dtype == object}) \
+            .to_parquet(os.path.join(batch_folder, f"{table}.parquet"), index=False)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-folder", help="dataset to continue, default is a freshly generated one")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--pos-per-minute", type=float, default=6, help="arrival rate, one PO per simulated day")
+    parser.add_argument("--maintenance-per-day", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run, default forever")
+    parser.add_argument("--steps", type=int, default=None, help="simulated days to run")
+    parser.add_argument("--no-wait", action="store_true", help="emit as fast as possible")
+    parser.add_argument("--out", help="folder for the micro-batch files")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--load", action="store_true", help="load every micro-batch into Neo4j")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+    tables = read_dataset(args.data_folder) if args.data_folder else generate_dataset(seed=args.seed)
+    stream = EventStream(tables, args.maintenance_per_day)
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+    write = write_jsonl if args.format == "jsonl" else write_parquet
+    session = None
+    if args.load:
+        sys.path.insert(0, ROOT)
+        from dotenv import load_dotenv
+        from neo4j import GraphDatabase
+        from bookmarks import save_bookmarks
+        from ingest import ingest_increment
+        from validate import KnownKeys
+        with open(os.path.join(ROOT, "config.json"), encoding="utf-8") as config_file:
+            bookmarks_path = os.path.join(ROOT, json.load(config_file)["neo4j"]["bookmarks_path"])
+        load_dotenv()
+        driver = GraphDatabase.driver(os.environ["NEO4J_URI"],
+                                      auth=(os.environ["NEO4J_USERNAME"], os.environ["NEO4J_PASSWORD"]))
+        session = driver.session()
+        known = KnownKeys(tables)
+
+    interval = 60 / args.pos_per_minute
+    started = time.perf_counter()
+    load_ms, total_events, number = [], 0, 0
+    try:
+        while (args.steps is None or number < args.steps) and \
+                (args.duration is None or time.perf_counter() - started < args.duration):
+            step_started = time.perf_counter()
+            events = stream.step()
+            if args.out:
+                write(args.out, number, events)
+            if session is not None:
+                increment = to_tables(events)
+                load_started = time.perf_counter()
+                ingest_increment(session, stream.rollup_context(increment), increment, known)
+                load_ms.append((time.perf_counter() - load_started) * 1000)
+                # the app reads at least up to the last micro-batch
+                save_bookmarks(bookmarks_path, session.last_bookmarks())
+            number += 1
+            total_events += len(events)
+            print(f"{stream.clock - timedelta(days=1)}: {len(events)} events"
+                  + (f", loaded in {load_ms[-1]:.0f} ms" if load_ms else ""))
+            if not args.no_wait:
+                time.sleep(max(interval - (time.perf_counter() - step_started), 0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if session is not None:
+            session.close()
+            driver.close()
+    elapsed = time.perf_counter() - started
+    print(f"{number} micro-batches, {total_events} events in {elapsed:.1f} s, "
+          f"{total_events / elapsed if elapsed else 0:.1f} events/s")
+    if load_ms:
+        print(f"load p50 {np.percentile(load_ms, 50):.0f} ms, p95 {np.percentile(load_ms, 95):.0f} ms, "
+              f"{sum(load_ms) / 1000:.1f} s loading")
+
+if __name__ == "__main__":
+    main()
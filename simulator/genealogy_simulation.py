@@ -8,10 +8,8 @@ import random
 today = datetime.now().date()
 current_directory = os.getcwd()
 data_folder = os.path.join(current_directory, 'data')
-if not os.path.exists(data_folder):
-    os.makedirs(data_folder)
 
-with open('./config.json', 'r') as file:
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json'), 'r') as file:
     config = json.load(file)
 
 asset_types = config["asset_types"]
@@ -300,10 +298,11 @@ def generate_products(product_list, num_products, sites_df):
     products = pd.DataFrame(data)
     return products
 
-def generate_po(products_df, num_BOMs):
+def generate_po(products_df, num_BOMs, num_process_orders=None):
     Status = ["Planned", "In Progress", "Completed", "Failed", "On Hold"]
     status_weights = [8, 25, 60, 5, 2] 
-    num_process_orders = len(products_df['id']) * 2
+    if num_process_orders is None:
+        num_process_orders = len(products_df['id']) * 2
     data = {
         'id': [],
         'Name': [],
@@ -440,12 +439,12 @@ def generate_random_batch_date(start_date, end_date):
     return start_date + timedelta(days=random_days)
 
 def generate_plant_material(facility_df, material_df):
-    plant_material_df = pd.DataFrame(columns=['id', 'FacilityID', 'MaterialID', 'Qty', 'Status'])
+    plant_materials = []
     facility_ids = facility_df['id'].tolist()
     material_sample = material_df.sample(frac=1).reset_index(drop=True)
     for i, material_row in material_sample.iterrows():
         facility_id = facility_ids[i % len(facility_ids)] 
-        plant_material_df = plant_material_df._append({
+        plant_materials.append({
             'id': 'PM' + str(i + 1), 
             'Name': f"PM-{material_row['id']}-{facility_id}",
             'FacilityID': facility_id,
@@ -454,7 +453,9 @@ def generate_plant_material(facility_df, material_df):
             'Status': material_row['Status'],
             'BatchDate': material_row['BatchDate'],
             'ExpiryDate': material_row['ExpiryDate'],
-        }, ignore_index=True)
+        })
+    plant_material_df = pd.DataFrame(plant_materials, columns=['id', 'FacilityID', 'MaterialID', 'Qty', 'Status',
+                                                                'Name', 'BatchDate', 'ExpiryDate'])
     return plant_material_df
 
 def generate_supplier():
@@ -698,73 +699,104 @@ def generate_lims(wo_df):
     lims_df = pd.DataFrame(lims_data)
     return lims_df
 
-region_df = generate_region()
-site_df = generate_site()
-facility_df = generate_facility(site_df,region_df)
-line_df = generate_line(facility_df)
-oem_df = generate_oems()
-up_df = generate_unitprocedure()
-asset_df = generate_asset(line_df,oem_df,up_df)
-asset_info_df = generate_asset_info(asset_df)
-asset_oper_df = generate_asset_operation(asset_df)
-asset_oee_df = generate_oee(asset_oper_df)
-asset_machine_df = generate_machine_attributes(asset_df,asset_oee_df)
-maintenance_df = generate_maintenance(asset_df, asset_oee_df)
-calibration_df = generate_calibration(asset_df)
-compliance_df = generate_compliance(asset_df)
-products_df = generate_products(product_list, num_products,site_df)
-po_df = generate_po(products_df, num_BOMs=10)
-batch_df = generate_batch(po_df, products_df, facility_df)
-material_df = generate_material()
-plant_material_df = generate_plant_material(facility_df, material_df)
-recipe_df = generate_recipe(material_df)
-supplier_df = generate_supplier()
-material_sup_mapping_df = assign_materials_to_suppliers(material_df, supplier_df)
-wo_df = generate_wo(batch_df, up_df, asset_df)
-lims_df = generate_lims(wo_df)
-
-# print(region_df.head())
-# print(site_df.head())
-# print(facility_df.head())
-# print(line_df.head())
-# print(oem_df.head())
-# print(up_df.head())
-# print(asset_df.head())
-# print(asset_info_df.head())
-# print(products_df.head())
-# print(po_df.head())
-# print(batch_df.head())
-# print(wo_df.head())
-# print(lims_df.head())
-# print(asset_oper_df.head())
-# print(asset_oee_df.head())
-# print(asset_machine_df.head())
-# print(maintenance_df.head())
-# print(calibration_df.head())
-# print(compliance_df.head())
-
-region_df.to_csv(os.path.join(data_folder, 'region.csv'), index=False)
-site_df.to_csv(os.path.join(data_folder, 'site.csv'), index=False)
-facility_df.to_csv(os.path.join(data_folder, 'facility.csv'), index=False)
-line_df.to_csv(os.path.join(data_folder, 'line.csv'), index=False)
-oem_df.to_csv(os.path.join(data_folder, 'oem.csv'), index=False)
-up_df.to_csv(os.path.join(data_folder, 'up.csv'), index=False)
-asset_df.to_csv(os.path.join(data_folder, 'asset.csv'), index=False)
-asset_info_df.to_csv(os.path.join(data_folder, 'asset_info.csv'), index=False)
-asset_oper_df.to_csv(os.path.join(data_folder, 'asset_oper.csv'), index=False)
-asset_oee_df.to_csv(os.path.join(data_folder, 'asset_oee.csv'), index=False)
-asset_machine_df.to_csv(os.path.join(data_folder, 'asset_machine.csv'), index=False)
-maintenance_df.to_csv(os.path.join(data_folder, 'maintenance.csv'), index=False)
-calibration_df.to_csv(os.path.join(data_folder, 'calibration.csv'), index=False)
-compliance_df.to_csv(os.path.join(data_folder, 'compliance.csv'), index=False)
-products_df.to_csv(os.path.join(data_folder, 'product.csv'), index=False)
-po_df.to_csv(os.path.join(data_folder, 'po.csv'), index=False)
-batch_df.to_csv(os.path.join(data_folder, 'batch.csv'), index=False)
-material_df.to_csv(os.path.join(data_folder, 'material.csv'), index=False)
-plant_material_df.to_csv(os.path.join(data_folder, 'plant_material.csv'), index=False)
-recipe_df.to_csv(os.path.join(data_folder, 'recipe.csv'), index=False)
-supplier_df.to_csv(os.path.join(data_folder, 'supplier.csv'), index=False)
-material_sup_mapping_df.to_csv(os.path.join(data_folder, 'material_supplier_rel.csv'), index=False)
-wo_df.to_csv(os.path.join(data_folder, 'wo.csv'), index=False)
-lims_df.to_csv(os.path.join(data_folder, 'lims.csv'), index=False)
-print("Successful")
\ No newline at end of file
+def generate_batch_consumption(batch_df, max_inputs=3, window=30):
+    """
+    Intermediate batches consumed by later batches. A batch takes up to
+    max_inputs of the last window batches of other products that ended
+    before it started, so every step of the production calendar can add a
+    level to the genealogy.
+    """
+    ends = pd.to_datetime(batch_df['EndDate'])
+    by_end = batch_df.assign(End=ends).sort_values(['End', 'id'])
+    end_values = by_end['End'].to_numpy()
+    data = {
+        'BatchID': [],
+        'ConsumedBatchID': [],
+        'Qty': []
+    }
+    for batch_id, product_id, start_date in zip(batch_df['id'], batch_df['ProductID'], batch_df['StartDate']):
+        available = np.searchsorted(end_values, np.datetime64(pd.Timestamp(start_date)), side='right')
+        candidates = by_end.iloc[max(0, available - window):available]
+        candidates = candidates[candidates['ProductID'] != product_id]
+        count = min(len(candidates), np.random.randint(0, max_inputs + 1))
+        for consumed in np.random.choice(candidates['id'].to_numpy(), size=count, replace=False):
+            data['BatchID'].append(batch_id)
+            data['ConsumedBatchID'].append(consumed)
+            data['Qty'].append(np.random.randint(1, 10) * 5)
+    batch_consumption_df = pd.DataFrame(data)
+    return batch_consumption_df
+
+def generate_dataset(num_process_orders=None, seed=None):
+    """
+    Generate every table of the genealogy dataset.
+    The dataset size is driven by the number of process orders (default 2 per product).
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    region_df = generate_region()
+    site_df = generate_site()
+    facility_df = generate_facility(site_df,region_df)
+    line_df = generate_line(facility_df)
+    oem_df = generate_oems()
+    up_df = generate_unitprocedure()
+    asset_df = generate_asset(line_df,oem_df,up_df)
+    asset_info_df = generate_asset_info(asset_df)
+    asset_oper_df = generate_asset_operation(asset_df)
+    asset_oee_df = generate_oee(asset_oper_df)
+    asset_machine_df = generate_machine_attributes(asset_df,asset_oee_df)
+    maintenance_df = generate_maintenance(asset_df, asset_oee_df)
+    calibration_df = generate_calibration(asset_df)
+    compliance_df = generate_compliance(asset_df)
+    products_df = generate_products(product_list, num_products,site_df)
+    po_df = generate_po(products_df, num_BOMs=10, num_process_orders=num_process_orders)
+    batch_df = generate_batch(po_df, products_df, facility_df)
+    material_df = generate_material()
+    plant_material_df = generate_plant_material(facility_df, material_df)
+    recipe_df = generate_recipe(material_df)
+    supplier_df = generate_supplier()
+    material_sup_mapping_df = assign_materials_to_suppliers(material_df, supplier_df)
+    wo_df = generate_wo(batch_df, up_df, asset_df)
+    lims_df = generate_lims(wo_df)
+    batch_consumption_df = generate_batch_consumption(batch_df)
+    # Table name -> DataFrame, table names are the CSV file names
+    return {
+        'region': region_df,
+        'site': site_df,
+        'facility': facility_df,
+        'line': line_df,
+        'oem': oem_df,
+        'up': up_df,
+        'asset': asset_df,
+        'asset_info': asset_info_df,
+        'asset_oper': asset_oper_df,
+        'asset_oee': asset_oee_df,
+        'asset_machine': asset_machine_df,
+        'maintenance': maintenance_df,
+        'calibration': calibration_df,
+        'compliance': compliance_df,
+        'product': products_df,
+        'po': po_df,
+        'batch': batch_df,
+        'batch_consumption': batch_consumption_df,
+        'material': material_df,
+        'plant_material': plant_material_df,
+        'recipe': recipe_df,
+        'supplier': supplier_df,
+        'material_supplier_rel': material_sup_mapping_df,
+        'wo': wo_df,
+        'lims': lims_df,
+    }
+
+def save_dataset(tables, data_folder):
+    """
+    Write each table to <data_folder>/<table>.csv.
+    """
+    if not os.path.exists(data_folder):
+        os.makedirs(data_folder)
+    for table, df in tables.items():
+        df.to_csv(os.path.join(data_folder, f'{table}.csv'), index=False)
+
+if __name__ == "__main__":
+    save_dataset(generate_dataset(), data_folder)
+    print("Successful")
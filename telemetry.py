@@ -0,0 +1,330 @@
+"""
+Local time-series store for the machine telemetry of the assets.
+
+Readings (Temperature, Vibration, Noise, Pressure, Throughput, one row per
+second) are appended to columnar segment files, one file per column and UTC
+day of an asset, and read back through numpy memory maps, so a range scan
+only touches the days and rows it asks for:
+
+    <root>/<asset>/<YYYYMMDD>.t              int64 epoch seconds
+    <root>/<asset>/<YYYYMMDD>.<channel>      float32
+
+Minute, hour and day rollups (min, max, mean, p50 and p95 per channel) are
+appended the same way as soon as a bucket is complete:
+
+    <root>/<asset>/rollup_<resolution>.t
+    <root>/<asset>/rollup_<resolution>.<channel>_<stat>
+
+Neo4j keeps only a link to the asset folder and the latest hourly rollup on
+the Attributes node (publish_latest). Threshold questions such as
+"temperature above 24 during batch X" are range scans over the time windows
+of the batch's work orders (batch_exceedances):
+
+    python telemetry.py simulate --data-folder ./data --hours 6
+    python telemetry.py batch --data-folder ./data --batch BPO1-1-1 --channel Temperature --above 24
+    python telemetry.py publish
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+CHANNELS = ["Temperature", "Vibration", "Noise", "Pressure", "Throughput"]
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+STATS = ["min", "max", "mean", "p50", "p95"]
+DAY = 86400
+
+def column_rows(path, dtype):
+    return os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0
+
+def read_column(path, dtype, rows):
+    """
+    Read-only memory map of the first rows of a column file.
+    """
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+
+def append_column(path, values, dtype):
+    with open(path, "ab") as column_file:
+        column_file.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+def epoch_seconds(value):
+    """
+    Epoch seconds of a date, datetime, ISO string or number (naive is UTC).
+    """
+    if isinstance(value, (int, np.integer, float)):
+        return int(value)
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return int(timestamp.timestamp())
+
+class TelemetryStore:
+    def __init__(self, root):
+        self.root = root
+        self.last_times = {}
+
+    def folder(self, asset_id):
+        return os.path.join(self.root, str(asset_id))
+
+    def segments(self, asset_id):
+        """
+        Day numbers (epoch days) of the segments of an asset, in order.
+        """
+        folder = self.folder(asset_id)
+        if not os.path.isdir(folder):
+            return []
+        days = {name[:8] for name in os.listdir(folder) if name[:8].isdigit() and name.endswith(".t")}
+        return sorted(int(pd.Timestamp(day).timestamp()) // DAY for day in days)
+
+    def segment_path(self, asset_id, day, column):
+        name = datetime.fromtimestamp(day * DAY, tz=timezone.utc).strftime("%Y%m%d")
+        return os.path.join(self.folder(asset_id), f"{name}.{column}")
+
+    def segment(self, asset_id, day, channels):
+        """
+        (times, {channel: values}) of one day as memory maps. A torn last
+        append is cut off at the shortest column.
+        """
+        paths = {column: self.segment_path(asset_id, day, column) for column in ["t"] + channels}
+        rows = min([column_rows(paths["t"], np.int64)] +
+                   [column_rows(paths[channel], np.float32) for channel in channels])
+        return (read_column(paths["t"], np.int64, rows),
+                {channel: read_column(paths[channel], np.float32, rows) for channel in channels})
+
+    def last_time(self, asset_id):
+        if asset_id not in self.last_times:
+            segments = self.segments(asset_id)
+            times = self.segment(asset_id, segments[-1], [])[0] if segments else []
+            self.last_times[asset_id] = int(times[-1]) if len(times) else None
+        return self.last_times[asset_id]
+
+    def end(self):
+        """
+        Epoch seconds right after the last reading of any asset, None while
+        the store is empty.
+        """
+        assets = os.listdir(self.root) if os.path.isdir(self.root) else []
+        last = [t for t in (self.last_time(asset_id) for asset_id in assets) if t is not None]
+        return max(last) + 1 if last else None
+
+    def append(self, asset_id, times, values):
+        """
+        Append readings, times in epoch seconds after the last stored one and
+        values {channel: array}, then roll up the buckets they complete.
+        """
+        times = np.asarray(times, dtype=np.int64)
+        if len(times) == 0:
+            return
+        last = self.last_time(asset_id)
+        if (last is not None and times[0] <= last) or np.any(np.diff(times) <= 0):
+            raise ValueError(f"Telemetry of {asset_id} must be appended in increasing time order")
+        os.makedirs(self.folder(asset_id), exist_ok=True)
+        days = times // DAY
+        boundaries = np.flatnonzero(np.diff(days)) + 1
+        for part in np.split(np.arange(len(times)), boundaries):
+            day = int(days[part[0]])
+            for channel in CHANNELS:
+                append_column(self.segment_path(asset_id, day, channel),
+                              np.asarray(values[channel])[part], np.float32)
+            # the time column goes last, it decides how many rows are readable
+            append_column(self.segment_path(asset_id, day, "t"), times[part], np.int64)
+        self.last_times[asset_id] = int(times[-1])
+        self.roll(asset_id)
+
+    def scan(self, asset_id, start, end, channels=CHANNELS):
+        """
+        Readings with start <= time < end as (times, {channel: values}).
+        Only the segments of the days in the range are mapped.
+        """
+        start, end = epoch_seconds(start), epoch_seconds(end)
+        parts_t, parts = [], {channel: [] for channel in channels}
+        for day in self.segments(asset_id):
+            if day < start // DAY or day > (end - 1) // DAY:
+                continue
+            times, values = self.segment(asset_id, day, channels)
+            lo, hi = np.searchsorted(times, start), np.searchsorted(times, end)
+            parts_t.append(np.array(times[lo:hi]))
+            for channel in channels:
+                parts[channel].append(np.array(values[channel][lo:hi]))
+        if not parts_t:
+            return np.empty(0, dtype=np.int64), {channel: np.empty(0, dtype=np.float32) for channel in channels}
+        return np.concatenate(parts_t), {channel: np.concatenate(parts[channel]) for channel in channels}
+
+    def rollup_path(self, asset_id, resolution, column):
+        return os.path.join(self.folder(asset_id), f"rollup_{resolution}.{column}")
+
+    def roll(self, asset_id):
+        """
+        Append the rollups of every bucket completed since the last roll.
+        A bucket is complete once a later reading has arrived.
+        """
+        last = self.last_time(asset_id)
+        if last is None:
+            return
+        for resolution, width in RESOLUTIONS.items():
+            rolled_path = self.rollup_path(asset_id, resolution, "t")
+            rolled = read_column(rolled_path, np.int64, column_rows(rolled_path, np.int64))
+            if len(rolled):
+                start = int(rolled[-1]) + width
+            else:
+                segments = self.segments(asset_id)
+                start = int(self.segment(asset_id, segments[0], [])[0][0]) // width * width
+            end = last // width * width
+            if end <= start:
+                continue
+            times, values = self.scan(asset_id, start, end)
+            if len(times) == 0:
+                continue
+            frame = pd.DataFrame(values)
+            grouped = frame.groupby(times // width * width)
+            stats = {"min": grouped.min(), "max": grouped.max(), "mean": grouped.mean(),
+                     "p50": grouped.quantile(0.5), "p95": grouped.quantile(0.95)}
+            for channel in CHANNELS:
+                for stat in STATS:
+                    append_column(self.rollup_path(asset_id, resolution, f"{channel}_{stat}"),
+                                  stats[stat][channel].to_numpy(), np.float32)
+            append_column(self.rollup_path(asset_id, resolution, "t"), stats["min"].index.to_numpy(), np.int64)
+
+    def rollups(self, asset_id, resolution, start=None, end=None):
+        """
+        Rollup rows of an asset as a DataFrame (t = bucket start in epoch
+        seconds, one <channel>_<stat> column each), optionally within a range.
+        """
+        columns = [f"{channel}_{stat}" for channel in CHANNELS for stat in STATS]
+        rows = min([column_rows(self.rollup_path(asset_id, resolution, "t"), np.int64)] +
+                   [column_rows(self.rollup_path(asset_id, resolution, column), np.float32) for column in columns])
+        times = read_column(self.rollup_path(asset_id, resolution, "t"), np.int64, rows)
+        lo = np.searchsorted(times, epoch_seconds(start)) if start is not None else 0
+        hi = np.searchsorted(times, epoch_seconds(end)) if end is not None else rows
+        frame = {"t": np.array(times[lo:hi])}
+        for column in columns:
+            frame[column] = np.array(read_column(self.rollup_path(asset_id, resolution, column), np.float32,
+                                                 rows)[lo:hi])
+        return pd.DataFrame(frame)
+
+    def latest(self, asset_id, resolution="hour"):
+        """
+        The last complete rollup row of an asset as a dict, None without one.
+        """
+        rolled = self.rollups(asset_id, resolution)
+        return rolled.iloc[-1].to_dict() if len(rolled) else None
+
+    def exceedance(self, asset_id, channel, threshold, start, end):
+        """
+        Readings of a channel above threshold within [start, end).
+        """
+        times, values = self.scan(asset_id, start, end, [channel])
+        above = values[channel] > threshold
+        return {
+            "AssetID": asset_id,
+            "readings": len(times),
+            "seconds_above": int(above.sum()),
+            "first_above": pd.Timestamp(int(times[above][0]), unit="s") if above.any() else None,
+            "max": float(values[channel].max()) if len(times) else None,
+        }
+
+def wo_window(wo):
+    """
+    [start, end) of a work order: its StartDate and EndDate are days, the
+    end day is included.
+    """
+    start = pd.Timestamp(wo["StartDate"]).normalize()
+    end = pd.Timestamp(wo["EndDate"]).normalize() + pd.Timedelta(days=1)
+    return start, max(end, start + pd.Timedelta(days=1))
+
+def batch_exceedances(store, wo_df, batch_id, channel, threshold):
+    """
+    Per work order of a batch, the readings of its asset above threshold
+    during the work order, e.g. Temperature above 24 during batch X.
+    """
+    rows = []
+    for wo in wo_df[wo_df["BatchID"] == batch_id].to_dict("records"):
+        start, end = wo_window(wo)
+        row = store.exceedance(wo["AssetID"], channel, threshold, start, end)
+        rows.append(dict(row, WOID=wo["id"], Task=wo["Task"], start=start, end=end))
+    return pd.DataFrame(rows)
+
+def simulate(store, asset_machine_df, start, seconds, seed=None):
+    """
+    Append seconds of 1 Hz readings per asset from start: noise and a slow
+    drift around the snapshot of generate_machine_attributes.
+    """
+    rng = np.random.default_rng(seed)
+    times = np.arange(epoch_seconds(start), epoch_seconds(start) + seconds, dtype=np.int64)
+    for machine in asset_machine_df.to_dict("records"):
+        last = store.last_time(machine["AssetID"])
+        asset_times = times[times > last] if last is not None else times
+        phase = rng.uniform(0, 2 * np.pi)
+        drift = np.sin(2 * np.pi * asset_times / 21600 + phase)
+        values = {channel: machine[channel] * (1 + 0.05 * drift + rng.normal(0, 0.02, len(asset_times)))
+                  for channel in CHANNELS}
+        store.append(machine["AssetID"], asset_times, values)
+
+def publish_latest(session, store, asset_ids, resolution="hour"):
+    """
+    Write the latest rollup of each asset onto its Attributes node: the means
+    replace the snapshot values the graph questions read, plus the maxima,
+    the bucket time and the store folder of the asset.
+    """
+    rows = []
+    for asset_id in asset_ids:
+        latest = store.latest(asset_id, resolution)
+        if latest is None:
+            continue
+        props = {channel: round(latest[f"{channel}_mean"], 2) for channel in CHANNELS}
+        props.update({f"{channel}Max": round(latest[f"{channel}_max"], 2) for channel in CHANNELS})
+        props["TelemetryAt"] = datetime.fromtimestamp(int(latest["t"]), tz=timezone.utc)
+        props["TelemetryPath"] = os.path.relpath(store.folder(asset_id), store.root)
+        rows.append({"AssetID": asset_id, "props": props})
+    session.run("""
+    UNWIND $rows AS row
+    MATCH (a:Asset {id: row.AssetID})-[:HAS_ATTRIBUTE]->(am:Attributes)
+    SET am += row.props
+    """, rows=rows).consume()
+    return len(rows)
+
+def main():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")) as config_file:
+        store_path = json.load(config_file)["telemetry"]["path"]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=store_path)
+    commands = parser.add_subparsers(dest="command", required=True)
+    simulate_parser = commands.add_parser("simulate", help="append simulated readings for every asset")
+    simulate_parser.add_argument("--data-folder", default="./data")
+    simulate_parser.add_argument("--start", help="default: where the store ends, else midnight today")
+    simulate_parser.add_argument("--hours", type=float, default=1)
+    simulate_parser.add_argument("--seed", type=int, default=None)
+    batch_parser = commands.add_parser("batch", help="readings above a threshold during a batch")
+    batch_parser.add_argument("--data-folder", default="./data")
+    batch_parser.add_argument("--batch", required=True)
+    batch_parser.add_argument("--channel", choices=CHANNELS, default="Temperature")
+    batch_parser.add_argument("--above", type=float, default=24)
+    commands.add_parser("publish", help="write the latest hourly rollups to Neo4j")
+    args = parser.parse_args()
+
+    store = TelemetryStore(args.store)
+    if args.command == "simulate":
+        machines = pd.read_csv(os.path.join(args.data_folder, "asset_machine.csv"))
+        start = args.start or store.end() or pd.Timestamp.now(tz="UTC").normalize()
+        simulate(store, machines, start, int(args.hours * 3600), args.seed)
+        print(f"{len(machines)} assets, {int(args.hours * 3600)} readings each in {store.root}")
+    elif args.command == "batch":
+        wo_df = pd.read_csv(os.path.join(args.data_folder, "wo.csv"))
+        print(batch_exceedances(store, wo_df, args.batch, args.channel, args.above).to_string(index=False))
+    else:
+        from dotenv import load_dotenv
+        from neo4j import GraphDatabase
+        load_dotenv()
+        driver = GraphDatabase.driver(os.environ["NEO4J_URI"],
+                                      auth=(os.environ["NEO4J_USERNAME"], os.environ["NEO4J_PASSWORD"]))
+        with driver, driver.session() as session:
+            published = publish_latest(session, store, sorted(os.listdir(store.root)))
+        print(f"Latest rollups of {published} assets written")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import pandas as pd
+
+from root_cause import FeatureMatrix
+
+def asset_rows(batch, start, asset, failures=0):
+    return {"BatchID": batch, "ProductID": "P1", "StartDate": start, "Tests": 1, "Passed": 1 - failures,
+            "Failures": failures, "AssetID": asset, "LineID": "L1", "FacilityID": "F1", "Temperature": 20,
+            "Vibration": 10, "OEE": 80, "LastMaintenance": None}
+
+def factors_of(matrix, batch):
+    row = matrix.batch_rows[batch]
+    return {matrix.factor_names[code] for code in matrix.codes[matrix.rows == row]}
+
+def test_batch_with_materials_but_no_assets():
+    matrix = FeatureMatrix()
+    assets = pd.DataFrame([asset_rows("B1", "2024-01-01", "A1")])
+    materials = pd.DataFrame({"BatchID": ["B1", "B2"], "MaterialID": ["M1", "M2"], "SupplierID": ["S1", "S2"]})
+    matrix.update(assets, materials)
+    assert list(matrix.batch_rows) == ["B1"]
+    assert ((matrix.rows >= 0) & (matrix.rows < len(matrix.alive))).all()
+    assert ("Material", "M2") not in factors_of(matrix, "B1")
+
+    # the WOs of B2 arrive with the next refresh
+    assets = pd.DataFrame([asset_rows("B2", "2024-01-02", "A2", failures=1)])
+    matrix.update(assets, materials[materials["BatchID"] == "B2"])
+    assert factors_of(matrix, "B2") >= {("Asset", "A2"), ("Material", "M2"), ("Supplier", "S2")}
+    assert ("Material", "M2") not in factors_of(matrix, "B1")
@@ -0,0 +1,228 @@
+import json
+import logging
+import math
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class FileSpanExporter:
+    """
+    Append finished spans as JSON lines to a local file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self.lock, open(self.path, "a", encoding="utf-8") as span_file:
+            for span in spans:
+                span_file.write(json.dumps(span, default=str) + "\n")
+
+class OTLPHttpSpanExporter:
+    """
+    Post finished spans as OTLP/JSON to a collector (or any stand-in that
+    accepts POST /v1/traces).
+    """
+    def __init__(self, endpoint, service_name="genealogy-accelerator", timeout=2):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def attribute(self, key, value):
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def export(self, spans):
+        import urllib.request
+        otlp_spans = []
+        for span in spans:
+            otlp_span = {
+                "traceId": span["trace_id"],
+                "spanId": span["span_id"],
+                "name": span["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(span["start_ns"]),
+                "endTimeUnixNano": str(span["end_ns"]),
+                "attributes": [self.attribute(k, v) for k, v in span["attributes"].items()],
+            }
+            if span["parent_id"]:
+                otlp_span["parentSpanId"] = span["parent_id"]
+            otlp_spans.append(otlp_span)
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [self.attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "genealogy"}, "spans": otlp_spans}],
+        }]}
+        request = urllib.request.Request(self.url, data=json.dumps(body).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except OSError as e:
+            logger.warning("Span export to %s failed: %s", self.url, e)
+
+class BackgroundSpanExporter:
+    """
+    Hand finished traces to another exporter on a background thread, so a
+    slow or unreachable collector never holds up a rerun. Traces that find
+    the queue full are dropped.
+    """
+    def __init__(self, exporter, queue_size=1000):
+        self.exporter = exporter
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        threading.Thread(target=self.run, name="span-export", daemon=True).start()
+
+    def export(self, spans):
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning("Span export queue is full, %d traces dropped", self.dropped)
+
+    def run(self):
+        while True:
+            spans = self.queue.get()
+            try:
+                self.exporter.export(spans)
+            except Exception:
+                logger.exception("Span export failed")
+
+class Tracer:
+    """
+    Minimal span tracer. Spans nest per thread and a trace is exported when
+    its root span ends.
+    """
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+        self.local = threading.local()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        stack = self.local.__dict__.setdefault("stack", [])
+        if not stack:
+            self.local.finished = []
+            trace_id = secrets.token_hex(16)
+        else:
+            trace_id = stack[-1]["trace_id"]
+        span = {
+            "trace_id": trace_id,
+            "span_id": secrets.token_hex(8),
+            "parent_id": stack[-1]["span_id"] if stack else None,
+            "name": name,
+            "start_ns": time.time_ns(),
+            "attributes": dict(attributes),
+        }
+        if stack and "view" in stack[0]["attributes"]:
+            span["attributes"].setdefault("view", stack[0]["attributes"]["view"])
+        started = time.perf_counter()
+        stack.append(span)
+        try:
+            yield span["attributes"]
+        except Exception as e:
+            span["attributes"]["error"] = repr(e)
+            raise
+        finally:
+            stack.pop()
+            span["end_ns"] = time.time_ns()
+            span["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            self.local.finished.append(span)
+            if not stack and self.exporter is not None:
+                self.exporter.export(self.local.finished)
+
+def tracer_from_config(config):
+    """
+    Build the tracer described by the "tracing" section of config.json.
+    """
+    tracing = config.get("tracing", {})
+    exporter = tracing.get("exporter", "none")
+    if exporter == "file":
+        return Tracer(FileSpanExporter(tracing["path"]))
+    if exporter == "otlp":
+        return Tracer(BackgroundSpanExporter(OTLPHttpSpanExporter(tracing["otlp_endpoint"]),
+                                             tracing.get("queue_size", 1000)))
+    return Tracer()
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+class StageTimings:
+    """
+    The last window durations per (view, stage) of a span file. refresh
+    reads only the lines appended since the last call, so the panel does
+    not read the whole log on every render.
+    """
+    def __init__(self, path, window=1000):
+        self.path = path
+        self.window = window
+        self.offset = 0
+        self.durations = {}
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as span_file:
+            span_file.seek(0, os.SEEK_END)
+            if span_file.tell() < self.offset:
+                # the log was rotated or truncated
+                self.offset, self.durations = 0, {}
+            span_file.seek(self.offset)
+            data = span_file.read()
+        # a line still being written is read with the next refresh
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+        for line in data[:end].splitlines():
+            span = json.loads(line)
+            key = (span["attributes"].get("view"), span["name"])
+            if key not in self.durations:
+                self.durations[key] = deque(maxlen=self.window)
+            self.durations[key].append(span["duration_ms"])
+
+    def percentiles(self, view=None):
+        """
+        p50/p95/p99 duration per (view, stage), of one view if given.
+        """
+        with self.lock:
+            self.refresh()
+            durations = {key: list(values) for key, values in self.durations.items()
+                         if view is None or key[0] == view}
+        return [{
+            "view": span_view,
+            "stage": stage,
+            "count": len(values),
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+        } for (span_view, stage), values in sorted(durations.items(), key=lambda item: str(item[0]))]
+
+def stage_percentiles(path, view=None):
+    """
+    p50/p95/p99 duration per (view, stage) from a whole span file.
+    """
+    return StageTimings(path, window=None).percentiles(view)
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "logs/traces.jsonl"
+    for row in stage_percentiles(path):
+        print(f"{row['view']} | {row['stage']}: n={row['count']} p50={row['p50_ms']}ms "
+              f"p95={row['p95_ms']}ms p99={row['p99_ms']}ms")
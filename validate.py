@@ -0,0 +1,248 @@
+"""
+Referential integrity of a simulator dataset, checked before it is loaded.
+
+Every foreign key between the tables is checked with a vectorized hash join
+(pyarrow's is_in against the keys of the referenced table), and every key
+for duplicates. Orphans (references to rows that do not exist, like the
+Unknown_Facility/Unknown_Warehouse placeholders of generate_batch) and
+duplicate keys fail the load. Empty references (the "NA" unit procedures of
+generate_asset, see PLACEHOLDERS) and rows nothing refers to (assets without
+WOs) are warnings, the load leaves those relationships out.
+
+    python validate.py ./data
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# table -> columns that identify a row; a WO has one row per asset it runs on
+KEYS = {
+    "region": ["id"], "site": ["id"], "facility": ["id"], "line": ["id"], "oem": ["id"], "up": ["id"],
+    "asset": ["id"], "asset_info": ["id"], "asset_oper": ["id"], "asset_oee": ["id"], "asset_machine": ["id"],
+    "maintenance": ["id"], "calibration": ["id"], "compliance": ["id"], "product": ["id"], "po": ["id"],
+    "batch": ["id"], "batch_consumption": ["BatchID", "ConsumedBatchID"], "material": ["id"], "plant_material": ["id"], "recipe": ["id", "MaterialID"],
+    "supplier": ["id"], "material_supplier_rel": ["MaterialID", "SupplierID"], "wo": ["id", "AssetID"],
+    "lims": ["id"],
+}
+
+# (table, column, referenced table, referenced column)
+FOREIGN_KEYS = [
+    ("site", "Region", "region", "Name"),
+    ("facility", "SiteID", "site", "id"),
+    ("facility", "RegionID", "region", "id"),
+    ("line", "FacilityID", "facility", "id"),
+    ("asset", "FacilityID", "facility", "id"),
+    ("asset", "LineID", "line", "id"),
+    ("asset", "ManufacturerID", "oem", "id"),
+    ("asset", "unitProcedureID", "up", "id"),
+    ("asset_info", "AssetID", "asset", "id"),
+    ("asset_oper", "AssetID", "asset", "id"),
+    ("asset_oee", "AssetID", "asset", "id"),
+    ("asset_machine", "AssetID", "asset", "id"),
+    ("maintenance", "AssetID", "asset", "id"),
+    ("calibration", "AssetID", "asset", "id"),
+    ("compliance", "AssetID", "asset", "id"),
+    ("product", "SiteID", "site", "id"),
+    ("product", "RecipeID", "recipe", "id"),
+    ("recipe", "MaterialID", "material", "id"),
+    ("material_supplier_rel", "MaterialID", "material", "id"),
+    ("material_supplier_rel", "SupplierID", "supplier", "id"),
+    ("plant_material", "MaterialID", "material", "id"),
+    ("plant_material", "FacilityID", "facility", "id"),
+    ("po", "ProductID", "product", "id"),
+    ("batch", "POID", "po", "id"),
+    ("batch", "ProductID", "product", "id"),
+    ("batch", "SiteID", "site", "id"),
+    ("batch", "FacilityID", "facility", "id"),
+    ("batch", "WarehouseFacilityID", "facility", "id"),
+    ("batch_consumption", "BatchID", "batch", "id"),
+    ("batch_consumption", "ConsumedBatchID", "batch", "id"),
+    ("wo", "POID", "po", "id"),
+    ("wo", "ProductID", "product", "id"),
+    ("wo", "BatchID", "batch", "id"),
+    ("wo", "AssetID", "asset", "id"),
+    ("wo", "FacilityID", "facility", "id"),
+    ("wo", "SiteID", "site", "id"),
+    ("wo", "UnitProcedureID", "up", "id"),
+    ("lims", "BatchID", "batch", "id"),
+    ("lims", "WOID", "wo", "id"),
+    ("lims", "FacilityID", "facility", "id"),
+    ("lims", "SiteID", "site", "id"),
+]
+
+# (table, column, referencing table, referencing column): rows expected to be referenced
+COVERAGE = [
+    ("asset", "id", "wo", "AssetID"),
+    ("po", "id", "batch", "POID"),
+    ("batch", "id", "wo", "BatchID"),
+]
+
+# (table, column) -> value the simulator writes for "none"; anywhere else
+# "NA" is data, the region North America
+PLACEHOLDERS = {("asset", "unitProcedureID"): "NA"}
+
+def read_csv(path):
+    """
+    A table of a dataset. Only empty fields are missing: pandas' default NA
+    strings would turn the region "NA" into NaN.
+    """
+    return pd.read_csv(path, keep_default_na=False, na_values=[""])
+
+def clear_placeholders(tables):
+    """
+    tables with the PLACEHOLDERS values as missing, the changed tables copied.
+    """
+    tables = dict(tables)
+    for (table, column), placeholder in PLACEHOLDERS.items():
+        if table in tables and column in tables[table] and (tables[table][column] == placeholder).any():
+            tables[table] = tables[table].copy()
+            tables[table][column] = tables[table][column].mask(tables[table][column] == placeholder)
+    return tables
+
+class IntegrityError(Exception):
+    def __init__(self, report):
+        errors = report[report["severity"] == "error"]
+        super().__init__(f"{len(errors)} integrity errors, load stopped:\n{format_report(errors)}")
+        self.report = report
+
+def key_set(column):
+    """
+    The distinct non-null values of a column as an arrow array.
+    """
+    return pc.unique(pc.drop_null(pa.array(column, from_pandas=True)))
+
+def is_in(values, keys):
+    """
+    Boolean mask of the values found in the key_set keys, nulls are False.
+    Series.isin slows down badly with millions of string keys, pyarrow's
+    hash set does not.
+    """
+    values = pa.array(values, from_pandas=True)
+    if values.type != keys.type:
+        values, keys = pc.cast(values, pa.string()), pc.cast(keys, pa.string())
+    return pc.is_in(values, value_set=keys).to_numpy(zero_copy_only=False)
+
+def merge_keys(keys, more):
+    """
+    The union of two key_set arrays, either may be None.
+    """
+    if keys is None or more is None:
+        return more if keys is None else keys
+    if keys.type != more.type:
+        keys, more = pc.cast(keys, pa.string()), pc.cast(more, pa.string())
+    return pc.unique(pa.concat_arrays([keys, more]))
+
+def examples(values, limit=5):
+    return ", ".join(map(str, pd.unique(values)[:limit]))
+
+class KnownKeys:
+    """
+    Keys of the tables loaded so far, for the referenced columns and the one
+    column keys, so a micro-batch is validated without the tables it refers
+    to. add the keys of an increment once it is loaded.
+    """
+    def __init__(self, tables):
+        self.keys = {}
+        self.add(tables)
+
+    def add(self, tables):
+        columns = {(parent, column) for _, _, parent, column in FOREIGN_KEYS}
+        columns |= {(table, key[0]) for table, key in KEYS.items() if len(key) == 1}
+        for table, column in columns:
+            if table in tables and column in tables[table]:
+                self.keys[table, column] = merge_keys(self.keys.get((table, column)),
+                                                      key_set(tables[table][column]))
+
+def validate_tables(tables, known=None):
+    """
+    One row per failed check: severity (error/warning), check (duplicate,
+    orphan, missing, unreferenced), table, column, references, rows (count)
+    and a few example values; for missing references the keys of the rows.
+    Tables that are absent are skipped. With known (KnownKeys) tables is an
+    increment: references may point to known keys as well, keys already
+    known are duplicates and unreferenced rows are not looked for.
+    """
+    tables = clear_placeholders(tables)
+    findings = []
+    key_sets = {}
+    def local_keys(table, column):
+        if (table, column) not in key_sets:
+            key_sets[table, column] = key_set(tables[table][column])
+        return key_sets[table, column]
+    def keys_of(table, column):
+        if known is None:
+            return local_keys(table, column)
+        if (table, column, "known") not in key_sets:
+            key_sets[table, column, "known"] = merge_keys(known.keys.get((table, column)),
+                                                          local_keys(table, column) if table in tables else None)
+        return key_sets[table, column, "known"]
+    def has(table, column):
+        return table in tables or (known is not None and (table, column) in known.keys)
+    def found(severity, check, table, column, references, values):
+        findings.append({"severity": severity, "check": check, "table": table, "column": column,
+                         "references": references, "rows": len(values), "examples": examples(values)})
+
+    for table, columns in KEYS.items():
+        if table not in tables:
+            continue
+        if known is not None and len(columns) == 1 and (table, columns[0]) in known.keys:
+            values = tables[table][columns[0]]
+            loaded = is_in(values, known.keys[table, columns[0]])
+            if loaded.any():
+                found("error", "duplicate", table, columns[0], "", values[loaded])
+        # one key column: distinct keys as many as rows means no duplicates
+        if len(columns) == 1 and len(local_keys(table, columns[0])) == tables[table][columns[0]].count():
+            continue
+        duplicated = tables[table].duplicated(subset=columns, keep=False)
+        if duplicated.any():
+            keys = tables[table].loc[duplicated, columns].astype(str).agg("|".join, axis=1)
+            found("error", "duplicate", table, "|".join(columns), "", keys)
+
+    for table, column, parent, parent_column in FOREIGN_KEYS:
+        if table not in tables or column not in tables[table] or not has(parent, parent_column):
+            continue
+        references = f"{parent}.{parent_column}"
+        values = tables[table][column]
+        missing = values.isna()
+        if missing.any():
+            found("warning", "missing", table, column, references, tables[table].loc[missing, KEYS[table][0]])
+        orphans = ~missing & ~is_in(values, keys_of(parent, parent_column))
+        if orphans.any():
+            found("error", "orphan", table, column, references, values[orphans])
+
+    for table, column, child, child_column in COVERAGE:
+        if known is not None or table not in tables or child not in tables:
+            continue
+        values = tables[table][column]
+        unreferenced = ~is_in(values, keys_of(child, child_column))
+        if unreferenced.any():
+            found("warning", "unreferenced", table, column, f"{child}.{child_column}", values[unreferenced])
+
+    return pd.DataFrame(findings, columns=["severity", "check", "table", "column", "references", "rows", "examples"])
+
+def check_tables(tables, known=None):
+    """
+    Validate tables and raise IntegrityError on errors; returns the report.
+    """
+    report = validate_tables(tables, known)
+    if (report["severity"] == "error").any():
+        raise IntegrityError(report)
+    return report
+
+def format_report(report):
+    return report.to_string(index=False) if len(report) else "no findings"
+
+if __name__ == "__main__":
+    data_folder = sys.argv[1] if len(sys.argv) > 1 else "./data"
+    tables = {table: read_csv(os.path.join(data_folder, f"{table}.csv")) for table in KEYS
+              if os.path.exists(os.path.join(data_folder, f"{table}.csv"))}
+    started = time.perf_counter()
+    report = validate_tables(tables)
+    elapsed = time.perf_counter() - started
+    print(format_report(report))
+    print(f"{sum(len(df) for df in tables.values())} rows in {len(tables)} tables validated in {elapsed:.2f} s")
+    sys.exit(1 if (report["severity"] == "error").any() else 0)